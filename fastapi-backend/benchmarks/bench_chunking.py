@@ -0,0 +1,94 @@
+# fastapi-backend/benchmarks/bench_chunking.py
+"""
+Chunks/sec and chunk counts of the token-aware chunker (ingest/chunking.py)
+against the old RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0),
+on a generated reference corpus (PDF pages, slides, table windows, prose) or
+on real files parsed with the ingest parsers.
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --files report.pdf deck.pptx samples.csv
+    python -m benchmarks.bench_chunking --model BAAI/bge-small-en-v1.5
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from dependencies.embeddings import DEFAULT_EMBEDDING_MODEL
+from ingest.chunking import Chunker, policy_for
+
+WORDS = ("orbit payload crew radiation experiment telemetry sample microgravity "
+         "analysis thermal power structure mission science result bacteria "
+         "culture growth sequencing protein expression").split()
+
+
+def reference_corpus(scale: int = 1, seed: int = 0):
+    rng = random.Random(seed)
+
+    def sentences(n):
+        return " ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                        for _ in range(n))
+
+    docs = []
+    for page in range(100 * scale):
+        docs.append(Document(page_content="\n\n".join(sentences(5) for _ in range(6)),
+                             metadata={"source": "report.pdf", "filetype": ".pdf", "page": page}))
+    slides = "\n\n".join(f"--- Slide {i + 1} ---\n{sentences(rng.randint(1, 12))}" for i in range(40 * scale))
+    docs.append(Document(page_content=slides, metadata={"source": "deck.pptx", "filetype": ".pptx"}))
+    header = "Columns: sample | organism | condition | gene | log2fc | pvalue\n"
+    for window in range(300 * scale):
+        rows = "\n".join(f"S{window}_{i} | E. coli | {rng.choice(['flight', 'ground'])} | gene{rng.randint(1, 4000)}"
+                         f" | {rng.uniform(-4, 4):.3f} | {rng.random():.2e}" for i in range(rng.randint(4, 20)))
+        docs.append(Document(page_content=header + rows, metadata={"source": "samples.csv", "filetype": ".csv"}))
+    for i in range(20 * scale):
+        docs.append(Document(page_content="\n\n".join(sentences(8) for _ in range(10)),
+                             metadata={"source": f"notes_{i}.docx", "filetype": ".docx"}))
+    return docs
+
+
+def parsed_corpus(paths):
+    from ingest.parsers import parse_file
+    docs = []
+    for path in paths:
+        docs.extend(parse_file(path, os.path.basename(path)))
+    return docs
+
+
+def report(label, docs, split):
+    start = time.perf_counter()
+    chunks = split(docs)
+    seconds = time.perf_counter() - start
+    print(f"{label}: {len(docs)} docs -> {len(chunks)} chunks in {seconds:.2f} s, {len(chunks) / seconds:,.0f} chunks/s")
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--scale", type=int, default=1, help="size multiplier of the generated corpus")
+    parser.add_argument("--files", nargs="*", help="chunk these files (through the ingest parsers) instead")
+    args = parser.parse_args()
+
+    docs = parsed_corpus(args.files) if args.files else reference_corpus(args.scale)
+    chunker = Chunker(args.model)
+    count_tokens = chunker.count_tokens
+
+    legacy = report("chars (500/0)", docs, RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0).split_documents)
+    report("tokens, cold tokenizer cache", docs, chunker.split_documents)
+    chunks = report("tokens, warm tokenizer cache", docs, chunker.split_documents)
+    print(f"token cache: {chunker.stats()}")
+
+    for label, result in (("chars", legacy), ("tokens", chunks)):
+        per_policy = Counter(policy_for(chunk).name for chunk in result)
+        sizes = [count_tokens(chunk.page_content) for chunk in result]
+        print(f"{label}: chunks per policy {dict(per_policy)}, tokens/chunk mean {sum(sizes) / len(sizes):.0f}, "
+              f"max {max(sizes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# fastapi-backend/benchmarks/bench_fastq.py
+"""
+Reads/sec and MB/sec of the streaming FASTQ summary (ingest/fastq.py) on a
+synthetic run, plain and gzip compressed.
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_fastq --reads 1000000 --length 150
+    python -m benchmarks.bench_fastq --file run.fastq.gz
+"""
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ingest.fastq import fastq_stats
+
+
+def write_fastq(path: str, reads: int, length: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as f:
+        for start in range(0, reads, 10000):
+            n = min(10000, reads - start)
+            seqs = np.frombuffer(b"ACGTN", dtype=np.uint8)[rng.choice(5, size=(n, length), p=[.3, .2, .2, .29, .01])]
+            quals = (rng.integers(2, 41, size=(n, length)) + 33).astype(np.uint8)
+            f.write(b"".join(
+                b"@read%d\n%s\n+\n%s\n" % (start + i, seqs[i].tobytes(), quals[i].tobytes()) for i in range(n)
+            ))
+
+
+def run(path: str):
+    start = time.perf_counter()
+    summary = fastq_stats(path)
+    seconds = time.perf_counter() - start
+
+    # Separate pass for memory, tracemalloc slows the parse down considerably
+    tracemalloc.start()
+    fastq_stats(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path) / 2**20
+    print(f"{os.path.basename(path)}: {summary['reads']} reads in {seconds:.2f} s, "
+          f"{summary['reads'] / seconds:,.0f} reads/s, {size / seconds:.1f} MB/s on disk, "
+          f"peak traced memory {peak / 2**20:.1f} MB, GC {summary['gc_percent']}%, "
+          f"top k-mer {summary['top_kmers'][0]['kmer'] if summary['top_kmers'] else '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=500000)
+    parser.add_argument("--length", type=int, default=150)
+    parser.add_argument("--file", help="benchmark an existing FASTQ (or .fastq.gz) file instead")
+    args = parser.parse_args()
+
+    if args.file:
+        run(args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, "synthetic.fastq")
+        write_fastq(plain, args.reads, args.length)
+        run(plain)
+        with open(plain, "rb") as src, gzip.open(plain + ".gz", "wb", compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst)
+        run(plain + ".gz")
+
+
+if __name__ == "__main__":
+    main()
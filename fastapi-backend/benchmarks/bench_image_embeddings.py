@@ -0,0 +1,88 @@
+# fastapi-backend/benchmarks/bench_image_embeddings.py
+"""
+Images/sec of the CLIP image path (dependencies/clip_embeddings.py through the
+embedding cache) against describing each image with llava and embedding the
+description, which is what analyze_image-based indexing costs.
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_image_embeddings --images 64
+    python -m benchmarks.bench_image_embeddings --dir ./photos --llava 8
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from dependencies.clip_embeddings import get_clip_embeddings
+from dependencies.embedding_cache import EmbeddingCache
+from ingest.image_index import IMAGE_EXTENSIONS, file_sha256
+
+
+def write_images(directory: str, count: int, side: int = 1024, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, size=(side // 16, side // 16, 3), dtype=np.uint8)
+        path = os.path.join(directory, f"image_{i}.jpg")
+        Image.fromarray(pixels).resize((side, side)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def bench_clip(paths, cache_dir: str):
+    clip = get_clip_embeddings()
+    clip.embed_images(paths[:1])  # load weights outside the timing
+    cache = EmbeddingCache(cache_dir)
+    shas = [file_sha256(path) for path in paths]
+    path_by_sha = dict(zip(shas, paths))
+    for label in ("cold cache", "warm cache"):
+        start = time.perf_counter()
+        cache.get_or_compute(f"{clip.model_name}#image", shas,
+                             lambda keys: clip.embed_images([path_by_sha[k] for k in keys]))
+        seconds = time.perf_counter() - start
+        print(f"CLIP {clip.model_name} ({label}): {len(paths)} images in {seconds:.2f} s, "
+              f"{len(paths) / seconds:.1f} images/s")
+
+
+def bench_llava(paths, model: str, embedding_model: str):
+    import ollama
+    from dependencies.embeddings import get_embeddings
+
+    embeddings = get_embeddings(embedding_model)
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            res = ollama.chat(model=model, messages=[
+                {"role": "user", "content": "Describe the image.", "images": [f.read()]}
+            ])
+        embeddings.embed_documents([res["message"]["content"]])
+    seconds = time.perf_counter() - start
+    print(f"{model} describe + embed: {len(paths)} images in {seconds:.2f} s, {len(paths) / seconds:.2f} images/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--dir", help="benchmark the images in an existing directory instead")
+    parser.add_argument("--llava", type=int, default=0, help="also time the llava path on this many images")
+    parser.add_argument("--llava-model", default="llava")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            paths = sorted(p for p in glob.glob(os.path.join(args.dir, "*"))
+                           if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS)
+        else:
+            paths = write_images(tmp, args.images)
+        bench_clip(paths, os.path.join(tmp, "cache"))
+        if args.llava:
+            bench_llava(paths[:args.llava], args.llava_model, args.embedding_model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# fastapi-backend/benchmarks/bench_onnx_embeddings.py
+"""
+Throughput of the PyTorch, ONNX and int8 ONNX embedding backends, and how
+closely the ONNX vectors agree with PyTorch (cosine similarity per text).
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_onnx_embeddings --texts 2000
+    python -m benchmarks.bench_onnx_embeddings --file some_document.txt
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from dependencies.embeddings import DEFAULT_EMBEDDING_MODEL
+from dependencies.onnx_embeddings import OnnxEmbeddings
+
+WORDS = (
+    "spacecraft telemetry radiation microgravity protein expression sample culture "
+    "mission orbit crew payload sequencing genome assay cell tissue experiment "
+    "analysis result control flight ground temperature pressure dose exposure"
+).split()
+
+
+def synthetic_texts(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 120))) for _ in range(count)]
+
+
+def file_texts(path: str, chunk_chars: int = 500):
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+
+def timed(embeddings, texts):
+    embeddings.embed_documents(texts[:8])  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--texts", type=int, default=1000, help="number of synthetic texts")
+    parser.add_argument("--file", help="embed 500-character chunks of this file instead")
+    args = parser.parse_args()
+
+    texts = file_texts(args.file) if args.file else synthetic_texts(args.texts)
+    print(f"{len(texts)} texts, model {args.model}")
+
+    reference, seconds = timed(HuggingFaceEmbeddings(model_name=args.model), texts)
+    print(f"{'torch':>10}: {len(texts) / seconds:8.1f} texts/s")
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+    for quantize in (False, True):
+        backend = OnnxEmbeddings(args.model, quantize=quantize)
+        vectors, seconds = timed(backend, texts)
+        cosine = (vectors * reference).sum(axis=1)
+        print(f"{backend.backend:>10}: {len(texts) / seconds:8.1f} texts/s, "
+              f"cosine vs torch mean {cosine.mean():.4f} min {cosine.min():.4f}, "
+              f"model {backend.model_bytes / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
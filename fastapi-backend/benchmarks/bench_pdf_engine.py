@@ -0,0 +1,69 @@
+# fastapi-backend/benchmarks/bench_pdf_engine.py
+"""
+Pages/sec of the page-parallel PDF engine (ingest/pdf_engine.py) against
+PyMuPDFLoader(...).load(), on a generated 300-page report or a real file.
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_pdf_engine --pages 300 --workers 4
+    python -m benchmarks.bench_pdf_engine --file mission_report.pdf
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+from langchain_community.document_loaders import PyMuPDFLoader
+
+from ingest.pdf_engine import pdf_documents
+
+WORDS = ("orbit payload crew radiation experiment telemetry sample microgravity "
+         "analysis thermal power structure mission science result").split()
+
+
+def write_report(path: str, pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = f"Section {number + 1}\n" + "\n".join(
+            " ".join(rng.choice(WORDS) for _ in range(14)) for _ in range(45)
+        )
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--file", help="benchmark an existing PDF instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.file
+        if path is None:
+            path = os.path.join(tmp, "report.pdf")
+            write_report(path, args.pages)
+
+        start = time.perf_counter()
+        docs = PyMuPDFLoader(path).load()
+        seconds = time.perf_counter() - start
+        print(f"PyMuPDFLoader.load(): {len(docs)} pages in {seconds:.2f} s, {len(docs) / seconds:.0f} pages/s")
+
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pool.submit(sum, []).result()  # start the workers outside the timing
+            start = time.perf_counter()
+            docs = asyncio.run(pdf_documents(path, {"source": os.path.basename(path)}, pool))
+            seconds = time.perf_counter() - start
+        print(f"pdf_engine ({args.workers} workers): {len(docs)} pages in {seconds:.2f} s, "
+              f"{len(docs) / seconds:.0f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
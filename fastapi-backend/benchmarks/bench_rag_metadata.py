@@ -0,0 +1,50 @@
+# fastapi-backend/benchmarks/bench_rag_metadata.py
+"""
+Wall-clock time to fill a study record against a running backend: the four
+/api/generate_rag_with_<field> calls one after the other (what the frontend
+did) against one streamed /api/generate_rag_metadata call.
+
+Needs a session with a loaded collection; take session_id from the browser's
+user_session cookie. Run from fastapi-backend/:
+    python -m benchmarks.bench_rag_metadata --session-id <id> --files paper.pdf
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+from middleware.session_middleware import SESSION_COOKIE
+
+FIELDS = ["title", "description", "keywords", "assays"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--session-id", required=True)
+    parser.add_argument("--files", nargs="+", required=True)
+    parser.add_argument("--model", default="llama3.1")
+    args = parser.parse_args()
+
+    payload = {"session_id": args.session_id, "file_names": args.files, "model": args.model, "top_k": 3}
+    with httpx.Client(base_url=args.url, timeout=None, cookies={SESSION_COOKIE: args.session_id}) as client:
+        start = time.perf_counter()
+        for field in FIELDS:
+            res = client.post(f"/api/generate_rag_with_{field}", json=payload)
+            print(f"  {field}: {res.status_code} at {time.perf_counter() - start:.1f} s")
+        print(f"sequential endpoints: {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        event = None
+        with client.stream("POST", "/api/generate_rag_metadata", json={**payload, "fields": FIELDS}) as res:
+            for line in res.iter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event in ("field", "error"):
+                    print(f"  {json.loads(line[6:])['field']}: {event} at {time.perf_counter() - start:.1f} s")
+        print(f"generate_rag_metadata: {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# fastapi-backend/benchmarks/bench_retrieval.py
+"""
+Latency of per-file RAG retrieval: the old loop of one
+similarity_search_with_score(filter={"source": name}) per file against
+rag_calls.retrieval.retrieve_per_file (one embedding, one `$in` query).
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_retrieval --files 10 --chunks 500 --top-k 3
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from dependencies.embeddings import DEFAULT_EMBEDDING_MODEL, get_embeddings
+from rag_calls.retrieval import retrieve_per_file
+
+WORDS = ("orbit payload crew radiation experiment telemetry sample microgravity "
+         "analysis thermal power structure mission science result assay "
+         "protein expression culture sequencing").split()
+QUERY = "assays used in the study"
+
+
+def loop_retrieval(vectorstore, file_names, k):
+    return {name: vectorstore.similarity_search_with_score(query=QUERY, k=k, filter={"source": name})
+            for name in file_names}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=500, help="chunks per file")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    file_names = [f"paper_{i}.pdf" for i in range(args.files)]
+    docs = [Document(page_content=" ".join(rng.choice(WORDS) for _ in range(60)), metadata={"source": name})
+            for name in file_names for _ in range(args.chunks)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vectorstore = Chroma.from_documents(docs, get_embeddings(args.model), persist_directory=tmp)
+        for label, retrieve in (("per-file loop", loop_retrieval),
+                                ("retrieve_per_file", lambda vs, names, k: retrieve_per_file(vs, QUERY, names, k))):
+            retrieve(vectorstore, file_names, args.top_k)  # warm-up
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                results = retrieve(vectorstore, file_names, args.top_k)
+            ms = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"{label}: {ms:.1f} ms per request, {sum(len(r) for r in results.values())} chunks "
+                  f"from {args.files} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# fastapi-backend/benchmarks/bench_session_middleware.py
+"""
+Peak memory and time-to-first-byte of a large streamed download through the
+session middleware, compared with the old buffering @app.middleware("http").
+
+Run from fastapi-backend/:
+    python -m benchmarks.bench_session_middleware --mb 256
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from middleware.session_middleware import SessionMiddleware
+
+CHUNK = b"x" * (1024 * 1024)
+
+
+def build_app(total_mb: int, buffered: bool, user_dirs: str):
+    async def download(request):
+        async def body():
+            for _ in range(total_mb):
+                yield CHUNK
+        return StreamingResponse(body(), media_type="application/octet-stream")
+
+    app = Starlette(routes=[Route("/download", download)])
+
+    if buffered:
+        # The previous implementation: drain the body and rebuild the Response
+        @app.middleware("http")
+        async def session_manager(request, call_next):
+            response = await call_next(request)
+            new_response = Response(
+                content=b"".join([chunk async for chunk in response.body_iterator]),
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                media_type=response.media_type,
+            )
+            new_response.set_cookie("user_session", "0" * 32)
+            return new_response
+    else:
+        app.add_middleware(SessionMiddleware, user_dirs=user_dirs, active_sessions={})
+    return app
+
+
+async def run_once(app):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/download", "raw_path": b"/download",
+        "query_string": b"", "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000),
+    }
+    received = 0
+    first_byte = None
+    request_sent = False
+    response_done = asyncio.Event()
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a real server: only report a disconnect once the response is over
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received, first_byte
+        if message["type"] == "http.response.body":
+            if message.get("body"):
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                received += len(message["body"])
+            if not message.get("more_body", False):
+                response_done.set()
+
+    tracemalloc.start()
+    await app(scope, receive, send)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return received, first_byte, time.perf_counter() - start, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=256, help="size of the streamed download")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as user_dirs:
+        for label, buffered in (("buffered (old)", True), ("pure ASGI", False)):
+            received, ttfb, total, peak = asyncio.run(run_once(build_app(args.mb, buffered, user_dirs)))
+            print(f"{label:>15}: {received / 2**20:.0f} MB, ttfb {ttfb * 1000:.1f} ms, "
+                  f"total {total:.2f} s, peak traced memory {peak / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,54 +2,222 @@
 
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-from langchain_community.chat_message_histories import RedisChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict, messages_from_dict
+import asyncio
 import os
-import redis
+import json
+import time
+from redis import asyncio as aioredis
 import logging
+import ollama
 
 # Use the environment variable if set, otherwise default to localhost
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
 logging.info(f"Connecting to Redis at: {REDIS_URL}")
 
-# Initialize a Redis client
-redis_client = redis.StrictRedis.from_url(REDIS_URL)
+# Shared asyncio client; every request borrows a connection from the same pool
+redis_pool = aioredis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
 
 APP_PREFIX = "aicure:chat:"  # Prefix for App 1 keys
 # APP_PREFIX = ""
+SUMMARY_PREFIX = f"{APP_PREFIX}summary:"  # Rolling summary of turns that left the window
+
+# History policy: the last CHAT_HISTORY_MAX_TURNS turns are kept verbatim, older turns are
+# folded into a summary (CHAT_SUMMARY_BATCH_TURNS at a time), and summary + turns must fit
+# in CHAT_HISTORY_TOKEN_BUDGET tokens
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "6"))
+CHAT_SUMMARY_BATCH_TURNS = int(os.getenv("CHAT_SUMMARY_BATCH_TURNS", "4"))
+# Most turns folded by one summary call when catching up on a missing or stale summary
+CHAT_SUMMARY_MAX_FOLD_TURNS = int(os.getenv("CHAT_SUMMARY_MAX_FOLD_TURNS", "20"))
+
+# Startup cleanup of chat keys: "delete" wipes them, "expire" lets them age out
+# after CHAT_KEY_TTL seconds (new histories get the same TTL), "off" keeps them
+CHAT_PURGE_MODE = os.getenv("CHAT_PURGE_MODE", "delete")
+CHAT_KEY_TTL = int(os.getenv("CHAT_KEY_TTL", "86400"))
+CHAT_PURGE_BATCH = int(os.getenv("CHAT_PURGE_BATCH", "500"))
+# "delete" only removes keys idle for longer than the purge has been running plus
+# this many seconds, so histories written or read since startup survive
+CHAT_PURGE_MIN_IDLE = int(os.getenv("CHAT_PURGE_MIN_IDLE", "0"))
+PURGE_PROGRESS = {"state": "pending", "scanned": 0, "purged": 0}
+
+
+def set_redis_client(client):
+    """Swap the asyncio client, e.g. for fakeredis.aioredis.FakeRedis() in tests"""
+    global redis_client
+    redis_client = client
+
+
+async def purge_chat_history(mode: str = None, ttl: int = None, batch_size: int = None) -> int:
+    """
+    Remove (mode="delete") or put a TTL on (mode="expire") every chat key.
+    Keys are walked with SCAN and removed with batched UNLINK, so Redis is never
+    blocked by one huge KEYS/DEL and the app can serve requests meanwhile.
+    SCAN is no snapshot, so in delete mode a key is only removed if its OBJECT
+    IDLETIME says it wasn't touched since the purge started (needs an LRU or
+    no maxmemory-policy; under LFU IDLETIME fails and nothing is deleted).
+    """
+    mode = mode or CHAT_PURGE_MODE
+    ttl = ttl or CHAT_KEY_TTL
+    batch_size = batch_size or CHAT_PURGE_BATCH
+    started_at = time.time()
+    PURGE_PROGRESS.update({"state": "running", "mode": mode, "scanned": 0, "purged": 0, "skipped_active": 0,
+                           "started_at": started_at, "finished_at": None})
+    if mode == "off":
+        PURGE_PROGRESS.update({"state": "skipped", "finished_at": time.time()})
+        return 0
+
+    async def flush(keys):
+        if mode != "expire":
+            # Cutoff: anything idle for less than the purge's age was used after startup
+            min_idle = int(time.time() - started_at) + 1 + CHAT_PURGE_MIN_IDLE
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.object("idletime", key)
+                idle = await pipe.execute(raise_on_error=False)
+            if any(isinstance(seconds, Exception) for seconds in idle):
+                logging.warning("OBJECT IDLETIME unavailable, keeping chat keys whose age is unknown")
+            # Keys gone meanwhile give None, unknown ages an exception: both are kept
+            old = [key for key, seconds in zip(keys, idle) if isinstance(seconds, int) and seconds >= min_idle]
+            PURGE_PROGRESS["skipped_active"] += len(keys) - len(old)
+            keys = old
+            if not keys:
+                return
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if mode == "expire":
+                for key in keys:
+                    pipe.expire(key, ttl)
+            else:
+                pipe.unlink(*keys)
+            await pipe.execute()
+        PURGE_PROGRESS["purged"] += len(keys)
+        logging.info(f"Chat history purge ({mode}): {PURGE_PROGRESS['purged']} keys so far")
 
-def clear_chat_history_in_redis():
-    """Clear only chat-related entries in Redis without dropping the schema."""
     try:
-        # Assuming the keys for chat entries follow APP_PREFIX
-        keys = redis_client.keys(f"{APP_PREFIX}*")  # Get all chat keys
-        logging.debug(f'Keys found: {keys}')
+        keys = []
+        async for key in redis_client.scan_iter(match=f"{APP_PREFIX}*", count=batch_size):
+            keys.append(key)
+            PURGE_PROGRESS["scanned"] += 1
+            if len(keys) >= batch_size:
+                await flush(keys)
+                keys = []
         if keys:
-            redis_client.delete(*keys)  # Delete only chat keys
-            logging.info(f"Deleted {len(keys)} chat-related keys for OSDR app.")
-        else:
-            logging.info("No chat-related keys found for OSDR.")
+            await flush(keys)
+        PURGE_PROGRESS["state"] = "done"
+        logging.info(f"Chat history purge ({mode}) finished: {PURGE_PROGRESS['purged']} keys")
     except Exception as e:
-        logging.error(f"Error clearing chat-related entries in Redis: {e}")
+        PURGE_PROGRESS["state"] = "error"
+        logging.error(f"Error purging chat-related entries in Redis: {e}")
+    PURGE_PROGRESS["finished_at"] = time.time()
+    return PURGE_PROGRESS["purged"]
+
+
+def _history_key(session_id: str) -> str:
+    # Same layout as RedisChatMessageHistory: one list per session, newest first (LPUSH)
+    return f"{APP_PREFIX}{session_id}"
+
+
+async def add_chat_exchange(session_id: str, user_message: str, ai_message: str):
+    """Append the user question and the assistant answer in one pipelined round-trip"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.lpush(_history_key(session_id), json.dumps(message_to_dict(HumanMessage(content=user_message))))
+        pipe.lpush(_history_key(session_id), json.dumps(message_to_dict(AIMessage(content=ai_message))))
+        if CHAT_PURGE_MODE == "expire":
+            pipe.expire(_history_key(session_id), CHAT_KEY_TTL)
+        await pipe.execute()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for llama-style tokenizers)"""
+    return max(1, len(text) // 4)
+
+
+def history_pairs(messages) -> list:
+    """Pair consecutive human/AI messages into (human, ai) turns"""
+    pairs = []
+    i = 0
+    while i < len(messages) - 1:
+        if (getattr(messages[i], 'type', None) == "human" and
+            getattr(messages[i + 1], 'type', None) == "ai"):
+            pairs.append((messages[i].content, messages[i + 1].content))
+            i += 2
+        else:
+            i += 1
+    return pairs
+
+
+def _summarize_turns(summary: str, turns: list, model: str) -> str:
+    """Fold turns into the running summary with one LLM call"""
+    transcript = "".join(f"Human: {human}\nAssistant: {ai}\n\n" for human, ai in turns)
+    max_words = max(50, CHAT_HISTORY_TOKEN_BUDGET // 4)
+    prompt = (
+        f"Update the summary of a conversation in at most {max_words} words. "
+        "Keep names, facts, numbers and open questions. Only return the summary.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\n"
+        f"New turns:\n{transcript}"
+    )
+    res = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return res['message']['content'].strip()
+
+
+def _pairs_from_items(items) -> list:
+    """(human, ai) turns, oldest first, from LRANGE items (newest first)"""
+    return history_pairs(messages_from_dict([json.loads(item) for item in reversed(items)]))
 
-logging.info('Clearing chat history in Redis at startup...')
-clear_chat_history_in_redis()
 
+async def get_windowed_history(session_id: str, model: str):
+    """
+    Return (summary, recent_turns) for the prompt.
+    Turns older than the window are folded into a rolling summary cached in Redis
+    together with the number of turns it covers, so the prompt size stays bounded
+    however long the conversation gets. Normally only the tail of the history is
+    read; if the summary is missing or lags behind, the unfolded turns before the
+    tail are read too and folded CHAT_SUMMARY_MAX_FOLD_TURNS at a time.
+    """
+    summary_key = f"{SUMMARY_PREFIX}{session_id}"
+    history_key = _history_key(session_id)
+    window_turns = CHAT_HISTORY_MAX_TURNS + CHAT_SUMMARY_BATCH_TURNS
 
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    """Get or create a Redis-based session history and add initial messages if empty."""
-    history = RedisChatMessageHistory(session_id=session_id, key_prefix=APP_PREFIX,  url=REDIS_URL) 
-    return history
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.llen(history_key)
+        pipe.lrange(history_key, 0, 2 * window_turns - 1)
+        pipe.get(summary_key)
+        total_messages, items, cached = await pipe.execute()
 
-def add_chat_message(history: BaseChatMessageHistory, message: str, role: str):
-    """Add a chat message to the Redis-based session history."""
-    
-    if role.lower() == 'user':
-        history.add_user_message(message)
-    elif role.lower() in ['assistant', 'ai']:
-        history.add_ai_message(message)
-    else:
-        raise ValueError(f"Invalid role: {role}. Must be 'user' or 'assistant'")
+    pairs = _pairs_from_items(items)
+    total_turns = total_messages // 2
+    first_turn = total_turns - len(pairs)  # global index of pairs[0]
 
+    state = json.loads(cached) if cached else {"summary": "", "turns": 0}
+    summary, folded = state["summary"], min(state["turns"], total_turns)
 
+    # Fold in batches so the summary call doesn't run on every turn
+    fold_until = total_turns - CHAT_HISTORY_MAX_TURNS
+    if fold_until - folded >= CHAT_SUMMARY_BATCH_TURNS:
+        older = pairs[max(0, folded - first_turn):max(0, fold_until - first_turn)]
+        if folded < first_turn:
+            # Turns [folded, first_turn) are outside the tail that was read: list
+            # index i holds message total_messages - 1 - i (LPUSH, newest first)
+            missing = await redis_client.lrange(history_key, total_messages - 2 * first_turn,
+                                                total_messages - 1 - 2 * folded)
+            older = _pairs_from_items(missing) + older
+        try:
+            for start in range(0, len(older), CHAT_SUMMARY_MAX_FOLD_TURNS):
+                chunk = older[start:start + CHAT_SUMMARY_MAX_FOLD_TURNS]
+                summary = await asyncio.to_thread(_summarize_turns, summary, chunk, model)
+                folded = min(fold_until, folded + len(chunk))
+                # Saved per chunk, a failure later on doesn't redo the folded part
+                await redis_client.set(summary_key, json.dumps({"summary": summary, "turns": folded}),
+                                       ex=CHAT_KEY_TTL if CHAT_PURGE_MODE == "expire" else None)
+            folded = fold_until
+        except Exception as e:
+            logging.error(f"Failed to summarize chat history for {session_id}: {e}")
 
+    # Unfolded turns stay verbatim, oldest dropped first until everything fits the budget
+    recent = pairs[max(0, folded - first_turn):]
+    budget = CHAT_HISTORY_TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+    while recent and sum(estimate_tokens(h) + estimate_tokens(a) for h, a in recent) > budget:
+        recent = recent[1:]
+    return summary, recent
@@ -12,80 +12,25 @@ import re
 import json
 import uuid
 import os
-import time
 from io import BytesIO
 import zipfile
 import shutil
 
 
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.chains import ConversationalRetrievalChain
-from langchain_ollama import ChatOllama
-from langchain.prompts import PromptTemplate
-
-from file_handlers.file_tools import USER_DIRS
+from config.shared import SESSIONS, initialize_session, collection_dir, write_collection_manifest, invalidate_chains, get_collection_vectorstore, collection_lock
+from config.session_store import drop_chroma_store
+from ingest.image_index import remove_images, search_images
 
 router = APIRouter(tags=["collections"])
 
-# Session structure for collection-based vectorstores
-SESSIONS = {}
-
-def initialize_session(session_id: str):
-    """Initialize a new session with a default empty collection"""
-    if session_id not in SESSIONS:
-        # Create default empty vectorstore
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2", 
-            model_kwargs={'trust_remote_code': True}
-        )
-        
-        # Create collection directory for default collection
-        default_collection_dir = os.path.join(USER_DIRS, session_id, "collections", "default")
-        os.makedirs(default_collection_dir, exist_ok=True)
-        
-        # Create empty vectorstore
-        default_vectorstore = Chroma(
-            embedding_function=embeddings,
-            persist_directory=default_collection_dir
-        )
-        
-        # Create LLM and chatbot chain for default collection
-        llm = ChatOllama(model="llama3.1", temperature=0)
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
-        )
-        
-        # Create retriever (will be empty initially)
-        retriever = default_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        
-        # Create chain
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        
-        SESSIONS[session_id] = {
-            "collections": {
-                "default": {
-                    "vectorstore": default_vectorstore,
-                    "name": "Default Chat",
-                    "files": [],
-                    "created_at": time.time(),
-                    "embedding_model": "sentence-transformers/all-MiniLM-L6-v2"
-                }
-            },
-            "active_collection_id": "default",
-            "history": [],
-            "chain": chain
-        }
-
 
 # Collection Management Endpoints
+@router.get("/api/collections/stats")
+async def session_stats():
+    """Session store counters (resident sessions, hits, misses, evictions)"""
+    return JSONResponse(SESSIONS.stats())
+
+
 @router.get("/api/collections")
 async def list_collections(request: Request):
     """List all collections for the current session (excluding default)"""
@@ -127,8 +72,9 @@ async def load_collection(collection_id: str, request: Request):
     # Set as active collection
     SESSIONS[session_id]["active_collection_id"] = collection_id
     
-    # Clear existing chatbot chain (will be recreated with new vectorstore)
-    SESSIONS[session_id]["chain"] = None
+    # Back to the default prompt; the chain comes from the cache when this
+    # collection/model/prompt was used before
+    SESSIONS[session_id]["chat_template"] = None
     
     collection_name = SESSIONS[session_id]["collections"][collection_id]["name"]
     
@@ -152,9 +98,9 @@ async def export_collection(collection_id: str, request: Request):
     collection_name = collection_info["name"]
     
     # Collection directory path
-    collection_dir = os.path.join(USER_DIRS, session_id, "collections", collection_id)
+    export_dir = collection_dir(session_id, collection_id)
     
-    if not os.path.exists(collection_dir):
+    if not os.path.exists(export_dir):
         raise HTTPException(404, "Collection directory not found")
     
     # Create zip file in memory
@@ -162,10 +108,10 @@ async def export_collection(collection_id: str, request: Request):
     
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         # Add all files from the collection directory
-        for root, dirs, files in os.walk(collection_dir):
+        for root, dirs, files in os.walk(export_dir):
             for file in files:
                 file_path = os.path.join(root, file)
-                arc_name = os.path.relpath(file_path, collection_dir)
+                arc_name = os.path.relpath(file_path, export_dir)
                 zip_file.write(file_path, arc_name)
     
     zip_buffer.seek(0)
@@ -193,39 +139,93 @@ async def delete_collection(collection_id: str, request: Request):
     
     collection_name = SESSIONS[session_id]["collections"][collection_id]["name"]
     
-    # Remove from session
-    del SESSIONS[session_id]["collections"][collection_id]
-    
-    # If this was the active collection, reset to default
-    if SESSIONS[session_id].get("active_collection_id") == collection_id:
-        SESSIONS[session_id]["active_collection_id"] = "default"
-        # Reset to default chain (already exists from initialize_session)
-        default_vectorstore = SESSIONS[session_id]["collections"]["default"]["vectorstore"]
-        llm = ChatOllama(model="llama3.1", temperature=0)
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
-        )
-        retriever = default_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        SESSIONS[session_id]["chain"] = chain
-    
-    # Delete collection directory
-    collection_dir = os.path.join(USER_DIRS, session_id, "collections", collection_id)
-    if os.path.exists(collection_dir):
-        shutil.rmtree(collection_dir)
+    # Wait for an ingest job writing to this collection
+    async with collection_lock(session_id, collection_id):
+        # Remove from session with its handle
+        SESSIONS[session_id]["collections"].pop(collection_id, None)
+        invalidate_chains(session_id, collection_id)
+        
+        # If this was the active collection, reset to default
+        if SESSIONS[session_id].get("active_collection_id") == collection_id:
+            SESSIONS[session_id]["active_collection_id"] = "default"
+            SESSIONS[session_id]["chat_template"] = None
+        
+        # Empty the Chroma store through its shared client (its sqlite file stays open),
+        # then delete everything else: manifest, stored images
+        removed_dir = collection_dir(session_id, collection_id)
+        if os.path.exists(removed_dir):
+            await run_in_threadpool(drop_chroma_store, removed_dir)
+            for name in os.listdir(removed_dir):
+                if name.startswith("chroma.sqlite3"):
+                    continue
+                path = os.path.join(removed_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
     
     return JSONResponse({
         "message": f"Collection '{collection_name}' deleted successfully"
     })
 
 
+@router.delete("/api/collections/{collection_id}/files/{filename:path}")
+async def remove_collection_file(collection_id: str, filename: str, request: Request):
+    """Remove one file's chunks (matched on their `source` metadata) from a collection"""
+    session_id = request.state.session_id
+    
+    initialize_session(session_id)
+    
+    if collection_id not in SESSIONS[session_id]["collections"]:
+        raise HTTPException(404, f"Collection {collection_id} not found")
+    
+    # An ingest job writing to this collection finishes first, its file list included
+    async with collection_lock(session_id, collection_id):
+        collection_info = SESSIONS[session_id]["collections"].get(collection_id)
+        if collection_info is None or not any(f["name"] == filename for f in collection_info["files"]):
+            raise HTTPException(404, f"File {filename} not found in collection {collection_id}")
+        
+        # Delete in place; the cached chain's retriever sees the change directly
+        vectorstore = get_collection_vectorstore(session_id, collection_id)
+        removed = await run_in_threadpool(vectorstore._collection.get, where={"source": filename}, include=[])
+        if removed["ids"]:
+            await run_in_threadpool(vectorstore._collection.delete, ids=removed["ids"])
+        images_removed = await run_in_threadpool(remove_images, session_id, collection_id, filename)
+        
+        collection_info["files"] = [f for f in collection_info["files"] if f["name"] != filename]
+        write_collection_manifest(session_id, collection_id)
+    
+    return JSONResponse({
+        "message": f"File '{filename}' removed from collection",
+        "chunks_removed": len(removed["ids"]) + images_removed,
+        "files": collection_info["files"]
+    })
+
+
+@router.get("/api/collections/{collection_id}/search")
+async def search_collection(collection_id: str, request: Request, query: str, k: int = 4):
+    """Text chunks and images of a collection closest to a query"""
+    session_id = request.state.session_id
+    
+    initialize_session(session_id)
+    
+    if collection_id not in SESSIONS[session_id]["collections"]:
+        raise HTTPException(404, f"Collection {collection_id} not found")
+    
+    vectorstore = get_collection_vectorstore(session_id, collection_id)
+    chunks = await run_in_threadpool(vectorstore.similarity_search_with_score, query, k=k)
+    images = await run_in_threadpool(search_images, session_id, collection_id, query, k)
+    
+    return JSONResponse({
+        "chunks": [
+            {"content": doc.page_content, "source": doc.metadata.get("source"),
+             "page": doc.metadata.get("page"), "distance": round(float(distance), 4)}
+            for doc, distance in chunks
+        ],
+        "images": images
+    })
+
+
 @router.put("/api/collections/{collection_id}")
 async def rename_collection(
     collection_id: str, 
@@ -242,6 +242,7 @@ async def rename_collection(
     
     # Update collection name
     SESSIONS[session_id]["collections"][collection_id]["name"] = new_name
+    write_collection_manifest(session_id, collection_id)
     
     return JSONResponse({
         "message": f"Collection renamed to '{new_name}' successfully"
@@ -0,0 +1,207 @@
+# fastapi-backend/config/session_store.py
+"""
+Bounded, LRU-ordered session storage.
+
+Resident sessions keep their live Chroma handles. When the number of
+resident sessions or their estimated memory goes over budget, the least recently
+used session is evicted: its handles are dropped and only the plain metadata is
+kept. The next access rehydrates it and vectorstores reopen from
+user_uploads/<session>/collections/<id> on demand. At most SESSION_MAX_COLD
+evicted sessions keep their metadata; older ones are forgotten and rebuilt
+from the collection manifests on disk by initialize_session.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Optional
+
+SESSION_MAX_RESIDENT = int(os.getenv("SESSION_MAX_RESIDENT", "200"))
+SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "4096"))
+SESSION_MAX_COLD = int(os.getenv("SESSION_MAX_COLD", "5000"))
+# Loaded HNSW segments per Chroma store, least recently used unloaded first; 0 keeps them all
+CHROMA_SEGMENT_CACHE_MB = int(os.getenv("CHROMA_SEGMENT_CACHE_MB", "256"))
+
+# persist directory -> chromadb client, see chroma_client()
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def estimate_directory_bytes(directory: str) -> int:
+    """Rough in-memory cost of an open Chroma store: the size of its segment files"""
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def chroma_client(persist_directory: str):
+    """
+    The process-wide chromadb client of a persist directory. Every Chroma handle
+    on the directory shares it (and its System), so a store is never opened twice
+    and evicting a session only drops its LangChain wrappers. What a store keeps
+    in memory is bounded by chromadb's LRU segment cache (CHROMA_SEGMENT_CACHE_MB).
+    """
+    path = os.path.abspath(persist_directory)
+    with _chroma_clients_lock:
+        client = _chroma_clients.get(path)
+        if client is None:
+            import chromadb
+            from chromadb.config import Settings
+
+            cache_bytes = CHROMA_SEGMENT_CACHE_MB * 1024 * 1024
+            os.makedirs(path, exist_ok=True)
+            client = _chroma_clients[path] = chromadb.PersistentClient(path=path, settings=Settings(
+                anonymized_telemetry=False,
+                chroma_segment_cache_policy="LRU" if cache_bytes else None,
+                chroma_memory_limit_bytes=cache_bytes,
+            ))
+        return client
+
+
+def drop_chroma_store(persist_directory: str):
+    """
+    Delete every collection of a store through its client. The store's files
+    stay open, so the directory must not be removed from under it; re-creating
+    a collection there later reuses the same client.
+    """
+    client = chroma_client(persist_directory)
+    for collection in client.list_collections():
+        # chromadb 0.6 lists names, older releases list Collection objects
+        client.delete_collection(collection if isinstance(collection, str) else collection.name)
+
+
+class SessionStore(MutableMapping):
+    """Dict-like session storage with LRU eviction of live handles"""
+
+    def __init__(
+        self,
+        max_resident: int = SESSION_MAX_RESIDENT,
+        memory_budget_mb: int = SESSION_MEMORY_BUDGET_MB,
+        on_evict: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        max_cold: int = SESSION_MAX_COLD,
+    ):
+        self.max_resident = max_resident
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.on_evict = on_evict
+        self._resident: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cold: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_cold = max_cold
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._resident.get(session_id)
+            if session is not None:
+                self.hits += 1
+                self._resident.move_to_end(session_id)
+                return session
+
+            self.misses += 1
+            session = self._cold.pop(session_id, None)
+            if session is None:
+                raise KeyError(session_id)
+            self.rehydrations += 1
+            self._resident[session_id] = session
+            self._evict_locked(keep=session_id)
+            return session
+
+    def __setitem__(self, session_id: str, session: Dict[str, Any]):
+        with self._lock:
+            self._cold.pop(session_id, None)
+            self._resident[session_id] = session
+            self._resident.move_to_end(session_id)
+            self._evict_locked(keep=session_id)
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            if session_id in self._resident:
+                self._release(session_id, self._resident.pop(session_id))
+            elif session_id in self._cold:
+                del self._cold[session_id]
+            else:
+                raise KeyError(session_id)
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            return session_id in self._resident or session_id in self._cold
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._resident) + list(self._cold))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._resident) + len(self._cold)
+
+    def _session_bytes(self, session_id: str, session: Dict[str, Any]) -> int:
+        """Estimated memory held by the open vectorstores of a session"""
+        total = 0
+        for coll_id, coll in session.get("collections", {}).items():
+            if coll.get("vectorstore") is None:
+                continue
+            if "resident_bytes" not in coll:
+                from config.shared import collection_dir
+                coll["resident_bytes"] = estimate_directory_bytes(collection_dir(session_id, coll_id))
+            total += coll["resident_bytes"]
+        return total
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(self._session_bytes(sid, session) for sid, session in self._resident.items())
+
+    def _over_budget(self) -> bool:
+        if len(self._resident) > self.max_resident:
+            return True
+        return self.memory_budget_bytes > 0 and self.resident_bytes() > self.memory_budget_bytes
+
+    def enforce_budget(self, keep: str):
+        """Evict cold sessions after `keep` opened new handles"""
+        with self._lock:
+            self._evict_locked(keep=keep)
+
+    def _evict_locked(self, keep: str):
+        while self._over_budget():
+            # Least recently used first, skipping the session that triggered the eviction
+            oldest = next((sid for sid in self._resident if sid != keep), None)
+            if oldest is None:
+                break
+            session = self._resident.pop(oldest)
+            self._release(oldest, session)
+            self._cold[oldest] = session
+            self.evictions += 1
+            logging.info(f"Evicted session {oldest} from memory")
+        while len(self._cold) > self.max_cold:
+            self._cold.popitem(last=False)
+
+    def _release(self, session_id: str, session: Dict[str, Any]):
+        """Drop live handles, keeping only the plain metadata (on_evict drops derived objects)"""
+        for coll in session.get("collections", {}).values():
+            coll["vectorstore"] = None
+            coll.pop("resident_bytes", None)
+        if self.on_evict is not None:
+            self.on_evict(session_id, session)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resident_sessions": len(self._resident),
+                "cold_sessions": len(self._cold),
+                "max_cold": self.max_cold,
+                "max_resident": self.max_resident,
+                "resident_bytes": self.resident_bytes(),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
@@ -2,77 +2,212 @@
 """
 Shared configuration and session management to avoid circular imports
 """
+import asyncio
+import json
+import logging
 import os
+import threading
 import time
-from typing import Dict, Any
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional
 from chromadb.config import Settings
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_community.chat_models import ChatOllama
 from langchain.chains import ConversationalRetrievalChain
 from langchain.prompts import PromptTemplate
 from fastapi import Body, HTTPException
 from rag_calls.models import SingleRagRequest
+from dependencies.embeddings import get_embeddings, DEFAULT_EMBEDDING_MODEL
+from config.session_store import SessionStore, chroma_client
+
+# Global session storage, bounded by SESSION_MAX_RESIDENT / SESSION_MEMORY_BUDGET_MB.
+# Evicted sessions close their vectorstores, so their cached chains go too.
+SESSIONS: SessionStore = SessionStore(on_evict=lambda session_id, _: invalidate_chains(session_id))
+
+DEFAULT_CHAT_MODEL = "llama3.1"
+DEFAULT_QA_TEMPLATE = "You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
+
+# Collection metadata written to <collection_dir>/manifest.json
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FIELDS = ("name", "files", "created_at", "embedding_model")
+
+# Chains keyed by (session_id, collection_id, model, k, template), LRU bounded
+CHAIN_CACHE_SIZE = int(os.getenv("CHAIN_CACHE_SIZE", "64"))
+_CHAINS: "OrderedDict[tuple, Any]" = OrderedDict()
+_chain_lock = threading.Lock()
+
+# Guards lazy materialization, dependencies may run in the threadpool
+_materialize_lock = threading.RLock()
+
+# Serializes writers (ingest jobs, file/collection deletes) per (session_id, collection_id)
+_collection_locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def collection_dir(session_id: str, collection_id: str) -> str:
+    """On-disk location of a collection's Chroma store"""
+    # Import USER_DIRS here to avoid circular imports
+    from file_handlers.file_tools import USER_DIRS
+    return os.path.join(USER_DIRS, session_id, "collections", collection_id)
+
+
+def collection_lock(session_id: str, collection_id: str) -> asyncio.Lock:
+    """Lock held while a collection's store is rewritten, dropped once nobody holds or waits on it"""
+    key = (session_id, collection_id)
+    lock = _collection_locks.get(key)
+    if lock is None:
+        lock = _collection_locks[key] = asyncio.Lock()
+    return lock
+
+
+def write_collection_manifest(session_id: str, collection_id: str):
+    """Persist a collection's metadata next to its Chroma store"""
+    coll = SESSIONS[session_id]["collections"][collection_id]
+    manifest = {key: coll[key] for key in MANIFEST_FIELDS if key in coll}
+    manifest_path = os.path.join(collection_dir(session_id, collection_id), MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_collection_manifests(session_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Rebuild a session's collection index from the manifests on disk.
+    Only metadata is read, vectorstores stay closed until first use.
+    """
+    collections_root = os.path.dirname(collection_dir(session_id, "default"))
+    collections = {}
+    if not os.path.isdir(collections_root):
+        return collections
+
+    for coll_id in os.listdir(collections_root):
+        manifest_path = os.path.join(collections_root, coll_id, MANIFEST_NAME)
+        if coll_id == "default" or not os.path.isfile(manifest_path):
+            continue
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Skipping unreadable manifest {manifest_path}: {e}")
+            continue
+        collections[coll_id] = {
+            "vectorstore": None,
+            "name": manifest.get("name", coll_id),
+            "files": manifest.get("files", []),
+            "created_at": manifest.get("created_at", os.path.getmtime(manifest_path)),
+            "embedding_model": manifest.get("embedding_model", DEFAULT_EMBEDDING_MODEL),
+        }
+    return collections
 
-# Global session storage
-SESSIONS: Dict[str, Dict[str, Any]] = {}
 
 def initialize_session(session_id: str):
-    """Initialize a new session with a default empty collection"""
+    """
+    Register a session with a default collection plus any collections persisted on disk.
+    The vectorstores and chain are only built on first retrieval/chat.
+    """
     if session_id not in SESSIONS:
-        # Import USER_DIRS here to avoid circular imports
-        from file_handlers.file_tools import USER_DIRS
-        
-        # Create default empty vectorstore
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2", 
-            model_kwargs={'trust_remote_code': True}
-        )
-        
-        # Create collection directory for default collection
-        default_collection_dir = os.path.join(USER_DIRS, session_id, "collections", "default")
-        os.makedirs(default_collection_dir, exist_ok=True)
-        
-        # Create empty vectorstore
-        default_vectorstore = Chroma(
-            embedding_function=embeddings,
-            persist_directory=default_collection_dir,
-        )
-        
-        # Create LLM and chatbot chain for default collection
-        llm = ChatOllama(model="llama3.1", temperature=0)
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
-        )
-        
-        # Create retriever (will be empty initially)
-        retriever = default_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        
-        # Create chain
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        
         SESSIONS[session_id] = {
             "collections": {
                 "default": {
-                    "vectorstore": default_vectorstore,
+                    "vectorstore": None,
                     "name": "Default Chat",
                     "files": [],
                     "created_at": time.time(),
-                    "embedding_model": "sentence-transformers/all-MiniLM-L6-v2"
-                }
+                    "embedding_model": DEFAULT_EMBEDDING_MODEL
+                },
+                **load_collection_manifests(session_id),
             },
             "active_collection_id": "default",
             "history": [],
-            "chain": chain
+            # Prompt template of the session's chatbot, None means DEFAULT_QA_TEMPLATE
+            "chat_template": None
         }
-        print(f"DEBUG: Initialized new session {session_id} with default collection")
+
+
+def get_collection_vectorstore(session_id: str, collection_id: str):
+    """Return the collection's vectorstore, opening it from disk on first use"""
+    coll = SESSIONS[session_id]["collections"][collection_id]
+    if coll.get("vectorstore") is not None:
+        return coll["vectorstore"]
+
+    with _materialize_lock:
+        if coll.get("vectorstore") is None:
+            directory = collection_dir(session_id, collection_id)
+            os.makedirs(directory, exist_ok=True)
+            coll["vectorstore"] = Chroma(
+                client=chroma_client(directory),
+                embedding_function=get_embeddings(coll.get("embedding_model", DEFAULT_EMBEDDING_MODEL)),
+                persist_directory=directory,
+            )
+            logging.debug(f"Opened vectorstore for collection {collection_id} in session {session_id}")
+        SESSIONS.enforce_budget(keep=session_id)
+    return coll["vectorstore"]
+
+
+@lru_cache(maxsize=None)
+def _chat_llm(model: str):
+    return ChatOllama(model=model, temperature=0)
+
+
+@lru_cache(maxsize=None)
+def _qa_prompt(template: str):
+    return PromptTemplate(input_variables=["context", "question"], template=template)
+
+
+def build_chain(vectorstore, model: str = DEFAULT_CHAT_MODEL, template: str = DEFAULT_QA_TEMPLATE, k: int = 2):
+    """Create a ConversationalRetrievalChain over `vectorstore`"""
+    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": k})
+    return ConversationalRetrievalChain.from_llm(
+        llm=_chat_llm(model),
+        retriever=retriever,
+        return_source_documents=True,
+        combine_docs_chain_kwargs={"prompt": _qa_prompt(template)},
+        verbose=True
+    )
+
+
+def get_chain(session_id: str, collection_id: str, model: str = DEFAULT_CHAT_MODEL,
+              template: str = DEFAULT_QA_TEMPLATE, k: int = 2):
+    """Cached chain for (collection, model, k, template), built on first use"""
+    key = (session_id, collection_id, model, k, template)
+    with _chain_lock:
+        chain = _CHAINS.get(key)
+        if chain is not None:
+            _CHAINS.move_to_end(key)
+            return chain
+
+    vectorstore = get_collection_vectorstore(session_id, collection_id)
+    chain = build_chain(vectorstore, model=model, template=template, k=k)
+
+    with _chain_lock:
+        chain = _CHAINS.setdefault(key, chain)
+        _CHAINS.move_to_end(key)
+        while len(_CHAINS) > CHAIN_CACHE_SIZE:
+            _CHAINS.popitem(last=False)
+    return chain
+
+
+def invalidate_chains(session_id: str, collection_id: Optional[str] = None):
+    """Drop cached chains of a session (or one of its collections) whose vectorstore changed"""
+    with _chain_lock:
+        for key in [key for key in _CHAINS if key[0] == session_id and collection_id in (None, key[1])]:
+            del _CHAINS[key]
+
+
+def get_session_chain(session_id: str, model: str = DEFAULT_CHAT_MODEL):
+    """Return the chatbot chain for the session's active collection and prompt template"""
+    session = SESSIONS[session_id]
+    active_collection_id = session.get("active_collection_id")
+    if not active_collection_id or active_collection_id not in session["collections"]:
+        # Set to default if no valid active collection
+        session["active_collection_id"] = "default"
+        active_collection_id = "default"
+    template = session.get("chat_template") or DEFAULT_QA_TEMPLATE
+    return get_chain(session_id, active_collection_id, model=model, template=template)
+
 
 def get_vectorstore(payload: SingleRagRequest = Body(...)):
     """
@@ -93,8 +228,8 @@ def get_vectorstore(payload: SingleRagRequest = Body(...)):
     if coll is None:
         raise HTTPException(400, f"No collection '{coll_id}' in session {session_id}")
 
-    # 2) Pull the vectorstore out of that collection
-    vs = coll.get("vectorstore")
+    # 2) Pull the vectorstore out of that collection (opened lazily)
+    vs = get_collection_vectorstore(session_id, coll_id)
 
     print("Checking vector store!!!: ", vs)
     if vs is None:
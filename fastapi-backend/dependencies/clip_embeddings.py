@@ -0,0 +1,80 @@
+# fastapi-backend/dependencies/clip_embeddings.py
+"""
+CPU image embeddings with a sentence-transformers CLIP model.
+
+Images and text queries are embedded into the same space, so an image index
+built from image vectors can be searched with plain text. Images are decoded
+and downscaled in a thread pool, one batch of CLIP_BATCH_SIZE at a time, so a
+large upload never has all its decoded bitmaps in memory.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from PIL import Image
+
+# ViT-B/32 is the cheapest CLIP variant to run on CPU
+CLIP_MODEL = os.getenv("CLIP_MODEL", "clip-ViT-B-32")
+CLIP_BATCH_SIZE = int(os.getenv("CLIP_BATCH_SIZE", "16"))
+CLIP_DECODE_WORKERS = int(os.getenv("CLIP_DECODE_WORKERS", "4"))
+# CLIP works on 224x224 crops; decoding straight to about that size saves most of the work
+CLIP_IMAGE_SIDE = 224
+
+
+def load_image(path: str) -> Image.Image:
+    """Decode an image (first frame for GIFs) and shrink it close to the CLIP input size"""
+    with Image.open(path) as img:
+        img.draft("RGB", (CLIP_IMAGE_SIDE * 2, CLIP_IMAGE_SIDE * 2))  # JPEG DCT scaling, no-op otherwise
+        img = img.convert("RGB")
+    img.thumbnail((CLIP_IMAGE_SIDE * 2, CLIP_IMAGE_SIDE * 2))
+    return img
+
+
+class ClipEmbeddings(Embeddings):
+    """LangChain Embeddings for CLIP text queries, plus embed_images for image files"""
+
+    def __init__(self, model_name: str = CLIP_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        logging.info(f"Loading CLIP model {model_name}")
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self._lock = threading.Lock()
+
+    def _encode(self, inputs) -> np.ndarray:
+        with self._lock:
+            return self.model.encode(inputs, batch_size=CLIP_BATCH_SIZE, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def embed_images(self, paths: List[str]) -> np.ndarray:
+        """Normalised image vectors, one row per path"""
+        vectors = []
+        with ThreadPoolExecutor(max_workers=CLIP_DECODE_WORKERS) as pool:
+            for start in range(0, len(paths), CLIP_BATCH_SIZE):
+                images = list(pool.map(load_image, paths[start:start + CLIP_BATCH_SIZE]))
+                vectors.append(self._encode(images))
+        return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+_clip: Optional[ClipEmbeddings] = None
+_clip_lock = threading.Lock()
+
+
+def get_clip_embeddings() -> ClipEmbeddings:
+    """Shared CLIP model, loaded once on first use even when several threads ask at the same time"""
+    global _clip
+    if _clip is None:
+        with _clip_lock:
+            if _clip is None:
+                _clip = ClipEmbeddings()
+    return _clip
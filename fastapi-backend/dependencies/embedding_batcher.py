@@ -0,0 +1,197 @@
+# fastapi-backend/dependencies/embedding_batcher.py
+"""
+Cross-request embedding batcher.
+
+Every embed_documents/embed_query call (ingest jobs, vectorstore retrievers,
+all sessions) is put on one queue per model. A worker thread coalesces
+whatever is pending into a single forward pass of at most
+EMBED_BATCH_MAX_SIZE texts, waiting at most EMBED_BATCH_MAX_WAIT_MS for the
+batch to fill, and hands each caller its slice of the result.
+
+The worker thread only holds the queue and the wrapped model, not the
+BatchingEmbeddings itself: once nothing references the wrapper any more (e.g.
+a model evicted from the registry whose vectorstores are gone) it is collected,
+the worker is told to stop and the model is freed.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "1") != "0"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    """Counts per bucket, each bound is an inclusive upper limit"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.bounds] + ["inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+        }
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class _BatchWorker:
+    """The batching loop and its queue, shared by a BatchingEmbeddings and its thread"""
+
+    def __init__(self, model: Embeddings, max_batch_size: int, max_wait: float):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._carry: Optional[_Request] = None
+        self.stats_lock = threading.Lock()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_latency_ms = Histogram(QUEUE_LATENCY_BUCKETS_MS)
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        first = self._carry or self.queue.get()
+        self._carry = None
+        if first is None:
+            return None
+        batch, size = [first], len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish this batch, stop on the next round
+                self.queue.put(None)
+                break
+            if size + len(request.texts) > self.max_batch_size:
+                # Doesn't fit, it opens the next batch instead
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            with self.stats_lock:
+                self.batch_sizes.observe(len(texts))
+                for request in batch:
+                    self.queue_latency_ms.observe((started - request.enqueued_at) * 1000)
+            try:
+                vectors = self.model.embed_documents(texts)
+            except Exception as e:
+                logging.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings wrapper that funnels all callers through one batching worker"""
+
+    def __init__(self, model: Embeddings, name: str = "",
+                 max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._batcher = _BatchWorker(model, max_batch_size, max_wait_ms / 1000)
+        self._worker = threading.Thread(target=self._batcher.run, name=f"embed-batcher-{name}", daemon=True)
+        self._worker.start()
+        # Stop the worker (and let go of the model) once this wrapper is collected
+        weakref.finalize(self, self._batcher.queue.put, None)
+
+    def __getattr__(self, name):
+        # Anything else (client, model_name, ...) comes from the wrapped model
+        try:
+            model = object.__getattribute__(self, "model")
+        except AttributeError:
+            # Not initialised yet (copy, pickle, hasattr before __init__)
+            raise AttributeError(name) from None
+        return getattr(model, name)
+
+    def _submit(self, texts: List[str]) -> List[List[float]]:
+        # Large requests are split so no single caller monopolises a batch
+        requests = [_Request(texts[i:i + self.max_batch_size]) for i in range(0, len(texts), self.max_batch_size)]
+        with self._submit_lock:
+            if self._closed:
+                return self.model.embed_documents(texts)
+            for request in requests:
+                self._batcher.queue.put(request)
+        vectors = []
+        for request in requests:
+            vectors.extend(request.future.result())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._submit(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        # HuggingFaceEmbeddings encodes queries and documents the same way
+        return self._submit([text])[0]
+
+    def close(self):
+        """Stop the worker once the queued requests are served, later calls embed unbatched"""
+        with self._submit_lock:
+            if not self._closed:
+                self._closed = True
+                self._batcher.queue.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        batcher = self._batcher
+        with batcher.stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": batcher.max_wait * 1000,
+                "queued": batcher.queue.qsize(),
+                "batch_size": batcher.batch_sizes.snapshot(),
+                "queue_latency_ms": batcher.queue_latency_ms.snapshot(),
+            }
@@ -0,0 +1,247 @@
+# fastapi-backend/dependencies/embedding_cache.py
+"""
+Content-addressed on-disk embedding cache, shared by every session and collection.
+
+Vectors are keyed by sha256(model name, chunk text) (or another key, e.g. an
+image hash, through get_or_compute). Each model has its own
+directory holding two append-only files:
+    vectors.f32  rows of float32, read through a numpy memmap
+    keys.bin     one 32-byte digest per row, in the same order
+The in-memory index (digest -> row) is rebuilt from keys.bin on first use.
+Keys are written after their vectors, so a crash can at worst leave an
+unreferenced trailing row, which is ignored on load.
+
+Several processes (uvicorn workers) can share the directory: appends hold an
+fcntl lock on the model's `lock` file and first read the rows other processes
+added since (keys.bin grew), so rows are never written over each other. Without
+fcntl (Windows) the cache is only safe for a single process.
+"""
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+# Set to "0" to always embed from scratch
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") != "0"
+
+DIGEST_BYTES = 32
+
+
+def _digest(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+
+class _ModelCache:
+    """Vectors of one embedding model"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.dim: Optional[int] = None
+        self.index: Dict[bytes, int] = {}
+        # Rows of keys.bin read into the index so far
+        self.rows = 0
+        self._keys_size = 0
+        self._vectors: Optional[np.memmap] = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._refresh()
+
+    def _refresh(self):
+        """Index the rows appended (by this or another process) since the last call"""
+        if self.dim is None:
+            dim_path = os.path.join(self.directory, "dim")
+            if os.path.exists(dim_path):
+                with open(dim_path) as f:
+                    self.dim = int(f.read().strip())
+        if self.dim is None or not os.path.exists(self.keys_path):
+            return
+        keys_size = os.path.getsize(self.keys_path)
+        if keys_size == self._keys_size:
+            return
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        rows = min(keys_size // DIGEST_BYTES, vector_rows)
+        if rows > self.rows:
+            with open(self.keys_path, "rb") as f:
+                f.seek(self.rows * DIGEST_BYTES)
+                keys = f.read((rows - self.rows) * DIGEST_BYTES)
+            for i in range(rows - self.rows):
+                self.index.setdefault(keys[i * DIGEST_BYTES:(i + 1) * DIGEST_BYTES], self.rows + i)
+            self.rows = rows
+        self._keys_size = keys_size
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the model directory across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, "lock"), "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _map(self) -> Optional[np.memmap]:
+        """Memmap of the committed rows, remapped when the file has grown"""
+        rows = self.rows
+        if not rows:
+            return None
+        if self._vectors is None or self._vectors.shape[0] < rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def lookup(self, digests: List[bytes]) -> Dict[bytes, np.ndarray]:
+        self._refresh()
+        rows = {d: self.index[d] for d in digests if d in self.index}
+        if not rows:
+            return {}
+        vectors = self._map()
+        return {d: np.array(vectors[row]) for d, row in rows.items()}
+
+    def append(self, digests: List[bytes], vectors: np.ndarray):
+        with self._file_lock():
+            self._append_locked(digests, vectors)
+
+    def _append_locked(self, digests: List[bytes], vectors: np.ndarray):
+        # Another process may have appended (maybe the same chunks) since our last look
+        self._refresh()
+        new = [i for i, d in enumerate(digests) if d not in self.index]
+        if not new:
+            return
+        digests, vectors = [digests[i] for i in new], vectors[new]
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(os.path.join(self.directory, "dim"), "w") as f:
+                f.write(str(self.dim))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+        first_row = self.rows
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+            # Overwrite any orphan rows left behind by an interrupted write
+            f.seek(first_row * self.dim * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.truncate()
+        with open(self.keys_path, "r+b" if os.path.exists(self.keys_path) else "wb") as f:
+            f.seek(first_row * DIGEST_BYTES)
+            f.write(b"".join(digests))
+            f.truncate()
+        for i, d in enumerate(digests):
+            self.index[d] = first_row + i
+        self.rows = first_row + len(digests)
+        self._keys_size = self.rows * DIGEST_BYTES
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(p) for p in (self.vectors_path, self.keys_path) if os.path.exists(p))
+
+
+class EmbeddingCache:
+    """Thread-safe cache in front of embeddings.embed_documents"""
+
+    def __init__(self, root: str = EMBEDDING_CACHE_DIR, enabled: bool = EMBEDDING_CACHE_ENABLED):
+        self.root = root
+        self.enabled = enabled
+        self._models: Dict[str, _ModelCache] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _model(self, model_name: str) -> _ModelCache:
+        cache = self._models.get(model_name)
+        if cache is None:
+            directory = os.path.join(self.root, hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16])
+            cache = self._models[model_name] = _ModelCache(directory)
+            with open(os.path.join(directory, "model_name"), "w") as f:
+                f.write(model_name)
+        return cache
+
+    def embed_documents(self, model_name: str, embeddings, texts: List[str],
+                        counters: Optional[Dict[str, int]] = None) -> List[List[float]]:
+        """
+        Embed `texts` with `embeddings`, computing only the chunks this model has
+        never seen. Returns one vector per text, in order. Per-caller hit/miss
+        counts are added to `counters` if given.
+        """
+        if not self.enabled or not texts:
+            return embeddings.embed_documents(texts)
+
+        # Vectors from another backend (e.g. int8 ONNX) are kept apart from the PyTorch ones
+        backend = getattr(embeddings, "backend", "torch")
+        if backend != "torch":
+            model_name = f"{model_name}#{backend}"
+        return self.get_or_compute(model_name, texts, embeddings.embed_documents, counters).tolist()
+
+    def get_or_compute(self, namespace: str, keys: List[str], compute: Callable[[List[str]], Any],
+                       counters: Optional[Dict[str, int]] = None) -> np.ndarray:
+        """
+        Vectors for `keys` (chunk texts, image hashes, ...) in `namespace`, calling
+        compute(missing_keys) only for keys never seen before. Returns a float32
+        array with one row per key.
+        """
+        if not self.enabled:
+            return np.asarray(compute(keys), dtype=np.float32)
+
+        digests = [_digest(namespace, key) for key in keys]
+        with self._lock:
+            cache = self._model(namespace)
+            found = cache.lookup(digests)
+
+        # Duplicate keys inside the batch are computed once
+        missing = {}
+        for d, key in zip(digests, keys):
+            if d not in found and d not in missing:
+                missing[d] = key
+        if missing:
+            computed = np.asarray(compute(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                new = [(d, row) for d, row in zip(missing, computed) if d not in cache.index]
+                if new:
+                    cache.append([d for d, _ in new], np.stack([row for _, row in new]))
+            found.update(zip(missing, computed))
+
+        with self._lock:
+            hits = len(keys) - len(missing)
+            self.hits += hits
+            self.misses += len(missing)
+            self.bytes_saved += hits * (cache.dim or 0) * 4
+        if counters is not None:
+            counters["cache_hits"] = counters.get("cache_hits", 0) + hits
+            counters["cache_misses"] = counters.get("cache_misses", 0) + len(missing)
+        logging.info(f"Embedding cache ({namespace}): {hits} hits, {len(missing)} misses")
+        return np.stack([found[d] for d in digests]) if keys else np.zeros((0, cache.dim or 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "bytes_saved": self.bytes_saved,
+                "models": [
+                    {"model_name": name, "vectors": cache.rows, "dim": cache.dim, "disk_bytes": cache.disk_bytes()}
+                    for name, cache in self._models.items()
+                ],
+            }
+
+
+EMBEDDING_CACHE = EmbeddingCache()
+
+
+def embed_documents_cached(model_name: str, embeddings, texts: List[str],
+                           counters: Optional[Dict[str, int]] = None) -> List[List[float]]:
+    """embeddings.embed_documents(texts), served from the shared cache where possible"""
+    return EMBEDDING_CACHE.embed_documents(model_name, embeddings, texts, counters)
@@ -0,0 +1,177 @@
+# fastapi-backend/dependencies/embeddings.py
+"""
+Process-wide embedding model registry.
+
+Loading sentence-transformers weights takes seconds and hundreds of MB, so every
+caller (sessions, ingest, vector generation) shares one instance per
+(model_name, model_kwargs). Idle models are evicted LRU-first once the
+configured memory budget is exceeded.
+"""
+import json
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from dependencies.embedding_batcher import BatchingEmbeddings, EMBED_BATCHING_ENABLED
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_MODEL_KWARGS = {"trust_remote_code": True}
+
+# Memory budget for resident models (MB); 0 disables budget-based eviction
+EMBEDDING_MEMORY_BUDGET_MB = int(os.getenv("EMBEDDING_MEMORY_BUDGET_MB", "2048"))
+# Comma separated list of models to load at startup
+EMBEDDING_PRELOAD_MODELS = os.getenv("EMBEDDING_PRELOAD_MODELS", DEFAULT_EMBEDDING_MODEL)
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (dependencies/onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Models served by the ONNX backend when it is selected, the others stay on PyTorch
+EMBEDDING_ONNX_MODELS = os.getenv("EMBEDDING_ONNX_MODELS", DEFAULT_EMBEDDING_MODEL)
+
+
+def _registry_key(model_name: str, model_kwargs: Dict[str, Any]) -> Tuple[str, str]:
+    return model_name, json.dumps(model_kwargs, sort_keys=True, default=str)
+
+
+def _load_model(model_name: str, model_kwargs: Dict[str, Any]):
+    """Instantiate the model on the configured backend, PyTorch if ONNX can't be used"""
+    onnx_models = [name.strip() for name in EMBEDDING_ONNX_MODELS.split(",")]
+    if EMBEDDING_BACKEND in ("onnx", "onnx-int8") and model_name in onnx_models:
+        try:
+            from dependencies.onnx_embeddings import OnnxEmbeddings
+            return OnnxEmbeddings(model_name, quantize=EMBEDDING_BACKEND == "onnx-int8")
+        except Exception as e:
+            logging.error(f"ONNX backend unavailable for {model_name}, using PyTorch: {e}")
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=dict(model_kwargs))
+
+
+def _estimate_model_bytes(embeddings) -> int:
+    """Size of the model parameters and buffers, 0 if it can't be measured"""
+    if hasattr(embeddings, "model_bytes"):
+        return embeddings.model_bytes
+    try:
+        client = embeddings.client
+        tensors = list(client.parameters()) + list(client.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+
+class EmbeddingRegistry:
+    """Thread-safe LRU cache of loaded embedding models"""
+
+    def __init__(self, memory_budget_mb: int = EMBEDDING_MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self._models: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key so two threads asking for the same model load it once,
+        # while different models can still load in parallel
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # Evicted models still referenced elsewhere (vectorstores, chains); get() adopts
+        # them back instead of loading a second copy
+        self._evicted: "weakref.WeakValueDictionary[Tuple[str, str], Any]" = weakref.WeakValueDictionary()
+        self._evicted_bytes: Dict[Tuple[str, str], int] = {}
+
+    def get(self, model_name: str = DEFAULT_EMBEDDING_MODEL, model_kwargs: Optional[Dict[str, Any]] = None):
+        """Return the shared embeddings for this model, loading it on first use"""
+        model_kwargs = DEFAULT_MODEL_KWARGS if model_kwargs is None else model_kwargs
+        key = _registry_key(model_name, model_kwargs)
+
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry["embeddings"]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    return entry["embeddings"]
+                embeddings = self._evicted.pop(key, None)
+                if embeddings is not None:
+                    logging.info(f"Reusing evicted embedding model {model_name}, it is still referenced")
+                    self._models[key] = {"embeddings": embeddings, "bytes": self._evicted_bytes.pop(key, 0)}
+                    self._evict_locked(keep=key)
+                    return embeddings
+
+            logging.info(f"Loading embedding model {model_name}")
+            embeddings = _load_model(model_name, model_kwargs)
+            size = _estimate_model_bytes(embeddings)
+            if EMBED_BATCHING_ENABLED:
+                # Concurrent callers share forward passes, see dependencies/embedding_batcher.py
+                embeddings = BatchingEmbeddings(embeddings, name=model_name)
+
+            with self._lock:
+                self._models[key] = {"embeddings": embeddings, "bytes": size}
+                self._evict_locked(keep=key)
+            return embeddings
+
+    def _evict_locked(self, keep: Tuple[str, str]):
+        """Drop least recently used models until we are back under budget"""
+        if self.memory_budget_bytes <= 0:
+            return
+        while self.resident_bytes() > self.memory_budget_bytes and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            # Not closed: vectorstores and chains may still embed through it. It is
+            # freed once the last of them lets go, or adopted back by get() before that.
+            evicted = self._models.pop(oldest)
+            try:
+                self._evicted[oldest] = evicted["embeddings"]
+                self._evicted_bytes[oldest] = evicted["bytes"]
+                weakref.finalize(evicted["embeddings"], self._evicted_bytes.pop, oldest, None)
+            except TypeError:
+                pass  # not weak-referenceable (plain HuggingFaceEmbeddings), can't be adopted back
+            self._load_locks.pop(oldest, None)
+            logging.info(f"Evicted embedding model {oldest[0]} ({evicted['bytes'] // (1024 * 1024)} MB)")
+
+    def resident_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in self._models.values())
+
+    def preload(self, model_names: List[str]):
+        """Load a list of models up front, e.g. at application startup"""
+        for name in model_names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Failed to preload embedding model {name}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": [
+                    {
+                        "model_name": key[0],
+                        "model_kwargs": json.loads(key[1]),
+                        "bytes": entry["bytes"],
+                        "backend": getattr(entry["embeddings"], "backend", "torch"),
+                        "batcher": entry["embeddings"].stats() if isinstance(entry["embeddings"], BatchingEmbeddings) else None,
+                    }
+                    for key, entry in self._models.items()
+                ],
+                "resident_bytes": self.resident_bytes(),
+                # Evicted but kept alive by vectorstores/chains, freed once those go away
+                "evicted_referenced_bytes": sum(self._evicted_bytes.get(key, 0) for key in self._evicted.keys()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+            }
+
+
+EMBEDDINGS = EmbeddingRegistry()
+
+
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL, model_kwargs: Optional[Dict[str, Any]] = None):
+    """Shared embedding model for `model_name`"""
+    return EMBEDDINGS.get(model_name, model_kwargs)
+
+
+def preload_embeddings():
+    """Load the models listed in EMBEDDING_PRELOAD_MODELS"""
+    names = [name.strip() for name in EMBEDDING_PRELOAD_MODELS.split(",") if name.strip()]
+    EMBEDDINGS.preload(names)
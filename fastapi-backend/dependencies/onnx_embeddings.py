@@ -0,0 +1,123 @@
+# fastapi-backend/dependencies/onnx_embeddings.py
+"""
+ONNX Runtime embedding backend for sentence-transformers models with mean pooling
+(all-MiniLM-L6-v2 and friends).
+
+The Hugging Face model is exported to ONNX once (and optionally quantized to
+int8 with dynamic quantization) under EMBEDDING_ONNX_DIR, then served with
+onnxruntime on CPU behind the LangChain `Embeddings` interface, so it drops in
+wherever HuggingFaceEmbeddings is used. Select it with EMBEDDING_BACKEND=onnx
+or EMBEDDING_BACKEND=onnx-int8, see dependencies/embeddings.py.
+"""
+import logging
+import os
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "onnx_models")
+# Same limit sentence-transformers uses for all-MiniLM-L6-v2
+EMBEDDING_ONNX_MAX_LENGTH = int(os.getenv("EMBEDDING_ONNX_MAX_LENGTH", "256"))
+EMBEDDING_ONNX_BATCH_SIZE = int(os.getenv("EMBEDDING_ONNX_BATCH_SIZE", "32"))
+# 0 lets onnxruntime use every core
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+
+# BERT forward() argument order, used for the export
+_FORWARD_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+_export_lock = threading.Lock()
+
+
+def export_onnx(model_name: str, onnx_dir: str = EMBEDDING_ONNX_DIR, quantize: bool = False) -> str:
+    """Export `model_name` to ONNX (and int8) if not done yet, return the model path"""
+    target = os.path.join(onnx_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(target, "model.onnx")
+    int8_path = os.path.join(target, "model.int8.onnx")
+
+    with _export_lock:
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+
+            logging.info(f"Exporting {model_name} to ONNX in {target}")
+            os.makedirs(target, exist_ok=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModel.from_pretrained(model_name).eval()
+            sample = tokenizer(["export sample"], return_tensors="pt")
+            input_names = [name for name in _FORWARD_INPUTS if name in sample]
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+            tmp_path = fp32_path + ".tmp"
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    tuple(sample[name] for name in input_names),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14,
+                )
+            os.replace(tmp_path, fp32_path)
+
+        if quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logging.info(f"Quantizing {fp32_path} to int8")
+            tmp_path = int8_path + ".tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+
+    return int8_path if quantize else fp32_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalised sentence embeddings computed with onnxruntime"""
+
+    def __init__(self, model_name: str, quantize: bool = False, onnx_dir: str = EMBEDDING_ONNX_DIR,
+                 max_length: int = EMBEDDING_ONNX_MAX_LENGTH, batch_size: int = EMBEDDING_ONNX_BATCH_SIZE):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.backend = "onnx-int8" if quantize else "onnx"
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        model_path = export_onnx(model_name, onnx_dir, quantize)
+        self.model_bytes = os.path.getsize(model_path)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = EMBEDDING_ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+
+        # Mean pooling over real tokens, then L2 normalisation (as the sentence-transformers pipeline does)
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Batch texts of similar length together to keep padding small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self._embed_batch([texts[i] for i in indices])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[indices] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -9,9 +9,9 @@ import logging
 import os
 import ollama
 import json
-import shutil
 
 from utils import segment_and_export_tables
+from file_handlers.uploads import save_upload
 
 router = APIRouter(tags=["files"])
 
@@ -105,8 +105,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
             unique_name = f"{file.filename}"
             file_path = os.path.join(UPLOAD_DIR, unique_name)
         
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload(file, file_path, session_id, UPLOAD_DIR)
             
             logging.info("File saved, processing tables...")
             table_info = segment_and_export_tables(file_path, session_id)
@@ -121,8 +120,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
             unique_name = f"{file_name}"
             file_path = os.path.join(UPLOAD_DIR, unique_name)
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload(file, file_path, session_id, UPLOAD_DIR)
             
             response_data = {
                 "file_name": file_name
@@ -133,8 +131,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
             unique_name = f"{file_name}"
             file_path = os.path.join(UPLOAD_DIR, unique_name)
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload(file, file_path, session_id, UPLOAD_DIR)
 
             response_data = {
                 "file_name": file_name
@@ -145,8 +142,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
             unique_name = f"{file_name}"
             file_path = os.path.join(UPLOAD_DIR, unique_name)
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload(file, file_path, session_id, UPLOAD_DIR)
             
             response_data = {
                 "file_name": file_name
@@ -156,8 +152,7 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
             unique_name = f"{file_name}"
             file_path = os.path.join(UPLOAD_DIR, unique_name)
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload(file, file_path, session_id, UPLOAD_DIR)
             
             response_data = {
                 "file_name": file_name
@@ -168,6 +163,8 @@ async def upload_file(request: Request, file: UploadFile = File(...), file_type:
         logging.info("Upload complete")
         return JSONResponse(content=response_data)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error during upload: {str(e)}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
\ No newline at end of file
@@ -0,0 +1,97 @@
+# fastapi-backend/file_handlers/uploads.py
+"""
+Shared upload layer.
+
+Uploads are copied to their destination in UPLOAD_CHUNK_BYTES chunks with async
+file I/O, hashed (sha256) on the fly and checked against a per-file limit and a
+per-session quota, so no upload is ever held in memory as a whole. Callers get
+back the path on disk, which is what parsers take.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from config.session_store import estimate_directory_bytes
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# 0 disables the limit
+UPLOAD_MAX_FILE_MB = int(os.getenv("UPLOAD_MAX_FILE_MB", "2048"))
+UPLOAD_SESSION_QUOTA_MB = int(os.getenv("UPLOAD_SESSION_QUOTA_MB", "10240"))
+
+# Bytes written so far by the uploads running right now, per session, so concurrent
+# uploads share the quota without re-walking the session directory for every chunk
+_in_flight: Dict[str, int] = {}
+
+
+@dataclass
+class SavedUpload:
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def _is_within(path: str, directory: str) -> bool:
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+
+async def save_upload(upload: UploadFile, dest_path: str, session_id: str, session_dir: str) -> SavedUpload:
+    """
+    Stream `upload` to `dest_path`. Raises 413 (and removes the partial file) once
+    the file or the session's usage of `session_dir` goes over its limit.
+    """
+    max_file = UPLOAD_MAX_FILE_MB * 1024 * 1024
+    quota = UPLOAD_SESSION_QUOTA_MB * 1024 * 1024
+    used = 0
+    if quota:
+        # What the running uploads already wrote is on disk and also counted in _in_flight;
+        # keep it in _in_flight only. A file being replaced is truncated below, so it doesn't count.
+        already_in_flight = _in_flight.get(session_id, 0)
+        used = await run_in_threadpool(estimate_directory_bytes, session_dir)
+        used -= already_in_flight
+        if os.path.isfile(dest_path) and _is_within(dest_path, session_dir):
+            used -= os.path.getsize(dest_path)
+        used = max(0, used)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    reserved = 0
+
+    def release():
+        # Give the quota back as soon as the upload fails, not once its file is closed
+        nonlocal reserved
+        remaining = _in_flight.get(session_id, 0) - reserved
+        reserved = 0
+        if remaining:
+            _in_flight[session_id] = remaining
+        else:
+            _in_flight.pop(session_id, None)
+
+    try:
+        async with await anyio.open_file(dest_path, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if max_file and size > max_file:
+                    release()
+                    raise HTTPException(413, f"{upload.filename} is larger than {UPLOAD_MAX_FILE_MB} MB")
+                if quota and used + _in_flight.get(session_id, 0) + len(chunk) > quota:
+                    release()
+                    raise HTTPException(413, f"Session upload quota of {UPLOAD_SESSION_QUOTA_MB} MB exceeded")
+                _in_flight[session_id] = _in_flight.get(session_id, 0) + len(chunk)
+                reserved += len(chunk)
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    finally:
+        release()
+
+    return SavedUpload(path=dest_path, filename=upload.filename, size=size, sha256=digest.hexdigest())
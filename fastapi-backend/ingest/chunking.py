@@ -0,0 +1,158 @@
+# fastapi-backend/ingest/chunking.py
+"""
+Token-aware chunking with per-filetype policies.
+
+Chunk sizes are counted in tokens of the embedding model the chunks are for,
+so a chunk never silently overflows the model's input window and chunk counts
+no longer depend on how wordy a file type is. Policies:
+
+- pdf:    pages (one Document per page from the PDF engine) split into chunks
+- slides: one chunk per slide when it fits, long slides split further
+- table:  header windows from ingest/tabular.py, oversized windows split on
+          rows with the "Columns: ..." header repeated in every piece
+- prose:  everything else (docx, summaries, documents without a known extension)
+
+Token counts are cached per model, the recursive splitter measures the same
+pieces many times while merging them back into chunks.
+"""
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from dependencies.embeddings import DEFAULT_EMBEDDING_MODEL
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+# Per-policy overrides, e.g. '{"pdf": {"chunk_tokens": 300}, "table": {"chunk_tokens": 120}}'
+CHUNK_POLICIES = os.getenv("CHUNK_POLICIES", "")
+CHUNK_TOKEN_CACHE_SIZE = int(os.getenv("CHUNK_TOKEN_CACHE_SIZE", "200000"))
+
+SLIDE_HEADER = re.compile(r"^--- Slide (\d+) ---$", re.MULTILINE)
+TABLE_HEADER_PREFIX = "Columns: "
+
+
+@dataclass(frozen=True)
+class ChunkPolicy:
+    name: str
+    chunk_tokens: int = CHUNK_TOKENS
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+
+
+POLICIES: Dict[str, ChunkPolicy] = {
+    "pdf": ChunkPolicy("pdf"),
+    "slides": ChunkPolicy("slides", overlap_tokens=0),
+    "table": ChunkPolicy("table", overlap_tokens=0),
+    "prose": ChunkPolicy("prose"),
+}
+for _name, _overrides in (json.loads(CHUNK_POLICIES) if CHUNK_POLICIES else {}).items():
+    POLICIES[_name] = replace(POLICIES.get(_name, ChunkPolicy(_name)), **_overrides)
+
+FILETYPE_POLICIES = {
+    ".pdf": "pdf",
+    ".pptx": "slides", ".ppt": "slides",
+    ".csv": "table", ".xlsx": "table", ".xls": "table",
+}
+
+
+def policy_for(doc: Document) -> ChunkPolicy:
+    """Policy for the doc's filetype, taken from the extension of its source when not set (API documents)"""
+    filetype = doc.metadata.get("filetype") or os.path.splitext(str(doc.metadata.get("source", "")))[1]
+    return POLICIES[FILETYPE_POLICIES.get(filetype.lower(), "prose")]
+
+
+@lru_cache(maxsize=None)
+def token_counter(model_name: str) -> Callable[[str], int]:
+    """Cached token count function for the model's tokenizer, ~4 chars/token if it can't be loaded"""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        logging.error(f"Tokenizer for {model_name} unavailable, estimating tokens from length: {e}")
+        return lru_cache(maxsize=CHUNK_TOKEN_CACHE_SIZE)(lambda text: (len(text) + 3) // 4)
+
+    @lru_cache(maxsize=CHUNK_TOKEN_CACHE_SIZE)
+    def count(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
+    # Leave room for [CLS]/[SEP]; huge values mean the tokenizer doesn't know its limit
+    count.max_tokens = tokenizer.model_max_length - 2 if tokenizer.model_max_length < 100000 else None
+    return count
+
+
+class Chunker:
+    """Splits Documents for one embedding model according to their filetype policy"""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.count_tokens = token_counter(model_name)
+        self._splitters: Dict[tuple, RecursiveCharacterTextSplitter] = {}
+
+    def _splitter(self, chunk_tokens: int, overlap_tokens: int) -> RecursiveCharacterTextSplitter:
+        max_tokens = getattr(self.count_tokens, "max_tokens", None)
+        if max_tokens:
+            chunk_tokens = min(chunk_tokens, max_tokens)
+        chunk_tokens = max(1, chunk_tokens)
+        key = (chunk_tokens, min(overlap_tokens, chunk_tokens // 2))
+        if key not in self._splitters:
+            self._splitters[key] = RecursiveCharacterTextSplitter(
+                chunk_size=key[0], chunk_overlap=key[1], length_function=self.count_tokens,
+            )
+        return self._splitters[key]
+
+    def _split_text(self, text: str, metadata: dict, policy: ChunkPolicy) -> List[Document]:
+        splitter = self._splitter(policy.chunk_tokens, policy.overlap_tokens)
+        return [Document(page_content=chunk, metadata=dict(metadata)) for chunk in splitter.split_text(text)]
+
+    def _split_slides(self, doc: Document, policy: ChunkPolicy) -> List[Document]:
+        headers = list(SLIDE_HEADER.finditer(doc.page_content))
+        if not headers:
+            return self._split_text(doc.page_content, doc.metadata, policy)
+        chunks = []
+        for i, header in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(doc.page_content)
+            slide = doc.page_content[header.start():end].strip()
+            chunks.extend(self._split_text(slide, {**doc.metadata, "slide": int(header.group(1))}, policy))
+        return chunks
+
+    def _split_table(self, doc: Document, policy: ChunkPolicy) -> List[Document]:
+        text = doc.page_content
+        if not text.startswith(TABLE_HEADER_PREFIX) or self.count_tokens(text) <= policy.chunk_tokens:
+            return self._split_text(text, doc.metadata, policy)
+        header, _, rows = text.partition("\n")
+        budget = policy.chunk_tokens - self.count_tokens(header) - 1
+        if budget < policy.chunk_tokens // 4:
+            # Very wide tables: repeating the header would leave almost no room for rows
+            return self._split_text(text, doc.metadata, policy)
+        # Rows are split under the header's remaining budget, then each piece gets the header back
+        splitter = self._splitter(budget, 0)
+        return [Document(page_content=f"{header}\n{chunk}", metadata=dict(doc.metadata))
+                for chunk in splitter.split_text(rows)]
+
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        chunks = []
+        for doc in docs:
+            policy = policy_for(doc)
+            if policy.name == "slides":
+                chunks.extend(self._split_slides(doc, policy))
+            elif policy.name == "table":
+                chunks.extend(self._split_table(doc, policy))
+            else:
+                chunks.extend(self._split_text(doc.page_content, doc.metadata, policy))
+        return chunks
+
+    def stats(self) -> dict:
+        info = self.count_tokens.cache_info()
+        return {"model_name": self.model_name, "token_cache_hits": info.hits,
+                "token_cache_misses": info.misses, "token_cache_size": info.currsize}
+
+
+def split_documents(docs: List[Document], model_name: str = DEFAULT_EMBEDDING_MODEL) -> List[Document]:
+    """Chunk `docs` for `model_name` with the per-filetype policies"""
+    return Chunker(model_name).split_documents(docs)
@@ -0,0 +1,213 @@
+# fastapi-backend/ingest/fastq.py
+"""
+Streaming FASTQ summary for ingest.
+
+Sequencing runs are far too large to embed read by read, so a FASTQ file is
+read once, FASTQ_BATCH_READS records at a time (plain or gzip), and turned
+into a few summary Documents: read count, length distribution, per-position
+mean quality, GC content and the most over-represented k-mers.
+"""
+import gzip
+import os
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+FASTQ_BATCH_READS = int(os.getenv("FASTQ_BATCH_READS", "20000"))
+# k-mers are counted on the first reads only, like FastQC's over-represented sequences
+FASTQ_KMER_SIZE = int(os.getenv("FASTQ_KMER_SIZE", "7"))
+FASTQ_KMER_SAMPLE_READS = int(os.getenv("FASTQ_KMER_SAMPLE_READS", "100000"))
+FASTQ_TOP_KMERS = int(os.getenv("FASTQ_TOP_KMERS", "10"))
+PHRED_OFFSET = 33
+
+# A/C/G/T -> 0..3, anything else (N, IUPAC codes) -> 4 and breaks the k-mer
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate((b"Aa", b"Cc", b"Gg", b"Tt")):
+    _BASE_CODES[list(_bases)] = _code
+
+
+def _open(path: str):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    return gzip.open(path, "rb") if magic == b"\x1f\x8b" else open(path, "rb", buffering=1024 * 1024)
+
+
+def iter_fastq_batches(path: str, batch_reads: int = FASTQ_BATCH_READS) -> Iterator[Tuple[List[bytes], List[bytes]]]:
+    """Yield (sequences, qualities) lists of up to batch_reads records"""
+    block_bytes = 8 * 1024 * 1024
+    with _open(path) as f:
+        leftover = b""
+        seqs, quals = [], []
+        while True:
+            block = f.read(block_bytes)
+            data = leftover + block
+            if not data:
+                break
+            lines = data.split(b"\n")
+            if block:
+                # Keep the incomplete record for the next block
+                complete = (len(lines) - 1) // 4 * 4
+                leftover = b"\n".join(lines[complete:])
+                lines = lines[:complete]
+            else:
+                leftover = b""
+                while lines and not lines[-1].strip():
+                    lines.pop()
+                if len(lines) % 4:
+                    raise ValueError(f"Truncated FASTQ record at the end of {path}")
+            if b"\r" in data:
+                lines = [line.rstrip(b"\r") for line in lines]
+            headers = lines[0::4]
+            if any(not header.startswith(b"@") for header in headers):
+                raise ValueError(f"Malformed FASTQ record in {path}")
+            seqs.extend(lines[1::4])
+            quals.extend(lines[3::4])
+            while len(seqs) >= batch_reads:
+                yield seqs[:batch_reads], quals[:batch_reads]
+                seqs, quals = seqs[batch_reads:], quals[batch_reads:]
+            if not block:
+                break
+        if seqs:
+            yield seqs, quals
+
+
+class FastqStats:
+    """Single-pass accumulator over batches of reads"""
+
+    def __init__(self, kmer_size: int = FASTQ_KMER_SIZE, kmer_sample_reads: int = FASTQ_KMER_SAMPLE_READS):
+        self.reads = 0
+        self.bases = 0
+        self.gc = 0
+        self.n_bases = 0
+        self.lengths: Counter = Counter()
+        self.quality_sum = np.zeros(0, dtype=np.int64)
+        self.quality_count = np.zeros(0, dtype=np.int64)
+        self.kmer_size = kmer_size
+        self.kmer_sample_reads = kmer_sample_reads
+        # Count per 2-bit packed k-mer code
+        self.kmer_counts = np.zeros(4 ** kmer_size, dtype=np.int64)
+
+    def _grow(self, length: int):
+        if length > len(self.quality_sum):
+            extra = length - len(self.quality_sum)
+            self.quality_sum = np.concatenate([self.quality_sum, np.zeros(extra, dtype=np.int64)])
+            self.quality_count = np.concatenate([self.quality_count, np.zeros(extra, dtype=np.int64)])
+
+    def add_batch(self, seqs: List[bytes], quals: List[bytes]):
+        joined = b"".join(seqs)
+        if any(len(seq) != len(qual) for seq, qual in zip(seqs, quals)):
+            raise ValueError("FASTQ sequence and quality lengths differ")
+        self.reads += len(seqs)
+        self.bases += len(joined)
+        letters = np.bincount(np.frombuffer(joined, dtype=np.uint8), minlength=256)
+        self.gc += int(letters[list(b"GCgc")].sum())
+        self.n_bases += int(letters[list(b"Nn")].sum())
+
+        # Reads of equal length are processed as one 2D array (usually the whole batch)
+        kmer_reads = max(0, self.kmer_sample_reads - (self.reads - len(seqs)))
+        by_length: Dict[int, List[int]] = {}
+        for i, qual in enumerate(quals):
+            by_length.setdefault(len(qual), []).append(i)
+        for length, indices in by_length.items():
+            self.lengths[length] += len(indices)
+            if not length:
+                continue
+            self._grow(length)
+            scores = np.frombuffer(b"".join(quals[i] for i in indices), dtype=np.uint8).reshape(len(indices), length)
+            self.quality_sum[:length] += scores.sum(axis=0, dtype=np.int64) - PHRED_OFFSET * len(indices)
+            self.quality_count[:length] += len(indices)
+
+            sampled = [i for i in indices if i < kmer_reads]
+            if sampled and length >= self.kmer_size:
+                bases = _BASE_CODES[np.frombuffer(b"".join(seqs[i] for i in sampled), dtype=np.uint8)]
+                self._count_kmers(bases.reshape(len(sampled), length))
+
+    def _count_kmers(self, bases: np.ndarray):
+        """Count every k-mer of a (reads, length) array of base codes"""
+        k = self.kmer_size
+        windows = bases.shape[1] - k + 1
+        codes = np.zeros((bases.shape[0], windows), dtype=np.int64)
+        invalid = np.zeros((bases.shape[0], windows), dtype=bool)
+        for j in range(k):
+            column = bases[:, j:j + windows]
+            codes = (codes << 2) | (column & 3)
+            invalid |= column == 4
+        self.kmer_counts += np.bincount(codes[~invalid], minlength=len(self.kmer_counts))
+
+    def top_kmers(self, n: int = FASTQ_TOP_KMERS) -> List[Tuple[str, int]]:
+        top = np.argsort(self.kmer_counts)[::-1][:n]
+        k = self.kmer_size
+        return [
+            ("".join("ACGT"[(int(code) >> (2 * (k - 1 - j))) & 3] for j in range(k)), int(self.kmer_counts[code]))
+            for code in top if self.kmer_counts[code]
+        ]
+
+    def summary(self) -> Dict:
+        # Length statistics from the histogram, never from a per-read array
+        values = np.array(sorted(self.lengths), dtype=np.int64) if self.lengths else np.zeros(1, dtype=np.int64)
+        counts = np.array([self.lengths[v] for v in values], dtype=np.int64) if self.lengths else np.ones(1, dtype=np.int64)
+        cumulative = np.cumsum(counts)
+        mean_quality = np.divide(self.quality_sum, self.quality_count,
+                                 out=np.zeros(len(self.quality_sum)), where=self.quality_count > 0)
+        kmer_total = int(self.kmer_counts.sum())
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "gc_percent": round(100 * self.gc / self.bases, 2) if self.bases else 0.0,
+            "n_percent": round(100 * self.n_bases / self.bases, 3) if self.bases else 0.0,
+            "length": {
+                "min": int(values[0]), "max": int(values[-1]),
+                "mean": round(float((values * counts).sum() / cumulative[-1]), 2),
+                "median": int(values[np.searchsorted(cumulative, (cumulative[-1] + 1) // 2)]),
+                "distribution": dict(sorted(self.lengths.most_common(20))),
+            },
+            "mean_quality": round(float(self.quality_sum.sum() / max(1, self.quality_count.sum())), 2),
+            "per_position_quality": [round(float(q), 1) for q in mean_quality],
+            "top_kmers": [
+                {"kmer": kmer, "count": count, "percent": round(100 * count / kmer_total, 3)}
+                for kmer, count in self.top_kmers()
+            ],
+        }
+
+
+def fastq_stats(path: str) -> Dict:
+    stats = FastqStats()
+    for seqs, quals in iter_fastq_batches(path):
+        stats.add_batch(seqs, quals)
+    return stats.summary()
+
+
+def _binned(values: List[float], bin_size: int = 10) -> str:
+    return ", ".join(
+        f"{i + 1}-{min(i + bin_size, len(values))}: {np.mean(values[i:i + bin_size]):.1f}"
+        for i in range(0, len(values), bin_size)
+    )
+
+
+def fastq_documents(path: str, metadata: dict) -> List[Document]:
+    """Compact summary Documents for one FASTQ file"""
+    s = fastq_stats(path)
+    name = metadata.get("source", os.path.basename(path))
+    length = s["length"]
+    overview = (
+        f"FASTQ sequencing file {name}: {s['reads']} reads, {s['bases']} bases. "
+        f"Read length min {length['min']}, max {length['max']}, mean {length['mean']}, median {length['median']}. "
+        f"GC content {s['gc_percent']}%, N content {s['n_percent']}%. "
+        f"Mean base quality (Phred) {s['mean_quality']}.\n"
+        f"Most common read lengths (length: reads): "
+        + ", ".join(f"{k}: {v}" for k, v in length["distribution"].items())
+    )
+    quality = (
+        f"Per-position mean base quality (Phred) of {name}, by read position: "
+        + _binned(s["per_position_quality"])
+    )
+    kmers = (
+        f"Most over-represented {FASTQ_KMER_SIZE}-mers in the first {FASTQ_KMER_SAMPLE_READS} reads of {name}: "
+        + ", ".join(f"{k['kmer']} ({k['count']}, {k['percent']}%)" for k in s["top_kmers"])
+    )
+    return [
+        Document(page_content=text, metadata={**metadata, "summary": kind})
+        for kind, text in (("overview", overview), ("quality", quality), ("kmers", kmers))
+    ]
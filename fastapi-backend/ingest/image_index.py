@@ -0,0 +1,136 @@
+# fastapi-backend/ingest/image_index.py
+"""
+Per-collection image index.
+
+Uploaded images are stored once under <collection>/images/<sha256><ext>, embedded
+with CLIP (vectors cached by image hash in the shared embedding cache) and kept
+in an "images" Chroma collection next to the collection's text chunks, so a
+text query can retrieve both. Entries an update supersedes are deleted after
+the new ones are written, then stored files no entry points to any more.
+"""
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_community.vectorstores import Chroma
+
+from config.shared import collection_dir
+from config.session_store import chroma_client
+from dependencies.clip_embeddings import get_clip_embeddings
+from dependencies.embedding_cache import EMBEDDING_CACHE
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif"}
+IMAGE_COLLECTION = "images"
+
+
+def is_image(filename: str) -> bool:
+    return Path(filename).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _images_dir(session_id: str, collection_id: str) -> str:
+    return os.path.join(collection_dir(session_id, collection_id), "images")
+
+
+def _prune_image_files(session_id: str, collection_id: str, index: Chroma):
+    """Delete stored images no index entry refers to"""
+    images_dir = _images_dir(session_id, collection_id)
+    if not os.path.isdir(images_dir):
+        return
+    referenced = {os.path.basename(metadata["image_path"])
+                  for metadata in index._collection.get(include=["metadatas"])["metadatas"]
+                  if metadata and metadata.get("image_path")}
+    for name in os.listdir(images_dir):
+        if name not in referenced:
+            os.remove(os.path.join(images_dir, name))
+
+
+def open_image_index(session_id: str, collection_id: str, with_clip: bool = True) -> Chroma:
+    """The collection's image index; with_clip=False skips loading CLIP when no query is embedded"""
+    directory = collection_dir(session_id, collection_id)
+    return Chroma(
+        client=chroma_client(directory),
+        collection_name=IMAGE_COLLECTION,
+        embedding_function=get_clip_embeddings() if with_clip else None,
+        persist_directory=directory,
+    )
+
+
+def index_images(session_id: str, collection_id: str, files: List[Tuple[str, str]], replace: bool,
+                 counters: Optional[Dict[str, int]] = None) -> int:
+    """
+    Add (path, filename) images to the collection's image index. With replace=True
+    the index is rebuilt, otherwise images with the same filename are replaced.
+    Returns the number of images indexed.
+    """
+    index = open_image_index(session_id, collection_id, with_clip=False)
+    if not files and not replace:
+        return 0
+
+    images_dir = _images_dir(session_id, collection_id)
+    os.makedirs(images_dir, exist_ok=True)
+    stored = []
+    for path, filename in files:
+        sha = file_sha256(path)
+        target = os.path.join(images_dir, f"{sha}{Path(filename).suffix.lower()}")
+        if not os.path.exists(target):
+            shutil.copyfile(path, target)
+        stored.append((sha, target, filename))
+
+    ids = [f"{sha}-{filename}" for sha, _, filename in stored]
+    if stored:
+        # Same image bytes -> same vector, whatever session or collection uploaded them
+        clip = get_clip_embeddings()
+        path_by_sha = {sha: target for sha, target, _ in stored}
+        vectors = EMBEDDING_CACHE.get_or_compute(
+            f"{clip.model_name}#image", [sha for sha, _, _ in stored],
+            lambda shas: clip.embed_images([path_by_sha[sha] for sha in shas]), counters,
+        )
+        index._collection.upsert(
+            ids=ids,
+            embeddings=vectors.tolist(),
+            documents=[f"Image: {filename}" for _, _, filename in stored],
+            metadatas=[{"source": filename, "filetype": Path(filename).suffix.lower(), "sha256": sha,
+                        "image_path": os.path.relpath(target, collection_dir(session_id, collection_id))}
+                       for sha, target, filename in stored],
+        )
+
+    # Replace: everything else goes. Append: older entries of the same filenames.
+    where = None if replace else {"source": {"$in": [name for _, name in files]}}
+    kept = set(ids)
+    stale = [id_ for id_ in index._collection.get(where=where, include=[])["ids"] if id_ not in kept]
+    if stale:
+        index._collection.delete(ids=stale)
+    _prune_image_files(session_id, collection_id, index)
+    return len(stored)
+
+
+def remove_images(session_id: str, collection_id: str, filename: str) -> int:
+    """Drop an image file from the index, returns the number of entries removed"""
+    index = open_image_index(session_id, collection_id, with_clip=False)
+    removed = index._collection.get(where={"source": filename}, include=[])
+    if removed["ids"]:
+        index._collection.delete(ids=removed["ids"])
+        _prune_image_files(session_id, collection_id, index)
+    return len(removed["ids"])
+
+
+def search_images(session_id: str, collection_id: str, query: str, k: int = 4) -> List[dict]:
+    """Images closest to a text query (CLIP space), best first"""
+    if not open_image_index(session_id, collection_id, with_clip=False)._collection.count():
+        return []
+    index = open_image_index(session_id, collection_id)
+    return [
+        {"source": doc.metadata["source"], "sha256": doc.metadata["sha256"],
+         "image_path": doc.metadata["image_path"], "distance": round(float(distance), 4)}
+        for doc, distance in index.similarity_search_with_score(query, k=k)
+    ]
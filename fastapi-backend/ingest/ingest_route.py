@@ -1,264 +1,128 @@
 import os
+import shutil
 import time
-import tempfile
-from io import BytesIO
 from pathlib import Path
 from typing import List
 
-import pandas as pd
-from fastapi import File, Form, HTTPException, Request, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import JSONResponse
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_community.chat_models import ChatOllama
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import ConversationalRetrievalChain
-from langchain.prompts import PromptTemplate
 
-# New processing imports
-from pptx import Presentation
-import pytesseract
-from PIL import Image, ImageDraw, ImageFont
-from pathlib import Path
-from docx import Document as DocxDocument
-
-# Import from their original locations
-from utils import clean_dataframe
-from config.shared import SESSIONS, initialize_session, chroma_settings, hnsw_metadata
-
-def docx_read(docx_files):
-    full_text = ""
-    for docx_file in docx_files:
-        doc = DocxDocument(docx_file)
-        for para in doc.paragraphs:
-            full_text += para.text + "\n"
-    return full_text.strip()
-
-def image_from_text(slide_content, image_size=(1024, 768), font_size=20):
-    image = Image.new("RGB", image_size, "white")
-    draw = ImageDraw.Draw(image)
-    try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except IOError:
-        font = ImageFont.load_default()
-    current_y = 10 
-    for line in slide_content.split("\n"):
-        draw.text((10, current_y), line, fill="black", font=font)
-        current_y += font_size + 5
-    return image
+# Parse/split/embed/index run as a background job, see ingest/jobs.py
+from ingest.jobs import IngestJob, start_job, get_job, cancel_job
+from config.shared import SESSIONS, initialize_session
+from file_handlers.file_tools import USER_DIRS
+from file_handlers.uploads import save_upload
+from dependencies.embeddings import DEFAULT_EMBEDDING_MODEL, EMBEDDINGS
+from dependencies.embedding_cache import EMBEDDING_CACHE
 
-def extract_text_from_slide(slide):
-    text = ""
-    for shape in slide.shapes:
-        if shape.has_text_frame:
-            for paragraph in shape.text_frame.paragraphs:
-                for run in paragraph.runs:
-                    text += run.text + " "
-            text += "\n"
-        elif shape.has_table:
-            for row in shape.table.rows:
-                text += "\t".join(cell.text for cell in row.cells) + "\n"
-    return text
+router = APIRouter(tags=["ingest"])
 
-def pptx_to_images(pptx_path, output_folder):
-    prs = Presentation(pptx_path)
-    output_folder = Path(output_folder)
-    output_folder.mkdir(parents=True, exist_ok=True)
-    images = []
-    for i, slide in enumerate(prs.slides):
-        slide_text = extract_text_from_slide(slide)
-        image = image_from_text(slide_text)
-        image_path = output_folder / f"slide_{i + 1}.png"
-        image.save(image_path)
-        images.append(image_path)
-    return images
-
-def ocr_images(image_paths):
-    all_text = ""
-    for i, image_path in enumerate(image_paths):
-        try:
-            img = Image.open(image_path).convert("RGB")
-            ocr_text = pytesseract.image_to_string(img)
-            if ocr_text.strip():
-                all_text += f"--- Slide {i + 1} ---\n"
-                all_text += ocr_text.strip() + "\n\n"
-        except Exception as e:
-            all_text += f"[OCR error on slide {i + 1}: {e}]\n"
-    return all_text.strip()
-
-def pptx_read(pptx_file_path):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        slide_images = pptx_to_images(pptx_file_path, temp_dir)
-        return ocr_images(slide_images)
 
 async def ingest_collection(
     request: Request,
     files: List[UploadFile] = File(...),
     collection_id: str = Form(...),
     collection_name: str = Form(...),
-    embedding_model: str = Form("sentence-transformers/all-MiniLM-L6-v2"),
+    embedding_model: str = Form(DEFAULT_EMBEDDING_MODEL),
 ):
     """
     Create a new vectorstore for a specific collection.
     Each collection gets its own isolated vectorstore.
+    The uploads are saved and a background job is started; poll
+    /api/ingest/jobs/{job_id} for progress.
     """
     session_id = request.state.session_id
-    
+
     # Initialize session if needed
     initialize_session(session_id)
-    
-    # Import USER_DIRS here to avoid circular imports
-    from file_handlers.file_tools import USER_DIRS
-    
-    # Create collection-specific directory
-    collection_dir = os.path.join(USER_DIRS, session_id, "collections", collection_id)
-    os.makedirs(collection_dir, exist_ok=True)
-    
-    # Process files and create documents
-    all_docs = []
-    file_info_list = []
-    
-    for upload in files:
-        ext = Path(upload.filename).suffix.lower()
-        metadata = {"source": upload.filename, "filetype": ext}
-        
-        # Store file info for frontend
-        file_info = {
-            "name": upload.filename,
-            "type": ext.lstrip('.'), 
-            "size": upload.size if hasattr(upload, 'size') else 0,
-            "dateCreated": time.strftime("%m/%d/%Y")
-        }
-        file_info_list.append(file_info)
-        
-        # Handle different file types
-        if ext == ".csv":
-            df = pd.read_csv(BytesIO(await upload.read()))
-            df = clean_dataframe(df)
-            for _, row in df.iterrows():
-                text = ", ".join(f"{col}: {row[col]}" for col in df.columns)
-                doc = Document(page_content=text, metadata=metadata)
-                all_docs.append(doc)
-                
-        elif ext in {".xlsx", ".xls"}:
-            df = pd.read_excel(BytesIO(await upload.read()), engine="openpyxl")
-            df = clean_dataframe(df)
-            for _, row in df.iterrows():
-                text = ", ".join(f"{col}: {row[col]}" for col in df.columns)
-                doc = Document(page_content=text, metadata=metadata)
-                all_docs.append(doc)
-                
-        elif ext == ".pdf":
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-            tmp.write(await upload.read())
-            tmp.flush()
-            docs = PyMuPDFLoader(tmp.name).load()
-            for doc in docs:
-                doc.metadata.update(metadata)
-                all_docs.append(doc)
-            os.unlink(tmp.name)  # Clean up temp file
 
-        elif ext == ".docx":
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".docx")
-            tmp.write(await upload.read())
-            tmp.flush()
-            tmp.close()
-            text_content = docx_read([tmp.name])
-            if text_content.strip():
-                doc = Document(page_content=text_content, metadata=metadata)
-                all_docs.append(doc)
-            os.unlink(tmp.name)  # Clean up temp file
+    return await _start_ingest_job(session_id, files, collection_id, collection_name, embedding_model)
 
-        elif ext in {".pptx", ".ppt"}:
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pptx")
-            tmp.write(await upload.read())
-            tmp.flush()
-            tmp.close()
-            text_content = pptx_read(tmp.name)
-            if text_content.strip():
-                doc = Document(page_content=text_content, metadata=metadata)
-                all_docs.append(doc)
-            os.unlink(tmp.name)
-        
-        elif ext in {".fastq", ".fq"}:
-            # TODO: implement FASTQ file processing
-            # FASTQ files contain nucleotide sequences with quality scores
-            # Could extract sequence IDs, sequences, and quality information
-            continue
-            
-        elif ext in {".png", ".jpg", ".jpeg", ".gif"}:
-            # TODO: implement image embedding with CLIP
-            continue
-    
-    if not all_docs:
-        raise HTTPException(400, "No processable files found")
-    
-    # Create embeddings and vectorstore
-    embeddings = HuggingFaceEmbeddings(
-        model_name=embedding_model, 
-        model_kwargs={'trust_remote_code': True}
-    )
-    
-    # Create text splitter
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-    split_docs = text_splitter.split_documents(all_docs)
-    
-    # Create vectorstore for this collection
-    vectorstore = Chroma.from_documents(
-        documents=split_docs,
-        embedding=embeddings,
-        persist_directory=collection_dir,
-    )
-    
-    # Store collection info in session
-    SESSIONS[session_id]["collections"][collection_id] = {
-        "vectorstore": vectorstore,
-        "name": collection_name,
-        "files": file_info_list,
-        "created_at": time.time(),
-        "embedding_model": embedding_model
-    }
-    
-    # Set as active collection
-    SESSIONS[session_id]["active_collection_id"] = collection_id
-    
-    # Automatically create a chatbot for this collection
+
+async def _start_ingest_job(session_id: str, files: List[UploadFile], collection_id: str,
+                            collection_name: str, embedding_model: str, mode: str = "replace"):
+    """Save the uploads into a new job directory and start the job"""
+    # Store file info for frontend
+    file_info_list = [{
+        "name": upload.filename,
+        "type": Path(upload.filename).suffix.lower().lstrip('.'),
+        "size": 0,
+        "dateCreated": time.strftime("%m/%d/%Y")
+    } for upload in files]
+
+    job = IngestJob.create(session_id, collection_id, collection_name, embedding_model, file_info_list, mode=mode)
+
+    # Uploads are streamed into the job directory so an interrupted job can resume
+    session_dir = os.path.join(USER_DIRS, session_id)
     try:
-        # Create LLM
-        llm = ChatOllama(model="llama3.1", temperature=0)
-        
-        # Create prompt template
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="You are a helpful AI. Use the following context to answer the question:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
-        )
-        
-        # Create retriever
-        retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        
-        # Create chain
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        
-        # Store chain in session
-        SESSIONS[session_id]["chain"] = chain
-        print(f"DEBUG: Chatbot automatically created for collection {collection_id} in session {session_id}")
-        
-    except Exception as e:
-        print(f"ERROR: Failed to create chatbot automatically: {str(e)}")
-        # Don't fail the ingestion if chatbot creation fails
-    
+        for index, (upload, file_info) in enumerate(zip(files, file_info_list)):
+            ext = Path(upload.filename).suffix.lower()
+            saved = await save_upload(upload, os.path.join(job.uploads_dir, f"{index}{ext}"), session_id, session_dir)
+            file_info.update(size=saved.size, sha256=saved.sha256)
+    except BaseException:
+        shutil.rmtree(job.job_dir, ignore_errors=True)
+        raise
+
+    start_job(job)
+
     return JSONResponse({
         "session_id": session_id,
+        "job_id": job.job_id,
+        "status": job.state["status"],
         "collection_id": collection_id,
         "collection_name": collection_name,
         "files_processed": len(files),
-        "chatbot_created": "chain" in SESSIONS[session_id] and SESSIONS[session_id]["chain"] is not None
-    })
\ No newline at end of file
+    }, status_code=202)
+
+
+@router.post("/api/collections/{collection_id}/files")
+async def add_collection_files(collection_id: str, request: Request, files: List[UploadFile] = File(...)):
+    """
+    Append files to an existing collection. Only the new files are parsed and
+    embedded; a file with the same name as an existing one replaces it.
+    """
+    session_id = request.state.session_id
+
+    initialize_session(session_id)
+
+    if collection_id not in SESSIONS[session_id]["collections"]:
+        raise HTTPException(404, f"Collection {collection_id} not found")
+
+    collection_info = SESSIONS[session_id]["collections"][collection_id]
+    return await _start_ingest_job(
+        session_id, files, collection_id, collection_info["name"],
+        collection_info.get("embedding_model", DEFAULT_EMBEDDING_MODEL), mode="append",
+    )
+
+
+@router.get("/api/ingest/embedding_cache/stats")
+async def embedding_cache_stats():
+    """Hit rate and bytes saved by the shared embedding cache"""
+    return JSONResponse(EMBEDDING_CACHE.stats())
+
+
+@router.get("/api/ingest/embeddings/stats")
+async def embedding_model_stats():
+    """Loaded embedding models with their batch-size and queue-latency histograms"""
+    return JSONResponse(EMBEDDINGS.stats())
+
+
+@router.get("/api/ingest/jobs/{job_id}")
+async def ingest_job_status(job_id: str, request: Request):
+    """Stage-by-stage progress of an ingest job"""
+    job = get_job(request.state.session_id, job_id)
+    if job is None:
+        raise HTTPException(404, f"Ingest job {job_id} not found")
+    return JSONResponse(job.status())
+
+
+@router.post("/api/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str, request: Request):
+    """Ask a running job to stop at its next batch boundary"""
+    job = get_job(request.state.session_id, job_id)
+    if job is None:
+        raise HTTPException(404, f"Ingest job {job_id} not found")
+    if job.state["status"] not in ("queued", "running"):
+        raise HTTPException(409, f"Ingest job {job_id} is already {job.state['status']}")
+    cancel_job(job)
+    return JSONResponse(job.status())
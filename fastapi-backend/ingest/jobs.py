@@ -0,0 +1,446 @@
+# fastapi-backend/ingest/jobs.py
+"""
+Background ingest jobs.
+
+An ingest runs as a job with five stages: parse -> split -> embed -> index -> images.
+Every stage checkpoints its output under user_uploads/<session>/ingest_jobs/<job_id>/
+and the job state lives in job.json next to it, so a status endpoint can report
+per-stage counts/throughput, a cancel flag is checked between batches, and after
+a crash (or a shutdown cancelling the task) the job restarts from the last
+completed stage. The stages writing to the collection run under its
+collection_lock, and the chunks a job replaces are only deleted once the new
+ones are written.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+from starlette.concurrency import run_in_threadpool
+
+from config.shared import (
+    SESSIONS, initialize_session, collection_dir, write_collection_manifest,
+    get_chain, invalidate_chains, collection_lock,
+)
+from config.session_store import chroma_client
+from dependencies.embeddings import get_embeddings
+from dependencies.embedding_cache import embed_documents_cached
+from ingest.parsers import parse_files
+from ingest.chunking import split_documents
+from ingest.image_index import index_images, is_image
+
+STAGES = ("parse", "split", "embed", "index", "images")
+# Stages writing to the collection, run while holding its collection_lock
+COLLECTION_STAGES = ("index", "images")
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INDEX_BATCH_SIZE = int(os.getenv("INGEST_INDEX_BATCH_SIZE", "256"))
+# Minimum seconds between job.json writes for progress ticks (status changes are always written)
+PROGRESS_SAVE_INTERVAL = float(os.getenv("INGEST_PROGRESS_SAVE_INTERVAL", "1.0"))
+
+COLLECTION_QA_TEMPLATE = "You are a helpful AI. Use the following context to answer the question:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
+
+# job_id -> IngestJob for jobs queued or running in this process; finished jobs are read from job.json
+JOBS: Dict[str, "IngestJob"] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def jobs_root(session_id: str) -> str:
+    # Import USER_DIRS here to avoid circular imports
+    from file_handlers.file_tools import USER_DIRS
+    return os.path.join(USER_DIRS, session_id, "ingest_jobs")
+
+
+def _write_jsonl(path: str, docs: List[Document]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _read_jsonl(path: str) -> List[Document]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [Document(**json.loads(line)) for line in f if line.strip()]
+
+
+def _same_dimension(vectorstore, dimension: int) -> bool:
+    """False if the collection already holds vectors of another size"""
+    existing = vectorstore._collection.get(limit=1, include=["embeddings"])["embeddings"]
+    return existing is None or len(existing) == 0 or len(existing[0]) == dimension
+
+
+class IngestJob:
+    """State of one ingest, persisted to job.json on every status change (progress ticks throttled)"""
+
+    def __init__(self, state: Dict[str, Any]):
+        self.state = state
+        self.cancel_requested = False
+        self._saved_at = 0.0
+
+    @classmethod
+    def create(cls, session_id: str, collection_id: str, collection_name: str,
+               embedding_model: str, files: List[Dict[str, Any]], mode: str = "replace") -> "IngestJob":
+        """mode="replace" rebuilds the collection, mode="append" adds the files to it"""
+        now = time.time()
+        job = cls({
+            "job_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "collection_id": collection_id,
+            "collection_name": collection_name,
+            "embedding_model": embedding_model,
+            "files": files,
+            "mode": mode,
+            "status": "uploading",
+            "stage": None,
+            "stages": {name: {"status": "pending", "done": 0, "total": 0, "seconds": 0.0} for name in STAGES},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+        os.makedirs(job.uploads_dir, exist_ok=True)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, path: str) -> "IngestJob":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def job_id(self) -> str:
+        return self.state["job_id"]
+
+    @property
+    def job_dir(self) -> str:
+        return os.path.join(jobs_root(self.state["session_id"]), self.job_id)
+
+    @property
+    def uploads_dir(self) -> str:
+        return os.path.join(self.job_dir, "uploads")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.job_dir, name)
+
+    def save(self):
+        self.state["updated_at"] = self._saved_at = time.time()
+        os.makedirs(self.job_dir, exist_ok=True)
+        tmp_path = self.path("job.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path("job.json"))
+
+    def progress(self, stage: str, done: int, total: Optional[int] = None, started: Optional[float] = None):
+        entry = self.state["stages"][stage]
+        entry["done"] = done
+        if total is not None:
+            entry["total"] = total
+        if started is not None:
+            entry["seconds"] = round(time.time() - started, 3)
+        # Running jobs report from memory; on disk a stale count only means a
+        # resumed stage redoes a few idempotent batches
+        if time.time() - self._saved_at >= PROGRESS_SAVE_INTERVAL:
+            self.save()
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise IngestCancelled()
+
+    def status(self) -> Dict[str, Any]:
+        """Public view: per-stage counts plus throughput in items/sec"""
+        stages = {}
+        for name, entry in self.state["stages"].items():
+            stages[name] = {
+                **entry,
+                "per_second": round(entry["done"] / entry["seconds"], 2) if entry["seconds"] else None,
+            }
+        keys = ("job_id", "collection_id", "collection_name", "status", "stage", "error", "created_at", "updated_at")
+        return {**{key: self.state[key] for key in keys}, "stages": stages}
+
+    # Stages -----------------------------------------------------------------
+
+    def uploads(self) -> List[Tuple[str, str]]:
+        """(path, original filename) of the job's uploads"""
+        return [(os.path.join(self.uploads_dir, name), self.state["files"][int(name.split(".")[0])]["name"])
+                for name in sorted(os.listdir(self.uploads_dir))]
+
+    async def run_parse(self):
+        # Images skip the text pipeline, they are embedded by the images stage
+        files = [(path, name) for path, name in self.uploads() if not is_image(name)]
+        has_images = len(files) < len(self.state["files"])
+        started = time.time()
+        self.progress("parse", 0, total=len(files), started=started)
+        parsed = []
+
+        def on_parsed(filename, docs):
+            parsed.append(filename)
+            self.progress("parse", len(parsed), started=started)
+            self.check_cancelled()
+
+        docs = await parse_files(self.state["session_id"], files, on_parsed=on_parsed)
+        if not docs and not has_images:
+            raise ValueError("No processable files found")
+        await run_in_threadpool(_write_jsonl, self.path("parsed.jsonl"), docs)
+
+    async def run_split(self):
+        started = time.time()
+        docs = await run_in_threadpool(_read_jsonl, self.path("parsed.jsonl"))
+        self.progress("split", 0, total=len(docs), started=started)
+        split_docs = await run_in_threadpool(split_documents, docs, self.state["embedding_model"])
+        await run_in_threadpool(_write_jsonl, self.path("split.jsonl"), split_docs)
+        self.progress("split", len(docs), started=started)
+
+    async def run_embed(self):
+        started = time.time()
+        split_docs = await run_in_threadpool(_read_jsonl, self.path("split.jsonl"))
+        embeddings = await run_in_threadpool(get_embeddings, self.state["embedding_model"])
+        self.progress("embed", 0, total=len(split_docs), started=started)
+
+        # Chunks seen before (by any session) come from the shared embedding cache
+        vectors = []
+        counters = self.state["stages"]["embed"]
+        counters.update(cache_hits=0, cache_misses=0)
+        for start in range(0, len(split_docs), EMBED_BATCH_SIZE):
+            self.check_cancelled()
+            texts = [doc.page_content for doc in split_docs[start:start + EMBED_BATCH_SIZE]]
+            vectors.extend(await run_in_threadpool(
+                embed_documents_cached, self.state["embedding_model"], embeddings, texts, counters))
+            self.progress("embed", len(vectors), started=started)
+
+        tmp_path = self.path("embeddings.tmp.npy")
+        np.save(tmp_path, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, self.path("embeddings.npy"))
+
+    async def run_index(self):
+        started = time.time()
+        session_id, collection_id = self.state["session_id"], self.state["collection_id"]
+        split_docs = await run_in_threadpool(_read_jsonl, self.path("split.jsonl"))
+        vectors = np.load(self.path("embeddings.npy"), mmap_mode="r")
+        done = self.state["stages"]["index"]["done"]
+
+        persist_dir = collection_dir(session_id, collection_id)
+        os.makedirs(persist_dir, exist_ok=True)
+        initialize_session(session_id)
+        previous = SESSIONS[session_id]["collections"].get(collection_id)
+        if previous is not None:
+            previous["vectorstore"] = None
+        invalidate_chains(session_id, collection_id)
+
+        # Loading the embedding model and opening the store both block
+        vectorstore = await run_in_threadpool(self.open_vectorstore, persist_dir)
+        replace = self.state.get("mode", "replace") == "replace"
+        if done == 0 and replace and len(vectors) and not await run_in_threadpool(
+                _same_dimension, vectorstore, vectors.shape[1]):
+            # A new embedding model can't share the collection with the old chunks
+            await run_in_threadpool(vectorstore.delete_collection)
+            vectorstore = await run_in_threadpool(self.open_vectorstore, persist_dir)
+        self.progress("index", done, total=len(split_docs), started=started)
+
+        # Deterministic ids make a resumed index stage idempotent
+        for start in range(done, len(split_docs), INDEX_BATCH_SIZE):
+            self.check_cancelled()
+            batch = split_docs[start:start + INDEX_BATCH_SIZE]
+            await run_in_threadpool(
+                vectorstore._collection.upsert,
+                ids=[f"{self.job_id}-{start + i}" for i in range(len(batch))],
+                embeddings=np.asarray(vectors[start:start + len(batch)]).tolist(),
+                documents=[doc.page_content for doc in batch],
+                metadatas=[doc.metadata for doc in batch],
+            )
+            self.progress("index", start + len(batch), started=started)
+
+        # Only now drop what this job supersedes, readers never see a half-empty collection
+        await run_in_threadpool(self.delete_superseded, vectorstore)
+        self._vectorstore = vectorstore
+
+    def open_vectorstore(self, persist_dir: str):
+        return Chroma(
+            client=chroma_client(persist_dir),
+            embedding_function=get_embeddings(self.state["embedding_model"]),
+            persist_directory=persist_dir,
+        )
+
+    def delete_superseded(self, vectorstore):
+        """
+        Replace mode: every chunk not written by this job. Append mode: older
+        chunks of the files being re-ingested.
+        """
+        where = None
+        if self.state.get("mode", "replace") != "replace":
+            where = {"source": {"$in": [file_info["name"] for file_info in self.state["files"]]}}
+        ids = vectorstore._collection.get(where=where, include=[])["ids"]
+        stale = [id_ for id_ in ids if not id_.startswith(f"{self.job_id}-")]
+        for start in range(0, len(stale), INDEX_BATCH_SIZE):
+            vectorstore._collection.delete(ids=stale[start:start + INDEX_BATCH_SIZE])
+
+    async def run_images(self):
+        """CLIP-embed uploaded images into the collection's image index"""
+        started = time.time()
+        images = [(path, name) for path, name in self.uploads() if is_image(name)]
+        counters = self.state["stages"]["images"]
+        counters.update(cache_hits=0, cache_misses=0)
+        self.progress("images", 0, total=len(images), started=started)
+        replace = self.state.get("mode", "replace") == "replace"
+        if images or replace:
+            indexed = await run_in_threadpool(
+                index_images, self.state["session_id"], self.state["collection_id"], images, replace, counters)
+            self.progress("images", indexed, started=started)
+
+    def register_collection(self, vectorstore):
+        """
+        Make the finished collection visible to the session and warm its chatbot.
+        Blocking (manifest write, chain construction), run in the threadpool.
+        """
+        session_id, collection_id = self.state["session_id"], self.state["collection_id"]
+        initialize_session(session_id)
+        files, created_at = self.state["files"], time.time()
+        existing = SESSIONS[session_id]["collections"].get(collection_id)
+        if self.state.get("mode") == "append" and existing is not None:
+            added = {file_info["name"] for file_info in files}
+            files = [f for f in existing["files"] if f["name"] not in added] + files
+            created_at = existing["created_at"]
+        SESSIONS[session_id]["collections"][collection_id] = {
+            "vectorstore": vectorstore,
+            "name": self.state["collection_name"],
+            "files": files,
+            "created_at": created_at,
+            "embedding_model": self.state["embedding_model"]
+        }
+        # Persist metadata so the collection is listed again after a restart
+        write_collection_manifest(session_id, collection_id)
+
+        # Set as active collection
+        SESSIONS[session_id]["active_collection_id"] = collection_id
+        SESSIONS[session_id]["chat_template"] = COLLECTION_QA_TEMPLATE
+        SESSIONS.enforce_budget(keep=session_id)
+
+        # Automatically create a chatbot for this collection
+        try:
+            get_chain(session_id, collection_id, template=COLLECTION_QA_TEMPLATE)
+            print(f"DEBUG: Chatbot automatically created for collection {collection_id} in session {session_id}")
+        except Exception as e:
+            print(f"ERROR: Failed to create chatbot automatically: {str(e)}")
+            # Don't fail the ingestion if chatbot creation fails
+
+    async def run_stage(self, name: str):
+        """Run one stage unless a previous run already completed it"""
+        stage_runners = {"parse": self.run_parse, "split": self.run_split,
+                         "embed": self.run_embed, "index": self.run_index, "images": self.run_images}
+        # Jobs written before a stage existed get it on resume
+        self.state["stages"].setdefault(name, {"status": "pending", "done": 0, "total": 0, "seconds": 0.0})
+        if self.state["stages"][name]["status"] == "done":
+            return
+        self.check_cancelled()
+        self.state["stage"] = name
+        self.state["stages"][name]["status"] = "running"
+        self.save()
+        await stage_runners[name]()
+        self.state["stages"][name]["status"] = "done"
+        self.save()
+
+    async def run(self):
+        """Run the remaining stages, skipping the ones already completed"""
+        self.state["status"] = "running"
+        self.save()
+        try:
+            for name in STAGES:
+                if name not in COLLECTION_STAGES:
+                    await self.run_stage(name)
+            # Other jobs and file deletes on this collection wait until it is registered
+            async with collection_lock(self.state["session_id"], self.state["collection_id"]):
+                for name in COLLECTION_STAGES:
+                    await self.run_stage(name)
+                # Resumed after indexing: the vectorstore is reopened lazily
+                await run_in_threadpool(self.register_collection, getattr(self, "_vectorstore", None))
+            self.state["status"] = "done"
+            self.state["stage"] = None
+            self.cleanup_artifacts()
+        except IngestCancelled:
+            self.state["status"] = "cancelled"
+            self.cleanup_artifacts()
+        except asyncio.CancelledError:
+            # Task cancelled by a shutdown, not by the user: keep the checkpoints
+            # and the "running" status so resume_ingest_jobs picks the job up again
+            raise
+        except Exception as e:
+            logging.error(f"Ingest job {self.job_id} failed in stage {self.state['stage']}: {e}")
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+            # Failed jobs are not resumed, don't let their uploads count against the quota
+            self.cleanup_artifacts()
+        finally:
+            self.save()
+            _tasks.pop(self.job_id, None)
+            JOBS.pop(self.job_id, None)
+
+    def cleanup_artifacts(self):
+        """Drop uploads and stage checkpoints, keeping job.json for status queries"""
+        for name in os.listdir(self.job_dir):
+            if name == "job.json":
+                continue
+            target = self.path(name)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                os.remove(target)
+
+
+def start_job(job: IngestJob):
+    job.state["status"] = "queued"
+    job.save()
+    JOBS[job.job_id] = job
+    _tasks[job.job_id] = asyncio.create_task(job.run())
+
+
+def get_job(session_id: str, job_id: str) -> Optional[IngestJob]:
+    """Look a job up for this session, loading it from disk if it isn't running here"""
+    job = JOBS.get(job_id)
+    if job is None:
+        path = os.path.join(jobs_root(session_id), job_id, "job.json")
+        if not os.path.isfile(path):
+            return None
+        job = IngestJob.load(path)
+    return job if job.state["session_id"] == session_id else None
+
+
+def cancel_job(job: IngestJob):
+    job.cancel_requested = True
+    task = _tasks.get(job.job_id)
+    if task is None and job.state["status"] in ("queued", "running"):
+        # Not running in this process (e.g. interrupted by a restart)
+        job.state["status"] = "cancelled"
+        job.cleanup_artifacts()
+        job.save()
+
+
+def resume_ingest_jobs():
+    """Restart jobs that were queued or running when the process stopped"""
+    from file_handlers.file_tools import USER_DIRS
+    if not os.path.isdir(USER_DIRS):
+        return
+    for session_id in os.listdir(USER_DIRS):
+        root = jobs_root(session_id)
+        if not os.path.isdir(root):
+            continue
+        for job_id in os.listdir(root):
+            path = os.path.join(root, job_id, "job.json")
+            if not os.path.isfile(path):
+                continue
+            try:
+                job = IngestJob.load(path)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"Skipping unreadable ingest job {path}: {e}")
+                continue
+            if job.state["status"] in ("queued", "running"):
+                logging.info(f"Resuming ingest job {job_id} from stage {job.state['stage'] or 'parse'}")
+                start_job(job)
@@ -0,0 +1,223 @@
+# fastapi-backend/ingest/parsers.py
+"""
+File parsers used by ingest. Everything here is a plain top-level function so it
+can run in the ingest process pool; keep heavy app imports (config, chains,
+embeddings) out of this module so worker start-up stays cheap.
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from langchain.schema import Document
+
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.shapes.picture import Picture
+import pytesseract
+from PIL import Image
+from docx import Document as DocxDocument
+
+from ingest.fastq import fastq_documents
+from ingest.pdf_engine import pdf_documents, pdf_documents_sync
+from ingest.tabular import tabular_documents, iter_csv_frames, iter_excel_frames
+
+# Server-wide parse workers and per-session concurrent parses
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+INGEST_SESSION_CONCURRENCY = int(os.getenv("INGEST_SESSION_CONCURRENCY", "2"))
+
+# Embedded-picture OCR for PPTX: threads per file, results cached by image hash
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_MIN_IMAGE_SIDE = int(os.getenv("OCR_MIN_IMAGE_SIDE", "64"))
+
+_parse_pool = None
+_session_slots: Dict[str, asyncio.Semaphore] = {}
+_session_users: Dict[str, int] = {}
+
+
+def docx_read(docx_files):
+    full_text = ""
+    for docx_file in docx_files:
+        doc = DocxDocument(docx_file)
+        for para in doc.paragraphs:
+            full_text += para.text + "\n"
+    return full_text.strip()
+
+def _iter_shapes(shapes):
+    """Shapes of a slide, with group shapes flattened"""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _iter_shapes(shape.shapes)
+        else:
+            yield shape
+
+def extract_text_from_slide(slide):
+    text = ""
+    for shape in _iter_shapes(slide.shapes):
+        if shape.has_text_frame:
+            for paragraph in shape.text_frame.paragraphs:
+                line = "".join(run.text for run in paragraph.runs)
+                if line.strip():
+                    text += line + "\n"
+        elif shape.has_table:
+            for row in shape.table.rows:
+                text += "\t".join(cell.text for cell in row.cells) + "\n"
+    return text
+
+def slide_pictures(slide):
+    """Image bytes of the picture shapes on a slide"""
+    return [shape.image.blob for shape in _iter_shapes(slide.shapes) if isinstance(shape, Picture)]
+
+def ocr_image_blob(blob):
+    """OCR one embedded image, cached on disk by the sha256 of its bytes"""
+    digest = hashlib.sha256(blob).hexdigest()
+    cache_path = os.path.join(OCR_CACHE_DIR, digest[:2], f"{digest}.txt")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    text = ""
+    try:
+        img = Image.open(BytesIO(blob))
+        # Icons, bullets and separators carry no text worth the OCR time
+        if min(img.size) >= OCR_MIN_IMAGE_SIDE:
+            text = pytesseract.image_to_string(img.convert("RGB")).strip()
+    except Exception as e:
+        # Unsupported formats (WMF/EMF, ...) are cached as empty too
+        print(f"OCR skipped for image {digest[:12]}: {e}")
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, cache_path)
+    return text
+
+def pptx_read(pptx_file_path):
+    """Slide text and tables straight from python-pptx, OCR only for embedded pictures"""
+    prs = Presentation(pptx_file_path)
+    slide_texts, pictures = [], []
+    for i, slide in enumerate(prs.slides):
+        slide_texts.append(extract_text_from_slide(slide).strip())
+        pictures.extend((i, blob) for blob in slide_pictures(slide))
+
+    # pytesseract runs tesseract as a subprocess, so threads are enough to OCR in parallel;
+    # an image reused on many slides (logos) is OCR'd once
+    ocr_texts = {}
+    unique_blobs = list({hashlib.sha256(blob).digest(): blob for _, blob in pictures}.values())
+    if unique_blobs:
+        with ThreadPoolExecutor(max_workers=min(OCR_MAX_WORKERS, len(unique_blobs))) as pool:
+            by_blob = dict(zip(unique_blobs, pool.map(ocr_image_blob, unique_blobs)))
+        for i, blob in pictures:
+            if by_blob[blob]:
+                ocr_texts.setdefault(i, []).append(by_blob[blob])
+
+    all_text = ""
+    for i, text in enumerate(slide_texts):
+        content = "\n".join(part for part in [text] + ocr_texts.get(i, []) if part)
+        if content:
+            all_text += f"--- Slide {i + 1} ---\n{content}\n\n"
+    return all_text.strip()
+
+
+def parse_file(path: str, filename: str) -> List[Document]:
+    """Parse one uploaded file into Documents tagged with source/filetype"""
+    ext = Path(filename).suffix.lower()
+    metadata = {"source": filename, "filetype": ext}
+    docs = []
+
+    # Handle different file types
+    if ext == ".csv":
+        docs.extend(tabular_documents(iter_csv_frames(path), metadata))
+
+    elif ext in {".xlsx", ".xls"}:
+        docs.extend(tabular_documents(iter_excel_frames(path), metadata))
+
+    elif ext == ".pdf":
+        docs.extend(pdf_documents_sync(path, metadata))
+
+    elif ext == ".docx":
+        text_content = docx_read([path])
+        if text_content.strip():
+            docs.append(Document(page_content=text_content, metadata=metadata))
+
+    elif ext in {".pptx", ".ppt"}:
+        text_content = pptx_read(path)
+        if text_content.strip():
+            docs.append(Document(page_content=text_content, metadata=metadata))
+
+    elif ext in {".fastq", ".fq"} or filename.lower().endswith((".fastq.gz", ".fq.gz")):
+        # Streamed once into summary statistics, reads are not embedded one by one
+        docs.extend(fastq_documents(path, metadata))
+
+    elif ext in {".png", ".jpg", ".jpeg", ".gif"}:
+        # No text: images are CLIP-embedded into the image index (ingest/image_index.py)
+        pass
+
+    return docs
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by all ingests (spawned, so workers don't inherit torch/chroma state).
+    Spawned workers re-import the launching script unless it hides its path, see
+    the __main__ block of main.py.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=INGEST_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+async def parse_in_pool(session_id: str, path: str, filename: str) -> List[Document]:
+    """Parse a file in the process pool, at most INGEST_SESSION_CONCURRENCY at once per session"""
+    slots = _session_slots.setdefault(session_id, asyncio.Semaphore(INGEST_SESSION_CONCURRENCY))
+    async with slots:
+        if Path(filename).suffix.lower() == ".pdf":
+            # Page ranges of one PDF are spread over the pool, see ingest/pdf_engine.py
+            return await pdf_documents(path, {"source": filename, "filetype": ".pdf"}, get_parse_pool())
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_parse_pool(), parse_file, path, filename)
+
+
+async def parse_files(session_id: str, files: List[tuple], on_parsed: Optional[Callable] = None) -> List[Document]:
+    """
+    Fan (path, filename) pairs out to the pool and gather Documents as they complete.
+    on_parsed(filename, docs) is called after each file, e.g. for progress reporting.
+    """
+    _session_users[session_id] = _session_users.get(session_id, 0) + 1
+    all_docs = []
+    async def parse_one(path, filename):
+        return filename, await parse_in_pool(session_id, path, filename)
+
+    tasks = [asyncio.ensure_future(parse_one(path, filename)) for path, filename in files]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            filename, docs = await finished
+            all_docs.extend(docs)
+            if on_parsed is not None:
+                on_parsed(filename, docs)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Forget the session's semaphore once its last ingest is done
+        _session_users[session_id] -= 1
+        if not _session_users[session_id]:
+            del _session_users[session_id]
+            _session_slots.pop(session_id, None)
+    return all_docs
@@ -0,0 +1,86 @@
+# fastapi-backend/ingest/pdf_engine.py
+"""
+Page-parallel PDF text extraction.
+
+A PDF is split into ranges of PDF_PAGES_PER_TASK pages; each worker process
+opens the file itself and returns the text of its range. At most
+PDF_PAGE_WINDOW pages are in flight and pages are yielded in order as soon as
+their range is done, so the extraction side (PyMuPDF documents, pending
+ranges) stays bounded however long the PDF is.
+
+pdf_documents still collects the pages into a list for the ingest job's parse
+checkpoint, so the extracted text of the whole PDF is in memory once: O(text),
+not O(pages rendered by PyMuPDF).
+"""
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from langchain.schema import Document
+
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "64"))
+
+
+def pdf_page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """(page number, text) for pages [start, stop); top-level so it can run in a process pool"""
+    with fitz.open(path) as doc:
+        return [(number, doc[number].get_text()) for number in range(start, min(stop, doc.page_count))]
+
+
+async def stream_pdf_pages(path: str, executor: Optional[Executor] = None,
+                           pages_per_task: int = PDF_PAGES_PER_TASK,
+                           window: int = PDF_PAGE_WINDOW,
+                           total: Optional[int] = None) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Yield (page number, text) in page order, extracting ranges in parallel on
+    `executor`. Pass `total` if the page count is already known.
+    """
+    loop = asyncio.get_running_loop()
+    if total is None:
+        total = await loop.run_in_executor(None, pdf_page_count, path)
+    max_in_flight = max(1, window // pages_per_task)
+    in_flight = deque()
+    next_start = 0
+    try:
+        while next_start < total or in_flight:
+            while next_start < total and len(in_flight) < max_in_flight:
+                stop = next_start + pages_per_task
+                in_flight.append(loop.run_in_executor(executor, extract_pages, path, next_start, stop))
+                next_start = stop
+            for page in await in_flight.popleft():
+                yield page
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+async def pdf_documents(path: str, metadata: dict, executor: Optional[Executor] = None) -> List[Document]:
+    """One Document per non-empty page, with the 0-based page number like PyMuPDFLoader"""
+    total = await asyncio.get_running_loop().run_in_executor(None, pdf_page_count, path)
+    return [
+        Document(page_content=text, metadata={**metadata, "page": number, "total_pages": total})
+        async for number, text in stream_pdf_pages(path, executor, total=total)
+        if text.strip()
+    ]
+
+
+def pdf_documents_sync(path: str, metadata: dict) -> List[Document]:
+    """Sequential variant for callers already running inside a worker process"""
+    total = pdf_page_count(path)
+    docs = []
+    for start in range(0, total, PDF_PAGES_PER_TASK):
+        docs.extend(
+            Document(page_content=text, metadata={**metadata, "page": number, "total_pages": total})
+            for number, text in extract_pages(path, start, start + PDF_PAGES_PER_TASK)
+            if text.strip()
+        )
+    return docs
@@ -0,0 +1,104 @@
+# fastapi-backend/ingest/tabular.py
+"""
+CSV / Excel ingest.
+
+Tables are read in chunks of TABULAR_CHUNK_ROWS rows, row text is built with
+vectorized column operations, and consecutive rows are packed into windows of
+about TABULAR_WINDOW_CHARS characters (within the "table" chunking policy) with
+the header repeated once per window. A 100k-row table becomes a few thousand
+chunks instead of 100k single-row embeddings.
+
+tabular_documents yields the windows as it goes and only holds one chunk of
+raw rows (a DataFrame) at a time. The packed text itself is not streamed any
+further: the parse worker collects every Document to send it back from the
+process pool, so that part stays O(table text).
+"""
+import os
+from typing import Iterator
+
+import pandas as pd
+from langchain.schema import Document
+
+from utils import clean_dataframe
+
+# "windowed" packs rows under a shared header, "rows" keeps one Document per row
+TABULAR_INGEST_MODE = os.getenv("TABULAR_INGEST_MODE", "windowed")
+TABULAR_CHUNK_ROWS = int(os.getenv("TABULAR_CHUNK_ROWS", "10000"))
+# ~500 chars stays under the "table" policy's token budget (ingest/chunking.py), larger windows get re-split
+TABULAR_WINDOW_CHARS = int(os.getenv("TABULAR_WINDOW_CHARS", "500"))
+
+ROW_SEPARATOR = " | "
+
+
+def iter_csv_frames(path: str, chunk_rows: int = TABULAR_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def iter_excel_frames(path: str, chunk_rows: int = TABULAR_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """First sheet in chunks, read with openpyxl's streaming read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+        width = len(columns)
+        batch = []
+        for row in rows:
+            # Sheets without a dimension record give ragged rows, fit them to the header
+            if len(row) != width:
+                row = row[:width] + (None,) * (width - len(row))
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _row_texts(df: pd.DataFrame, with_names: bool) -> pd.Series:
+    """One string per row, built column-wise instead of with iterrows"""
+    df = clean_dataframe(df).astype(str)
+    columns = [(f"{col}: " + df[col]) if with_names else df[col] for col in df.columns]
+    if len(columns) == 1:
+        return columns[0]
+    return columns[0].str.cat(columns[1:], sep=", " if with_names else ROW_SEPARATOR)
+
+
+def tabular_documents(frames: Iterator[pd.DataFrame], metadata: dict,
+                      mode: str = TABULAR_INGEST_MODE, window_chars: int = TABULAR_WINDOW_CHARS) -> Iterator[Document]:
+    header = None
+    window, window_len, window_start, row_number = [], 0, 0, 0
+
+    def flush() -> Document:
+        return Document(
+            page_content=header + "\n".join(window),
+            metadata={**metadata, "row_start": window_start, "row_end": row_number - 1},
+        )
+
+    for df in frames:
+        if df.empty:
+            continue
+        if mode == "rows":
+            yield from (Document(page_content=text, metadata=dict(metadata)) for text in _row_texts(df, True))
+            continue
+
+        if header is None:
+            header = f"Columns: {ROW_SEPARATOR.join(map(str, df.columns))}\n"
+        budget = max(1, window_chars - len(header))
+        texts = _row_texts(df, False)
+        for text, length in zip(texts.tolist(), (texts.str.len() + 1).tolist()):
+            if window and window_len + length > budget:
+                yield flush()
+                window, window_len, window_start = [], 0, row_number
+            window.append(text)
+            window_len += length
+            row_number += 1
+
+    if window:
+        yield flush()
@@ -3,11 +3,9 @@ import asyncio
 import json
 import os
 import time
-import uuid
 import shutil
 from typing import Dict, List, Optional, Literal
 import logging
-import re
 
 
 # import pandas as pd
@@ -15,7 +13,8 @@ import re
 
 from fastapi import FastAPI, File, Request, UploadFile, Form, Depends, HTTPException, Body, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse
+from sse_starlette.sse import EventSourceResponse
 from contextlib import asynccontextmanager
 api_router = APIRouter()
 
@@ -23,21 +22,13 @@ api_router = APIRouter()
 from utils import create_table_summary_prompt, segment_and_export_tables, clean_dataframe, get_magic_wand_suggestions
 
 from pydantic import BaseModel
-from io import BytesIO
 
 import uvicorn
 import ollama
 import tempfile
-import zipfile
-from io import BytesIO
 
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from langchain.chains import ConversationalRetrievalChain, LLMChain
-from langchain_community.chat_models import ChatOllama
-from langchain.prompts import PromptTemplate
 from chromadb.config import Settings as ChromaSettings # hyperparams
 from langchain_community.vectorstores import Chroma # hyperparams
 import textwrap
@@ -49,7 +40,7 @@ from mcp_agent.agents.agent import Agent
 from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
 from mcp_agent.logging.logger import get_logger
 
-from chat_memory import get_session_history, add_chat_message
+from chat_memory import add_chat_exchange, get_windowed_history, purge_chat_history, PURGE_PROGRESS
 
 from rag_calls.rag_templates import TEMPLATES
 from rag_calls.api_rag_calls import router as rag_router
@@ -58,10 +49,17 @@ from file_handlers.file_tools import USER_DIRS, JSON_DIRS, SESSION_TABLES, route
 from pdf_handlers.pdf_tools import router as pdf_router
 from image_handlers.image_tools import router as image_router
 from table_handlers.table_tools import router as table_router
-from collection_handlers.collection_tools import router as collection_router, initialize_session, SESSIONS
-
-from ingest.ingest_route import ingest_collection
-from config.shared import SESSIONS, initialize_session, chroma_settings, hnsw_metadata
+from collection_handlers.collection_tools import router as collection_router
+
+from ingest.ingest_route import ingest_collection, router as ingest_router
+from ingest.jobs import resume_ingest_jobs
+from ingest.parsers import shutdown_parse_pool
+from ingest.chunking import split_documents
+from rag_calls.retrieval import retrieve_per_file
+from middleware.session_middleware import SessionMiddleware
+from config.shared import SESSIONS, initialize_session, chroma_settings, hnsw_metadata, get_collection_vectorstore, get_session_chain, get_chain
+from dependencies.embeddings import get_embeddings, preload_embeddings, DEFAULT_EMBEDDING_MODEL
+from starlette.concurrency import run_in_threadpool
 
 from pydantic import ValidationError
 
@@ -126,8 +124,14 @@ async def lifespan(app: FastAPI):
     openai.api_key  = settings.openai.api_key
     openai.base_url = settings.openai.base_url
     asyncio.create_task(cleanup_job()) # Clean up job for cookie tokens
+    # SCAN/UNLINK old chat keys without blocking startup; keep the task so it isn't garbage collected
+    app.state.purge_task = asyncio.create_task(purge_chat_history())
+    await run_in_threadpool(preload_embeddings) # Load EMBEDDING_PRELOAD_MODELS once
+    resume_ingest_jobs() # Pick up ingest jobs interrupted by a restart
     async with app.state.mcp_app.run():
         yield 
+    app.state.purge_task.cancel()
+    shutdown_parse_pool()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(rag_router) # Include single rag calls
@@ -136,6 +140,7 @@ app.include_router(table_router) # Include table end points
 app.include_router(image_router) # Include image end points
 app.include_router(file_router) # Include file end points
 app.include_router(collection_router) # Include collections end points
+app.include_router(ingest_router) # Include ingest job status end points
 
 # Allow CORS from localhost:5173 (the default Vite port) or adjust to your front-end domain
 origins = [
@@ -168,44 +173,13 @@ mcp_server = None
 class ChatHistory(BaseModel):
     history: List = []
 
-# Middleware
-@app.middleware("http")
-async def session_manager(request: Request, call_next):
-    session_id = request.cookies.get("user_session")
-    if session_id and not re.match(r"^[a-f0-9]{32}$", session_id):
-        # Invalid format, generate new
-        session_id = None
-    if session_id and not os.path.exists(f"{USER_DIRS}/{session_id}"):
-        # Directory missing, treat as new session
-        session_id = None
-     # New user
-    if not session_id or session_id not in ACTIVE_SESSIONS:
-        session_id = uuid.uuid4().hex
-        os.makedirs(f"{USER_DIRS}/{session_id}", exist_ok=True)
-    request.state.session_id = session_id
-    ACTIVE_SESSIONS[session_id] = time.time()
-    
-    response = await call_next(request)
-
-    # Restore the response for FastAPI
-    from starlette.responses import Response
-    new_response = Response(
-        content=b"".join([chunk async for chunk in response.body_iterator]),
-        status_code=response.status_code,
-        headers=dict(response.headers),
-        media_type=response.media_type,
-    )
-    
-    new_response.set_cookie(
-        "user_session",
-        session_id,
-        max_age=SESSION_TIMEOUT,
-        httponly=True,
-        secure=True,
-        samesite="Lax"
-    )
-
-    return new_response
+# Middleware: assigns the session cookie without buffering response bodies
+app.add_middleware(
+    SessionMiddleware,
+    user_dirs=USER_DIRS,
+    active_sessions=ACTIVE_SESSIONS,
+    max_age=SESSION_TIMEOUT,
+)
 
 ###############################################################################
 # AI and Vector Routes
@@ -254,6 +228,13 @@ async def mcp_query(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/api/chat/purge/stats")
+async def chat_purge_stats():
+    """Progress of the startup chat-history purge (state, scanned, purged, skipped_active)"""
+    return JSONResponse(PURGE_PROGRESS)
+
+
 # Vector Generator
 @app.post("/api/create_vectorstore")
 async def generate_vectors(
@@ -272,12 +253,11 @@ async def generate_vectors(
     docs_data = json.loads(documents)
     docs = [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in docs_data]
     
-    # Create embeddings
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model, model_kwargs={'trust_remote_code': True})
+    # Shared embeddings from the process-wide registry
+    embeddings = get_embeddings(embedding_model)
     
-    # Create text splitter
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-    split_docs = text_splitter.split_documents(docs)
+    # Token-sized chunks for this embedding model, policy picked per filetype (CPU-bound, off the event loop)
+    split_docs = await run_in_threadpool(split_documents, docs, embedding_model)
     
 
     # persist under a folder for this session - CHANGED!
@@ -344,38 +324,16 @@ async def create_chatbot(
         raise HTTPException(400, detail="No active collection found. Please load a collection first.")
 
     active_collection_id = SESSIONS[session_id]["active_collection_id"]
-    vectorstore = SESSIONS[session_id]["collections"][active_collection_id]["vectorstore"]
-
-    if vectorstore is None:
-        raise HTTPException(status_code=400, detail="Active collection has no vectorstore. Please reingest the collection.")
-    
-    # Create LLM
-    llm = ChatOllama(model="llama3.1", temperature=0)
     
     # Create prompt template
-    qa_prompt = PromptTemplate(
-    input_variables=["context", "question"], 
-    template=textwrap.dedent("""You are a helpful AI. Use the following context to answer the question:
+    qa_template = textwrap.dedent("""You are a helpful AI. Use the following context to answer the question:
     Context: {context}
     Question: {question}
-    Answer:"""))
-
-    llm_chain = LLMChain(llm=llm, prompt=qa_prompt)
-
-    # Create retriever
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-    
-    # Create chain
-    chain = ConversationalRetrievalChain.from_llm(
-    llm=llm, 
-    retriever=retriever, 
-    return_source_documents=True,
-    combine_docs_chain_kwargs={"prompt": qa_prompt},
-    verbose=True)
+    Answer:""")
 
-    
-    # Store chain in session
-    SESSIONS[session_id]["chain"] = chain
+    # Remember the template for this session and warm its chain (reused from the cache if built before)
+    SESSIONS[session_id]["chat_template"] = qa_template
+    get_chain(session_id, active_collection_id, template=qa_template)
     
     return JSONResponse(content={"status": "success", "active_collection_id": active_collection_id})
 
@@ -383,6 +341,36 @@ async def create_chatbot(
 class ChatReq(BaseModel):
     query: str
     model: str
+
+
+def _retrieve_chat_context(chain, query: str, summary: str, chat_history: List[tuple]) -> List[Document]:
+    """Retrieve documents for the query, with the windowed chat history prepended as a document"""
+    docs = chain.retriever.get_relevant_documents(query)
+
+    # Add chat history as first document if it exists
+    if summary or chat_history:
+        chat_history_str = f"Summary of earlier conversation: {summary}\n\n" if summary else ""
+        for human, ai in chat_history:
+            chat_history_str += f"Human: {human}\nAssistant: {ai}\n\n"
+        
+        history_doc = Document(
+            page_content=f"Previous conversation:\n{chat_history_str}",
+            metadata={"source": "chat_history"}
+        )
+        docs = [history_doc] + docs
+    return docs
+
+
+def _active_collection_info(session_id: str) -> Dict[str, Optional[str]]:
+    """Name and id of the collection the answer came from"""
+    active_collection_id = SESSIONS[session_id].get("active_collection_id")
+    if active_collection_id and active_collection_id in SESSIONS[session_id]["collections"] and active_collection_id != "default":
+        return {
+            "active_collection": SESSIONS[session_id]["collections"][active_collection_id]["name"],
+            "active_collection_id": active_collection_id
+        }
+    return {"active_collection": "General Chat", "active_collection_id": None}
+
     
 # Get Chat Response 
 @app.post("/api/get_chat_response/{session_id}")
@@ -404,280 +392,98 @@ async def get_chat_response(
         except Exception:
             raise HTTPException(status_code=404, detail="Session not found")
     
-    # initialize_session(session_id)
-
-    # Get history from Redis
-    history = get_session_history(session_id)
-    chat_history = []
-    messages = history.messages
-
-    # Convert Redis history to LangChain format
-    i = 0
-    while i < len(messages) - 1:
-        if (hasattr(messages[i], 'type') and messages[i].type == "human" and
-            hasattr(messages[i + 1], 'type') and messages[i + 1].type == "ai"):
-            
-            human_content = messages[i].content
-            ai_content = messages[i + 1].content
-            chat_history.append((human_content, ai_content))
-            i += 2  
-        else:
-            i += 1
-
-    add_chat_message(history, query, "user")
-
-    if "chain" not in SESSIONS[session_id] or SESSIONS[session_id]["chain"] is None:
-        # No chain exists, ensure we have the default chain
-        active_collection_id = SESSIONS[session_id].get("active_collection_id")
-        if not active_collection_id or active_collection_id not in SESSIONS[session_id]["collections"]:
-            # Set to default if no valid active collection
-            SESSIONS[session_id]["active_collection_id"] = "default"
-            active_collection_id = "default"
-        
-        # Create/recreate chain for the active collection
-        vectorstore = SESSIONS[session_id]["collections"][active_collection_id]["vectorstore"]
-        llm = ChatOllama(model=model, temperature=0)
+    # Get history from Redis (summary + last turns, within the token budget)
+    summary, chat_history = await get_windowed_history(session_id, model)
 
-
-        
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\n
-            Context: {context}\n\n
-            Question: {question}\n\n
-            Answer:"""
-        )
-        
-        retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever,
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True,
-        )
-        SESSIONS[session_id]["chain"] = chain
-    
-    chain = SESSIONS[session_id]["chain"]
+    # Chain (and the active collection's vectorstore) are built on first use.
+    # Building it, retrieval and the LLM call all block, keep them off the event loop
+    chain = await run_in_threadpool(get_session_chain, session_id, model)
 
     # Get documents manually and add chat history
-    docs = chain.retriever.get_relevant_documents(query)
-
-    # Add chat history as first document if it exists
-    if chat_history:
-        chat_history_str = ""
-        for human, ai in chat_history:
-            chat_history_str += f"Human: {human}\nAssistant: {ai}\n\n"
-        
-        from langchain_core.documents import Document
-        history_doc = Document(
-            page_content=f"Previous conversation:\n{chat_history_str}",
-            metadata={"source": "chat_history"}
-        )
-        docs = [history_doc] + docs
-
-    # Manually create the context and call the chain's combine_docs_chain
-    context = "\n\n".join([doc.page_content for doc in docs])
+    docs = await run_in_threadpool(_retrieve_chat_context, chain, query, summary, chat_history)
 
     # Call the LLM chain directly with the context
-    result_text = chain.combine_docs_chain.run(input_documents=docs, question=query)
+    result_text = await run_in_threadpool(chain.combine_docs_chain.run, input_documents=docs, question=query)
 
     # Create result in expected format
     result = {"answer": result_text}
     
-    add_chat_message(history, result["answer"], "assistant")
-
-    # Determine context info for response
-    active_collection_id = SESSIONS[session_id].get("active_collection_id")
-    if active_collection_id and active_collection_id in SESSIONS[session_id]["collections"] and active_collection_id != "default":
-        collection_name = SESSIONS[session_id]["collections"][active_collection_id]["name"]
-        return JSONResponse(content={
-            "answer": result["answer"],
-            "active_collection": collection_name,
-            "active_collection_id": active_collection_id
-        })
-    else:
-        return JSONResponse(content={
-            "answer": result["answer"],
-            "active_collection": "General Chat",
-            "active_collection_id": None
-        })
+    # Question and answer are stored together in one pipelined write
+    await add_chat_exchange(session_id, query, result["answer"])
 
+    return JSONResponse(content={"answer": result["answer"], **_active_collection_info(session_id)})
 
 
-@app.post("/api/ingest")
-async def ingest_collection_endpoint(
-    request: Request,
-    files: List[UploadFile] = File(...),
-    collection_id: str = Form(...),
-    collection_name: str = Form(...),
-    embedding_model: str = Form("sentence-transformers/all-MiniLM-L6-v2"),
+# Stream Chat Response
+@app.post("/api/get_chat_response_stream/{session_id}")
+async def get_chat_response_stream(
+    session_id: str,
+    request: ChatReq
 ):
-    return await ingest_collection(request, files, collection_id, collection_name, embedding_model)
+    """
+    Server-sent events variant of get_chat_response.
+    Emits a `metadata` event (collection, sources), then one `token` event per
+    generated chunk, then `done`. A failure in retrieval or generation emits an
+    `error` event before `done`. History is written to Redis once the stream completes.
+    """
+    query = request.query
+    model = request.model
 
+    if session_id not in SESSIONS:
+        try:
+            initialize_session(session_id)
+        except Exception:
+            raise HTTPException(status_code=404, detail="Session not found")
 
-# Collection Management Endpoints
-@app.get("/api/collections")
-async def list_collections(request: Request):
-    """List all collections for the current session (excluding default)"""
-    session_id = request.state.session_id
-    
-    # Initialize session if needed
-    initialize_session(session_id)
-    
-    collections_data = []
-    for coll_id, coll_info in SESSIONS[session_id]["collections"].items():
-        # Skip the default collection (for background general chat)
-        if coll_id == "default":
-            continue
-            
-        collections_data.append({
-            "id": coll_id,
-            "name": coll_info["name"],
-            "files": coll_info["files"],
-            "created_at": coll_info["created_at"],
-            "is_active": coll_id == SESSIONS[session_id].get("active_collection_id")
-        })
-    
-    return JSONResponse({
-        "collections": collections_data,
-        "session_id": session_id
-    })
+    async def event_stream():
+        answer = []
+        try:
+            # Retrieval is blocking, keep it off the event loop
+            summary, chat_history = await get_windowed_history(session_id, model)
+            chain = await run_in_threadpool(get_session_chain, session_id, model)
+            docs = await run_in_threadpool(_retrieve_chat_context, chain, query, summary, chat_history)
 
+            # Same prompt the combine_docs_chain would build ("stuff" documents, "\n\n" separated)
+            llm_chain = chain.combine_docs_chain.llm_chain
+            context = "\n\n".join(doc.page_content for doc in docs)
+            prompt = llm_chain.prompt.format(context=context, question=query)
 
-@app.post("/api/collections/{collection_id}/load")
-async def load_collection(collection_id: str, request: Request):
-    """Switch chatbot context to this collection"""
-    session_id = request.state.session_id
-    
-    initialize_session(session_id)
-    
-    if collection_id not in SESSIONS[session_id]["collections"]:
-        raise HTTPException(404, f"Collection {collection_id} not found")
-    
-    # Set as active collection
-    SESSIONS[session_id]["active_collection_id"] = collection_id
-    
-    # Clear existing chatbot chain (will be recreated with new vectorstore)
-    SESSIONS[session_id]["chain"] = None
-    
-    collection_name = SESSIONS[session_id]["collections"][collection_id]["name"]
-    
-    return JSONResponse({
-        "message": f"Collection '{collection_name}' loaded successfully",
-        "active_collection_id": collection_id
-    })
+            yield {
+                "event": "metadata",
+                "data": json.dumps({
+                    **_active_collection_info(session_id),
+                    "sources": [doc.metadata.get("source") for doc in docs if doc.metadata.get("source") != "chat_history"],
+                }),
+            }
 
+            async for chunk in llm_chain.llm.astream(prompt):
+                if chunk.content:
+                    answer.append(chunk.content)
+                    yield {"event": "token", "data": json.dumps({"token": chunk.content})}
 
-@app.get("/api/collections/{collection_id}/export")
-async def export_collection(collection_id: str, request: Request):
-    """Download collection as zip file"""
-    session_id = request.state.session_id
-    
-    initialize_session(session_id)
-    
-    if collection_id not in SESSIONS[session_id]["collections"]:
-        raise HTTPException(404, f"Collection {collection_id} not found")
-    
-    collection_info = SESSIONS[session_id]["collections"][collection_id]
-    collection_name = collection_info["name"]
-    
-    # Collection directory path
-    collection_dir = os.path.join(USER_DIRS, session_id, "collections", collection_id)
-    
-    if not os.path.exists(collection_dir):
-        raise HTTPException(404, "Collection directory not found")
-    
-    # Create zip file in memory
-    zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Add all files from the collection directory
-        for root, dirs, files in os.walk(collection_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arc_name = os.path.relpath(file_path, collection_dir)
-                zip_file.write(file_path, arc_name)
-    
-    zip_buffer.seek(0)
-    
-    # Clean filename for download
-    safe_name = re.sub(r'[^\w\-_.]', '_', collection_name)
-    filename = f"{safe_name}_{collection_id}.zip"
-    
-    return Response(
-        content=zip_buffer.getvalue(),
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+            # Only completed answers go to the history
+            await add_chat_exchange(session_id, query, "".join(answer))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"Chat stream failed for session {session_id}")
+            yield {"event": "error", "data": json.dumps({"detail": str(e)})}
 
+        yield {"event": "done", "data": json.dumps({"answer": "".join(answer)})}
 
-@app.delete("/api/collections/{collection_id}")
-async def delete_collection(collection_id: str, request: Request):
-    """Delete collection and its vectorstore"""
-    session_id = request.state.session_id
-    
-    initialize_session(session_id)
-    
-    if collection_id not in SESSIONS[session_id]["collections"]:
-        raise HTTPException(404, f"Collection {collection_id} not found")
-    
-    collection_name = SESSIONS[session_id]["collections"][collection_id]["name"]
-    
-    # Remove from session
-    del SESSIONS[session_id]["collections"][collection_id]
-    
-    # If this was the active collection, reset to default
-    if SESSIONS[session_id].get("active_collection_id") == collection_id:
-        SESSIONS[session_id]["active_collection_id"] = "default"
-        # Reset to default chain (already exists from initialize_session)
-        default_vectorstore = SESSIONS[session_id]["collections"]["default"]["vectorstore"]
-        llm = ChatOllama(model="llama3.1", temperature=0)
-        qa_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="You are a helpful AI assistant. Use the following context to answer the question if available, otherwise answer based on your general knowledge:\n\nContext: {context}\n\nQuestion: {question}\n\nAnswer:"
-        )
-        retriever = default_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        SESSIONS[session_id]["chain"] = chain
-    
-    # Delete collection directory
-    collection_dir = os.path.join(USER_DIRS, session_id, "collections", collection_id)
-    if os.path.exists(collection_dir):
-        shutil.rmtree(collection_dir)
-    
-    return JSONResponse({
-        "message": f"Collection '{collection_name}' deleted successfully"
-    })
+    return EventSourceResponse(event_stream())
 
 
-@app.put("/api/collections/{collection_id}")
-async def rename_collection(
-    collection_id: str, 
-    new_name: str = Body(..., embed=True),
-    request: Request = None
-):
-    """Rename a collection"""
-    session_id = request.state.session_id
-    
-    initialize_session(session_id)
-    
-    if collection_id not in SESSIONS[session_id]["collections"]:
-        raise HTTPException(404, f"Collection {collection_id} not found")
-    
-    # Update collection name
-    SESSIONS[session_id]["collections"][collection_id]["name"] = new_name
-    
-    return JSONResponse({
-        "message": f"Collection renamed to '{new_name}' successfully"
-    })
 
+@app.post("/api/ingest")
+async def ingest_collection_endpoint(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    collection_id: str = Form(...),
+    collection_name: str = Form(...),
+    embedding_model: str = Form(DEFAULT_EMBEDDING_MODEL),
+):
+    return await ingest_collection(request, files, collection_id, collection_name, embedding_model)
 
 
 # Magic Wand / Sparkles Description tables route
@@ -700,7 +506,7 @@ def _generic_rag_summarizer(
         raise HTTPException(400, "No active collection found. Please load a collection first.")
     
     active_collection_id = SESSIONS[session_id]["active_collection_id"]
-    vectorstore = SESSIONS[session_id]["collections"][active_collection_id]["vectorstore"]
+    vectorstore = get_collection_vectorstore(session_id, active_collection_id)
 
     print(f"!! generate_rag_with_template - session_id: {session_id}, active_collection: {active_collection_id}, has vectorstore: {bool(vectorstore)}")
 
@@ -710,16 +516,11 @@ def _generic_rag_summarizer(
             title: str
             keywords: List[str]
     
-    # 2) Collect top_k chunks for each file
-    all_chunks = []
-    for name in file_names:
-        docs = vectorstore.similarity_search(
-            query=f"Fetch context for '{name}'",
-            k=top_k,
-            filter={"source": name}
-        )
-        if docs:
-            all_chunks.extend(docs)
+    # 2) Collect top_k chunks for each file, the per-file queries are embedded in one batch
+    per_file = retrieve_per_file(
+        vectorstore, {name: f"Fetch context for '{name}'" for name in file_names}, file_names, top_k
+    )
+    all_chunks = [doc for pairs in per_file.values() for doc, _ in pairs]
 
     if not all_chunks:
         raise HTTPException(404, "No data chunks found for any requested files")
@@ -791,4 +592,8 @@ def generate_rag_with_template(
 
 
 if __name__ == "__main__":
+    # Spawned parse workers re-import the parent's __main__ by path (as __mp_main__),
+    # which would load this whole app in each of them. Without a path they start from
+    # a bare interpreter, like they do under `uvicorn main:app`.
+    __file__ = None
     uvicorn.run(app, host="0.0.0.0", port=8000 )
@@ -0,0 +1,73 @@
+# fastapi-backend/middleware/session_middleware.py
+"""
+Cookie-based session middleware written as a raw ASGI app.
+
+Unlike an @app.middleware("http") function it never touches the response
+body: the cookie is added to the `http.response.start` message and body
+chunks are passed straight through, so FileResponse downloads, zips and
+server-sent events stream with constant memory.
+"""
+import os
+import re
+import time
+import uuid
+from http.cookies import SimpleCookie
+from typing import Dict
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+SESSION_COOKIE = "user_session"
+SESSION_ID_PATTERN = re.compile(r"^[a-f0-9]{32}$")
+
+
+class SessionMiddleware:
+    def __init__(self, app, user_dirs: str, active_sessions: Dict[str, float], max_age: int = 86400):
+        self.app = app
+        self.user_dirs = user_dirs
+        self.active_sessions = active_sessions
+        self.max_age = max_age
+
+    def resolve_session_id(self, connection: HTTPConnection) -> str:
+        """Reuse the cookie's session if it is well formed and its directory exists"""
+        session_id = connection.cookies.get(SESSION_COOKIE)
+        if session_id and not SESSION_ID_PATTERN.match(session_id):
+            # Invalid format, generate new
+            session_id = None
+        if session_id and not os.path.exists(os.path.join(self.user_dirs, session_id)):
+            # Directory missing, treat as new session
+            session_id = None
+        # New user (a known directory survives restarts, its collections come back from manifests)
+        if not session_id:
+            session_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.user_dirs, session_id), exist_ok=True)
+        return session_id
+
+    def session_cookie(self, session_id: str) -> str:
+        cookie: SimpleCookie = SimpleCookie()
+        cookie[SESSION_COOKIE] = session_id
+        cookie[SESSION_COOKIE]["max-age"] = self.max_age
+        cookie[SESSION_COOKIE]["path"] = "/"
+        cookie[SESSION_COOKIE]["httponly"] = True
+        cookie[SESSION_COOKIE]["secure"] = True
+        cookie[SESSION_COOKIE]["samesite"] = "Lax"
+        return cookie.output(header="").strip()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session_id = self.resolve_session_id(HTTPConnection(scope))
+        # request.state is backed by scope["state"]
+        scope.setdefault("state", {})["session_id"] = session_id
+        self.active_sessions[session_id] = time.time()
+        cookie = self.session_cookie(session_id)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("set-cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
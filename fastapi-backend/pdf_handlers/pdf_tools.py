@@ -5,11 +5,10 @@ from dependencies.llm import get_llm
 from dependencies.vectorstore import get_vectorstore
 from pydantic import ValidationError
 from starlette.concurrency import run_in_threadpool
-from langchain_community.document_loaders import PyMuPDFLoader
+from ingest.pdf_engine import extract_pages
 import os
 import ollama
 import json
-import tempfile
 from file_handlers.file_tools import USER_DIRS, JSON_DIRS
 from utils import get_magic_wand_suggestions
 
@@ -44,22 +43,16 @@ async def analyze_pdf(
     
     # Get pdf file
     pdf_path = os.path.join(UPLOAD_DIR, f"{pdf_file_name}")
-    with open(pdf_path, "rb") as pdf_file:        
-        # We'll use PyMuPDF to load the PDF
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
-
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_file_path = tmp_file.name
-
-        loader = PyMuPDFLoader(file_path=tmp_file_path)
-        data = loader.load()
+    # Only the page that is used gets extracted
+    pages = await run_in_threadpool(extract_pages, pdf_path, 0, 1)
+    if not pages:
+        raise HTTPException(400, f"{pdf_file_name} has no pages")
+    first_page = pages[0][1]
     
     # Only analyzes first page now, enable list comprehension for all pages and aggregate the content when a better model is used.
-    print(data[0].page_content)
+    print(first_page)
     # Call model to get summary in json format
-    prompt = "Summarize the text given. Output in a JSON with the following format: {\"Summary\":\"This is your description of the pdf\", \"Keywords\":[\"keyword_1\", \"keyword_2\"]}" + f"Here is the text: {data[0].page_content}"
+    prompt = "Summarize the text given. Output in a JSON with the following format: {\"Summary\":\"This is your description of the pdf\", \"Keywords\":[\"keyword_1\", \"keyword_2\"]}" + f"Here is the text: {first_page}"
     res = ollama.chat(
         model=model,
         messages=[
@@ -85,7 +78,7 @@ async def analyze_pdf(
         "keywords": json_output.get("Keywords") or json_output.get("keywords", []),
     }
 
-    normalized_output.update(get_magic_wand_suggestions(data[0].page_content, model))
+    normalized_output.update(get_magic_wand_suggestions(first_page, model))
 
     if "Error" in json_output or "error" in json_output:
         normalized_output["error"] = json_output.get("Error") or json_output.get("error")
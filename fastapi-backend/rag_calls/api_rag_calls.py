@@ -1,266 +1,228 @@
 # rag_calls/api_rag_calls.py
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Type
+
 from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from rag_calls.models import SingleRagRequest, DescriptionResponse, TitleResponse, KeywordsResponse, AssaysResponse 
+from pydantic import BaseModel, ValidationError, create_model
+from sse_starlette.sse import EventSourceResponse
+from rag_calls.models import SingleRagRequest, MetadataRequest, DescriptionResponse, TitleResponse, KeywordsResponse, AssaysResponse
 from dependencies.llm import get_llm
 from config.shared import get_vectorstore
-from pydantic import ValidationError
+from rag_calls.retrieval import retrieve_per_file, retrieve_per_file_many
 from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(tags=["rag"])
 
-@router.post("/api/generate_rag_with_description", response_model=DescriptionResponse)
-async def generate_rag_with_description(
-    # request: Request,
-    # raw_body: dict = Body(...),
-    payload: SingleRagRequest = Body(...),
-    llm = Depends(get_llm),
-    vs  = Depends(get_vectorstore),
-):
-    # 1) Define the “job” you want the LLM to do
-    instruction_block = (
+# Field generations in flight across all /api/generate_rag_metadata requests.
+# Ollama only runs them in parallel up to its own OLLAMA_NUM_PARALLEL. A slot is
+# held until the llm.chat thread returns, even when the request is cancelled.
+RAG_FIELD_CONCURRENCY = int(os.getenv("RAG_FIELD_CONCURRENCY", "4"))
+_field_slots = asyncio.Semaphore(RAG_FIELD_CONCURRENCY)
+
+REFINE_SUFFIX = "Based on the above, suggest a concise search query (2-5 words)."
+
+
+@dataclass(frozen=True)
+class RagField:
+    response_model: Type[BaseModel]
+    # The "job" for the LLM, the JSON schema is appended to it
+    task: str
+    # Query used by the combined endpoint if the LLM doesn't suggest one
+    default_query: str
+    # "best": only the best scoring chunk (title), "threshold": all chunks above 0.65
+    context: str = "threshold"
+    # Appended to the job when asking for a search query
+    refine_suffix: str = REFINE_SUFFIX
+    snippets_label: str = "Data snippets:\n"
+    closing: str = "Do NOT include any extra text."
+    # Description answers from whatever it gets, the others 404 without chunks
+    require_docs: bool = True
+
+    def instruction_block(self) -> str:
+        return (
+            self.task +
+            "Respond ONLY with JSON, following this schema:\n\n"
+            f"{self.response_model.model_json_schema()}\n\n"
+        )
+
+
+FIELDS: Dict[str, RagField] = {
+    "description": RagField(
+        DescriptionResponse,
         "You are an expert at reading scientific articles. "
         "Your task is to write a comprehensive one-paragraph summary of the study, "
-        "including assays used, factors studied, and key results. "
-        "Respond ONLY with JSON, following this schema:\n\n"
-        f"{DescriptionResponse.model_json_schema()}\n\n"
-    )
+        "including assays used, factors studied, and key results. ",
+        default_query="study summary and key results",
+        require_docs=False,
+    ),
+    "title": RagField(
+        TitleResponse,
+        "Your task is to extract the article's exact title as it appears at the top of the paper. ",
+        default_query="article title",
+        context="best",
+        refine_suffix="",
+        snippets_label="Data snippet:\n",
+        closing="Do NOT include any text before or after the JSON.",
+    ),
+    "keywords": RagField(
+        KeywordsResponse,
+        "You are an expert at reading scientific articles. "
+        "Your task is to extract 4-6 key topical terms from the study. ",
+        default_query="key topics of the study",
+    ),
+    "assays": RagField(
+        AssaysResponse,
+        "You are an expert at reading scientific articles. "
+        "Your task is to identify and extract all experimental assays used in the study. "
+        "An assay is a laboratory procedure or test designed to measure, detect, or analyze a specific biological component or process (e.g., Western Blotting, ELISA, PCR, Calcium Uptake, Cell viability). "
+        "Do NOT include sample preparation steps, statistical methods, general procedures, or descriptions. "
+        "Return each assay name as a separate string in the 'assays' array. ",
+        default_query="experimental assays and methods",
+    ),
+}
 
-    # 2) Let the LLM refine that into a focused search query
-    #    Let the LLM build the query in terms it understands 
+
+async def _refine_search_query(llm, model: str, field: RagField) -> str:
+    """Let the LLM build the query in terms it understands"""
     refined_query_resp = await run_in_threadpool(
         llm.chat,
-        model=payload.model,
-        messages=[{
-            "role": "user",
-            "content": (
-                instruction_block +
-                "Based on the above, suggest a concise search query (2-5 words)."
-            )
-        }],
-    )
-    search_query = refined_query_resp["message"]["content"].strip().strip('"')
-    
-    # 3) Do your similarity search using the refined query
-    all_docs = []
-    for name in payload.file_names:
-        docs_and_scores = vs.similarity_search_with_score(
-            query=search_query,
-            k=payload.top_k,
-            filter={"source": name},  # if you’re filtering by source
-        )
-        # unpack raw docs
-        docs = [doc for doc, _ in docs_and_scores]
-        if docs:
-            all_docs.extend(docs)
-
-        # 3a) apply your threshold
-        filtered_docs = [doc for doc, score in docs_and_scores if score >= 0.65]
-        # 3b) fallback to at least something if none pass
-        if not filtered_docs:
-            filtered_docs = [doc for doc, _ in docs_and_scores]
-
-    # 4) build context
-    context = "\n\n".join(d.page_content for d in filtered_docs)
-    print("!!!! !!!! Context: ", context)
-
-    # 5) Now call the LLM one final time to produce your JSON summary
-    final_prompt = (
-        instruction_block +
-        "Data snippets:\n" + context + "\n\n"
-        "Do NOT include any extra text."
-    )
-    res = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{"role":"user","content": final_prompt}],
-        format=DescriptionResponse.model_json_schema(),
+        model=model,
+        messages=[{"role": "user", "content": field.instruction_block() + field.refine_suffix}],
     )
-    raw = res["message"]["content"]
-
-    # 6) Validate & return
-    for attempt in range(1, 6):
-        try:
-            result = DescriptionResponse.model_validate_json(raw)
-            break
-        except ValidationError:
-            if attempt == 5:
-                raise HTTPException(500, "LLM returned invalid schema after 5 tries")
-            # re-run the LLM call exactly as before
-            response = await run_in_threadpool(
-            llm.chat,
-            model=payload.model,
-            messages=[{"role":"user","content": final_prompt}],
-            format=DescriptionResponse.model_json_schema(),
-            )
-            raw = response["message"]["content"]
-
-    return result.model_dump()
-
+    return refined_query_resp["message"]["content"].strip().strip('"')
 
 
-@router.post("/api/generate_rag_with_title", response_model=TitleResponse)
-async def generate_rag_with_title(
-    payload: SingleRagRequest = Body(...),
-    llm = Depends(get_llm),
-    vs  = Depends(get_vectorstore),
-):
-    # 1) Define your extraction job and JSON schema up front
-    instruction_block = (
-        "Your task is to extract the article's exact title as it appears at the top of the paper. "
-        "Respond ONLY with JSON, following this schema:\n\n"
-        f"{TitleResponse.model_json_schema()}\n\n"
+async def _refine_search_queries(llm, model: str, names: List[str]) -> Dict[str, str]:
+    """One LLM call suggesting a search query per field, defaults for anything it gets wrong"""
+    SearchQueries = create_model("SearchQueries", **{name: (str, ...) for name in names})
+    prompt = (
+        "You are an expert at reading scientific articles. "
+        "For each of the extraction tasks below, suggest a concise search query (2-5 words) "
+        "to find the passages of the study it needs.\n\n" +
+        "".join(f"{name}: {FIELDS[name].task}\n" for name in names) +
+        "\nRespond ONLY with JSON, following this schema:\n\n"
+        f"{SearchQueries.model_json_schema()}\n\n"
     )
-
-    # 2) Let the LLM refine that into a concise search query
-    refine_resp = await run_in_threadpool(
+    res = await run_in_threadpool(
         llm.chat,
-        model=payload.model,
-        messages=[{
-            "role": "user",
-            "content": (
-                instruction_block
-            )
-        }],
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        format=SearchQueries.model_json_schema(),
     )
-    search_query = refine_resp["message"]["content"].strip().strip('"')
-
-    # 3) Pull top-k chunks (with scores) for each file
-    docs_and_scores = []
-    for src in payload.file_names:
-        docs_and_scores.extend(
-            vs.similarity_search_with_score(
-                query=search_query,
-                k=payload.top_k,
-                filter={"source": src},
-            )
-        )
+    try:
+        queries = SearchQueries.model_validate_json(res["message"]["content"]).model_dump()
+    except ValidationError:
+        queries = {}
+    return {name: (queries.get(name) or "").strip().strip('"') or FIELDS[name].default_query for name in names}
 
-    if not docs_and_scores:
-        raise HTTPException(404, "No document chunks found to extract a title")
 
-    # 3a) Pick the best chunk (highest score) as the likeliest title snippet
-    docs_and_scores.sort(key=lambda pair: pair[1], reverse=True)
-    best_doc = docs_and_scores[0][0]
+def _build_context(name: str, docs_and_scores: list) -> str:
+    field = FIELDS[name]
+    if not docs_and_scores:
+        if field.require_docs:
+            raise HTTPException(404, f"No document chunks found to extract the {name}")
+        return ""
 
-    # 4) Build context using just that one snippet (which should contain the title)
-    context = best_doc.page_content
+    if field.context == "best":
+        # Pick the best chunk (highest score) as the likeliest snippet
+        return max(docs_and_scores, key=lambda pair: pair[1])[0].page_content
 
-    # 5) Final LLM call to format the JSON title
+    # apply score threshold, fallback to at least something if none pass
+    filtered = [doc for doc, score in docs_and_scores if score >= 0.65]
+    if not filtered:
+        filtered = [doc for doc, _ in docs_and_scores]
+    return "\n\n".join(d.page_content for d in filtered)
+
+
+async def _chat_in_slot(llm, **kwargs) -> dict:
+    """llm.chat in the threadpool under a _field_slots slot, released when the thread is done"""
+    await _field_slots.acquire()
+    try:
+        future = asyncio.ensure_future(run_in_threadpool(llm.chat, **kwargs))
+    except BaseException:
+        _field_slots.release()
+        raise
+
+    def release(done: asyncio.Future):
+        _field_slots.release()
+        if not done.cancelled():
+            done.exception()  # retrieved, a cancelled caller won't
+
+    future.add_done_callback(release)
+    # Cancelling the caller must not free the slot while the thread still runs
+    return await asyncio.shield(future)
+
+
+async def _generate_field(llm, model: str, name: str, context: str, limited: bool = False) -> dict:
+    """
+    Final LLM call for one field, validated against its schema with up to 5 tries.
+    limited=True runs each call under the RAG_FIELD_CONCURRENCY slots.
+    """
+    field = FIELDS[name]
     final_prompt = (
-        instruction_block +
-        "Data snippet:\n" + context + "\n\n"
-        "Do NOT include any text before or after the JSON."
+        field.instruction_block() +
+        field.snippets_label + context + "\n\n" +
+        field.closing
     )
-    res = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{"role": "user", "content": final_prompt}],
-        format=TitleResponse.model_json_schema(),
-    )
-    raw = res["message"]["content"]
-
-    # 6) Validate & retry up to 5× on malformed JSON
+    chat = (lambda **kwargs: _chat_in_slot(llm, **kwargs)) if limited else (
+        lambda **kwargs: run_in_threadpool(llm.chat, **kwargs))
     for attempt in range(1, 6):
+        res = await chat(
+            model=model,
+            messages=[{"role": "user", "content": final_prompt}],
+            format=field.response_model.model_json_schema(),
+        )
         try:
-            result = TitleResponse.model_validate_json(raw)
-            break
+            return field.response_model.model_validate_json(res["message"]["content"]).model_dump()
         except ValidationError as e:
             if attempt == 5:
-                raise HTTPException(500, f"LLM returned invalid title schema: {e}")
-            retry = await run_in_threadpool(
-                llm.chat,
-                model=payload.model,
-                messages=[{"role": "user", "content": final_prompt}],
-                format=TitleResponse.model_json_schema(),
-            )
-            raw = retry["message"]["content"]
+                raise HTTPException(500, f"LLM returned invalid {name} schema after 5 tries: {e}")
 
-    return result.model_dump()
 
+async def _generate_rag_field(name: str, payload: SingleRagRequest, llm, vs) -> dict:
+    # 1) Let the LLM refine the job into a focused search query
+    search_query = await _refine_search_query(llm, payload.model, FIELDS[name])
 
-@router.post("/api/generate_rag_with_keywords", response_model=KeywordsResponse)
-async def generate_rag_with_keywords(
+    # 2) Similarity search with the refined query (embedded once, top-k per file)
+    per_file = await run_in_threadpool(retrieve_per_file, vs, search_query, payload.file_names, payload.top_k)
+    docs_and_scores = [pair for pairs in per_file.values() for pair in pairs]
+
+    # 3) Build context and produce the JSON
+    context = _build_context(name, docs_and_scores)
+    return await _generate_field(llm, payload.model, name, context)
+
+
+@router.post("/api/generate_rag_with_description", response_model=DescriptionResponse)
+async def generate_rag_with_description(
     payload: SingleRagRequest = Body(...),
     llm = Depends(get_llm),
     vs  = Depends(get_vectorstore),
 ):
-    # 1) Build the “job” instruction
-    instruction_block = (
-        "You are an expert at reading scientific articles. "
-        "Your task is to extract 4-6 key topical terms from the study. "
-        "Respond ONLY with JSON, following this schema:\n\n"
-        f"{KeywordsResponse.model_json_schema()}\n\n"
-    )
+    return await _generate_rag_field("description", payload, llm, vs)
 
-    # 2) Let the LLM refine that into a focused search query
-    refine_resp = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{
-            "role": "user",
-            "content": (
-                instruction_block +
-                "Based on the above, suggest a concise search query (2-5 words)."
-            )
-        }],
-    )
-    search_query = refine_resp["message"]["content"].strip().strip('"')
-
-    # 3) Gather top‐k docs + scores per file
-    docs_and_scores_all: list[tuple] = []
-    for src in payload.file_names:
-        ds = vs.similarity_search_with_score(
-            query=search_query,
-            k=payload.top_k,
-            filter={"source": src},
-        )
-        docs_and_scores_all.extend(ds)
-
-    if not docs_and_scores_all:
-        raise HTTPException(404, "No documents found for any of the requested files")
 
-    # 3a) apply score threshold
-    filtered = [doc for doc, score in docs_and_scores_all if score >= 0.65]
-    # 3b) fallback if nothing passes
-    if not filtered:
-        filtered = [doc for doc, _ in docs_and_scores_all]
-
-    # 4) Build context
-    context = "\n\n".join(d.page_content for d in filtered)
-
-    # 5) Final prompt for keywords extraction
-    final_prompt = (
-        instruction_block +
-        "Data snippets:\n" + context + "\n\n"
-        "Do NOT include any extra text."
-    )
-    res = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{"role": "user", "content": final_prompt}],
-        format=KeywordsResponse.model_json_schema(),
-    )
-    raw = res["message"]["content"]
+@router.post("/api/generate_rag_with_title", response_model=TitleResponse)
+async def generate_rag_with_title(
+    payload: SingleRagRequest = Body(...),
+    llm = Depends(get_llm),
+    vs  = Depends(get_vectorstore),
+):
+    return await _generate_rag_field("title", payload, llm, vs)
 
-    # 6) Validate & retry up to 5×
-    for attempt in range(1, 6):
-        try:
-            result = KeywordsResponse.model_validate_json(raw)
-            break
-        except ValidationError as e:
-            if attempt == 5:
-                raise HTTPException(500, f"LLM returned invalid schema after 5 tries: {e}")
-            # retry
-            retry = await run_in_threadpool(
-                llm.chat,
-                model=payload.model,
-                messages=[{"role": "user", "content": final_prompt}],
-                format=KeywordsResponse.model_json_schema(),
-            )
-            raw = retry["message"]["content"]
 
-    return result.model_dump()
+@router.post("/api/generate_rag_with_keywords", response_model=KeywordsResponse)
+async def generate_rag_with_keywords(
+    payload: SingleRagRequest = Body(...),
+    llm = Depends(get_llm),
+    vs  = Depends(get_vectorstore),
+):
+    return await _generate_rag_field("keywords", payload, llm, vs)
 
 
 @router.post("/api/generate_rag_with_assays", response_model=AssaysResponse)
@@ -269,82 +231,73 @@ async def generate_rag_with_assays(
     llm = Depends(get_llm),
     vs  = Depends(get_vectorstore),
 ):
-    # 1) Build the "job" instruction
-    instruction_block = (
-    "You are an expert at reading scientific articles. "
-    "Your task is to identify and extract all experimental assays used in the study. "
-    "An assay is a laboratory procedure or test designed to measure, detect, or analyze a specific biological component or process (e.g., Western Blotting, ELISA, PCR, Calcium Uptake, Cell viability). "
-    "Do NOT include sample preparation steps, statistical methods, general procedures, or descriptions. "
-    "Return each assay name as a separate string in the 'assays' array. "
-    "Respond ONLY with JSON, following this schema:\n\n"
-    f"{AssaysResponse.model_json_schema()}\n\n"
-)
-
-    # 2) Let the LLM refine that into a focused search query
-    refine_resp = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{
-            "role": "user",
-            "content": (
-                instruction_block +
-                "Based on the above, suggest a concise search query (2-5 words)."
-            )
-        }],
-    )
-    search_query = refine_resp["message"]["content"].strip().strip('"')
-
-    # 3) Gather top‐k docs + scores per file
-    docs_and_scores_all: list[tuple] = []
-    for src in payload.file_names:
-        ds = vs.similarity_search_with_score(
-            query=search_query,
-            k=payload.top_k,
-            filter={"source": src},
-        )
-        docs_and_scores_all.extend(ds)
-
-    if not docs_and_scores_all:
-        raise HTTPException(404, "No documents found for any of the requested files")
-
-    # 3a) apply score threshold
-    filtered = [doc for doc, score in docs_and_scores_all if score >= 0.65]
-    # 3b) fallback if nothing passes
-    if not filtered:
-        filtered = [doc for doc, _ in docs_and_scores_all]
+    return await _generate_rag_field("assays", payload, llm, vs)
 
-    # 4) Build context
-    context = "\n\n".join(d.page_content for d in filtered)
 
-    # 5) Final prompt for assays extraction
-    final_prompt = (
-        instruction_block +
-        "Data snippets:\n" + context + "\n\n"
-        "Do NOT include any extra text."
-    )
-    res = await run_in_threadpool(
-        llm.chat,
-        model=payload.model,
-        messages=[{"role": "user", "content": final_prompt}],
-        format=AssaysResponse.model_json_schema(),
-    )
-    raw = res["message"]["content"]
-
-    # 6) Validate & retry up to 5×
-    for attempt in range(1, 6):
+@router.post("/api/generate_rag_metadata")
+async def generate_rag_metadata(
+    payload: MetadataRequest = Body(...),
+    llm = Depends(get_llm),
+):
+    """
+    Server-sent events: fill several metadata fields of a study record at once.
+    One LLM call suggests the search queries for all fields, one retrieval pass
+    serves all of them (queries embedded in one batch), and
+    the per-field generations run concurrently under RAG_FIELD_CONCURRENCY.
+    Emits `queries`, then one `field` (or `error`) event per field as soon as
+    it is done, then `done` with all values.
+    """
+    names = list(dict.fromkeys(payload.fields))
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown or not names:
+        raise HTTPException(422, f"Unknown fields {unknown}, expected some of {list(FIELDS)}")
+    vs = await run_in_threadpool(get_vectorstore, payload)
+
+    async def run_field(name: str, per_file: dict):
         try:
-            result = AssaysResponse.model_validate_json(raw)
-            break
-        except ValidationError as e:
-            if attempt == 5:
-                raise HTTPException(500, f"LLM returned invalid schema after 5 tries: {e}")
-            # retry
-            retry = await run_in_threadpool(
-                llm.chat,
-                model=payload.model,
-                messages=[{"role": "user", "content": final_prompt}],
-                format=AssaysResponse.model_json_schema(),
-            )
-            raw = retry["message"]["content"]
-
-    return result.model_dump()
\ No newline at end of file
+            context = _build_context(name, [pair for pairs in per_file.values() for pair in pairs])
+            return name, await _generate_field(llm, payload.model, name, context, limited=True), None
+        except HTTPException as e:
+            return name, None, e.detail
+        except Exception as e:
+            return name, None, str(e)
+
+    async def event_stream():
+        started = time.perf_counter()
+        try:
+            queries = await _refine_search_queries(llm, payload.model, names)
+        except Exception as e:
+            # Retrieval still works with the fields' own queries
+            logging.warning(f"Search query suggestion failed, using the default queries: {e}")
+            queries = {name: FIELDS[name].default_query for name in names}
+        yield {"event": "queries", "data": json.dumps(queries)}
+
+        values = {}
+        try:
+            retrieved = await run_in_threadpool(
+                retrieve_per_file_many, vs, [queries[name] for name in names], payload.file_names, payload.top_k)
+        except Exception as e:
+            for name in names:
+                yield {"event": "error", "data": json.dumps({"field": name, "detail": str(e)})}
+            retrieved = []
+        tasks = [asyncio.ensure_future(run_field(name, per_file)) for name, per_file in zip(names, retrieved)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, result, error = await next_done
+                if error is not None:
+                    yield {"event": "error", "data": json.dumps({"field": name, "detail": error})}
+                    continue
+                values.update(result)
+                yield {"event": "field", "data": json.dumps({
+                    "field": name, "value": result, "seconds": round(time.perf_counter() - started, 2),
+                })}
+        finally:
+            # Client went away: stop the generations nobody will read
+            for task in tasks:
+                task.cancel()
+
+        yield {"event": "done", "data": json.dumps({
+            "values": values, "seconds": round(time.perf_counter() - started, 2),
+        })}
+
+    return EventSourceResponse(event_stream())
@@ -36,3 +36,8 @@ class SingleRagRequest(BaseModel):
     model: str = "llama3.1"
     top_k: int   = 3
     extra_instructions: str = ""
+
+
+class MetadataRequest(SingleRagRequest):
+    # Any of "title", "description", "keywords", "assays"
+    fields: List[str] = ["title", "description", "keywords", "assays"]
@@ -0,0 +1,118 @@
+# rag_calls/retrieval.py
+"""
+Per-file retrieval for the RAG endpoints.
+
+Each distinct query is embedded once and all the files it is asked for are
+searched with a single Chroma query filtered on `source $in [...]`. Files that
+come back with fewer than k chunks (another file took their slots in the
+shared top k * files, or they only have a few chunks) are re-queried on their
+own with the same vector, in parallel, so every file still gets its own top-k.
+
+retrieve_per_file_many does the same for several queries at once (the
+metadata fields of /api/generate_rag_metadata): the queries are embedded in
+one batch and their shared queries run in parallel.
+
+Searches go through the vectorstore's similarity_search_by_vector_with_relevance_scores,
+so scores are Chroma distances, the same values similarity_search_with_score returns.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from langchain.schema import Document
+
+RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval")
+
+DocsAndScores = List[Tuple[Document, float]]
+
+
+def _query(vectorstore, embedding: List[float], n_results: int, where: dict) -> DocsAndScores:
+    return vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=n_results, filter=where)
+
+
+def _shared_query(vectorstore, embedding: List[float], file_names: List[str],
+                  k: int) -> Tuple[Dict[str, DocsAndScores], List[str]]:
+    """
+    Top k * files over all files, split by file. Also returns the files that
+    may have been crowded out and need a query of their own.
+    """
+    where = {"source": file_names[0]} if len(file_names) == 1 else {"source": {"$in": file_names}}
+    n_results = k * len(file_names)
+    results = _query(vectorstore, embedding, n_results, where)
+    by_file: Dict[str, DocsAndScores] = {name: [] for name in file_names}
+    for doc, distance in results:
+        hits = by_file.get(doc.metadata.get("source"))
+        if hits is not None and len(hits) < k:
+            hits.append((doc, distance))
+    # Fewer results than asked for means every matching chunk came back, nobody was crowded out
+    if len(results) < n_results:
+        return by_file, []
+    return by_file, [name for name in file_names if len(by_file[name]) < k]
+
+
+def _file_query(vectorstore, embedding: List[float], name: str, k: int) -> DocsAndScores:
+    return _query(vectorstore, embedding, k, {"source": name})
+
+
+def _embed_queries(vectorstore, queries: List[str]) -> Dict[str, List[float]]:
+    """Each distinct query embedded once, several of them in one batch"""
+    if len(queries) == 1:
+        return {queries[0]: vectorstore.embeddings.embed_query(queries[0])}
+    return dict(zip(queries, vectorstore.embeddings.embed_documents(queries)))
+
+
+def _retrieve(vectorstore, vectors: Dict[str, List[float]], files_by_query: Dict[str, List[str]],
+              k: int) -> Dict[str, Dict[str, DocsAndScores]]:
+    """Shared query per distinct query, then per-file queries for the files still short of k"""
+    shared = {query: _executor.submit(_shared_query, vectorstore, vectors[query], names, k)
+              for query, names in files_by_query.items()}
+    by_query, futures = {}, {}
+    for query, future in shared.items():
+        by_query[query], short = future.result()
+        for name in short:
+            futures[query, name] = _executor.submit(_file_query, vectorstore, vectors[query], name, k)
+    for (query, name), future in futures.items():
+        by_query[query][name] = future.result()
+    return by_query
+
+
+def retrieve_per_file(vectorstore, query: Union[str, Dict[str, str]], file_names: List[str],
+                      k: int) -> Dict[str, DocsAndScores]:
+    """
+    Top-k (Document, distance) pairs for each file, best first, keyed by file
+    name in `file_names` order. `query` is one query for all files, or a
+    {file name: query} mapping; distinct queries are embedded in one batch.
+    """
+    file_names = list(dict.fromkeys(file_names))
+    if not file_names or k <= 0:
+        return {name: [] for name in file_names}
+
+    if isinstance(query, str):
+        query = {name: query for name in file_names}
+    files_by_query: Dict[str, List[str]] = {}
+    for name in file_names:
+        files_by_query.setdefault(query[name], []).append(name)
+
+    vectors = _embed_queries(vectorstore, list(files_by_query))
+    by_query = _retrieve(vectorstore, vectors, files_by_query, k)
+    return {name: by_query[query[name]][name] for name in file_names}
+
+
+def retrieve_per_file_many(vectorstore, queries: List[str], file_names: List[str],
+                           k: int) -> List[Dict[str, DocsAndScores]]:
+    """
+    retrieve_per_file for each of `queries`, in order, with one embedding batch
+    for all of them. Repeated queries are retrieved once.
+    """
+    file_names = list(dict.fromkeys(file_names))
+    if not queries:
+        return []
+    if not file_names or k <= 0:
+        return [{name: [] for name in file_names} for _ in queries]
+
+    distinct = list(dict.fromkeys(queries))
+    vectors = _embed_queries(vectorstore, distinct)
+    by_query = _retrieve(vectorstore, vectors, {query: file_names for query in distinct}, k)
+    return [by_query[query] for query in queries]
@@ -0,0 +1,102 @@
+# fastapi-backend/tests/test_chat_memory.py
+"""
+chat_memory against an in-process Redis (fakeredis), no server or LLM needed.
+
+Run from fastapi-backend/:
+    pip install pytest fakeredis
+    python -m pytest tests
+"""
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+import chat_memory
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    chat_memory.set_redis_client(client)
+    summarized = []
+
+    def fake_summarize(summary, turns, model):
+        summarized.extend(human for human, _ in turns)
+        return " ".join(filter(None, [summary] + [human for human, _ in turns]))
+
+    monkeypatch.setattr(chat_memory, "_summarize_turns", fake_summarize)
+    monkeypatch.setattr(chat_memory, "CHAT_HISTORY_MAX_TURNS", 6)
+    monkeypatch.setattr(chat_memory, "CHAT_SUMMARY_BATCH_TURNS", 4)
+    monkeypatch.setattr(chat_memory, "CHAT_HISTORY_TOKEN_BUDGET", 100000)
+    client.summarized = summarized
+    yield client
+    asyncio.run(client.aclose())
+
+
+def add_turns(session_id, start, stop):
+    async def add():
+        for i in range(start, stop):
+            await chat_memory.add_chat_exchange(session_id, f"q{i}", f"a{i}")
+    asyncio.run(add())
+
+
+def windowed(session_id):
+    return asyncio.run(chat_memory.get_windowed_history(session_id, "test-model"))
+
+
+def test_short_history_is_verbatim(redis):
+    add_turns("s", 0, 3)
+    summary, recent = windowed("s")
+    assert summary == ""
+    assert recent == [("q0", "a0"), ("q1", "a1"), ("q2", "a2")]
+
+
+def test_missing_summary_folds_every_older_turn(redis):
+    # 20 turns and no summary yet: q0..q13 are older than the window and all
+    # of them must reach the summary, not only the ones in the LRANGE tail
+    add_turns("s", 0, 20)
+    summary, recent = windowed("s")
+    assert redis.summarized == [f"q{i}" for i in range(14)]
+    assert recent == [(f"q{i}", f"a{i}") for i in range(14, 20)]
+    state = json.loads(asyncio.run(redis.get(f"{chat_memory.SUMMARY_PREFIX}s")))
+    assert state["turns"] == 14
+
+
+def test_lagging_summary_catches_up_in_chunks(redis, monkeypatch):
+    monkeypatch.setattr(chat_memory, "CHAT_SUMMARY_MAX_FOLD_TURNS", 5)
+    add_turns("s", 0, 8)
+    windowed("s")  # folds q0, q1 (8 - 6 turns) only once a batch of 4 is due
+    assert redis.summarized == []
+    add_turns("s", 8, 40)
+    summary, recent = windowed("s")
+    assert redis.summarized == [f"q{i}" for i in range(34)]
+    assert summary.split() == [f"q{i}" for i in range(34)]
+    assert [h for h, _ in recent] == [f"q{i}" for i in range(34, 40)]
+
+
+def test_summary_is_not_refolded(redis):
+    add_turns("s", 0, 12)
+    windowed("s")
+    add_turns("s", 12, 14)
+    windowed("s")
+    add_turns("s", 14, 16)
+    summary, recent = windowed("s")
+    assert redis.summarized == [f"q{i}" for i in range(10)]
+    assert [h for h, _ in recent] == [f"q{i}" for i in range(10, 16)]
+
+
+def test_purge_expire_sets_ttl(redis):
+    add_turns("s", 0, 2)
+    purged = asyncio.run(chat_memory.purge_chat_history(mode="expire", ttl=60))
+    assert purged == 1
+    assert 0 < asyncio.run(redis.ttl(chat_memory._history_key("s"))) <= 60
+    assert chat_memory.PURGE_PROGRESS["state"] == "done"
+
+
+def test_purge_delete_keeps_keys_of_unknown_age(redis):
+    # fakeredis has no OBJECT IDLETIME: the purge can't prove a key predates it
+    add_turns("s", 0, 2)
+    assert asyncio.run(chat_memory.purge_chat_history(mode="delete")) == 0
+    assert asyncio.run(redis.exists(chat_memory._history_key("s"))) == 1
+    assert chat_memory.PURGE_PROGRESS["skipped_active"] == 1
@@ -0,0 +1,82 @@
+# fastapi-backend/tests/test_embedding_batcher.py
+"""
+BatchingEmbeddings with a fake model: results per caller, worker lifetime.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import gc
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from dependencies.embedding_batcher import BatchingEmbeddings
+
+
+class FakeModel:
+    model_name = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_callers_get_their_own_vectors():
+    model = FakeModel()
+    batcher = BatchingEmbeddings(model, max_batch_size=8, max_wait_ms=20)
+    texts = ["x" * n for n in range(1, 21)]
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(batcher.embed_query, texts))
+    assert results == [[float(n)] for n in range(1, 21)]
+    assert max(model.batches) <= 8 and len(model.batches) < 20
+    batcher.close()
+
+
+def test_wrapped_attributes_and_uninitialised_instance():
+    batcher = BatchingEmbeddings(FakeModel())
+    assert batcher.model_name == "fake"
+    bare = BatchingEmbeddings.__new__(BatchingEmbeddings)
+    assert not hasattr(bare, "model_name")
+    batcher.close()
+
+
+def test_unreferenced_wrapper_stops_its_worker():
+    model = FakeModel()
+    batcher = BatchingEmbeddings(model, name="gc")
+    assert batcher.embed_documents(["ab"]) == [[2.0]]
+    worker, ref = batcher._worker, weakref.ref(batcher)
+    del batcher
+    gc.collect()
+    assert ref() is None
+    worker.join(timeout=2)
+    assert not worker.is_alive()
+
+
+def test_closed_batcher_still_embeds():
+    batcher = BatchingEmbeddings(FakeModel())
+    batcher.close()
+    time.sleep(0.01)
+    assert batcher.embed_query("abc") == [3.0]
+
+
+def test_evicted_batched_model_is_freed_once_unreferenced(monkeypatch):
+    from dependencies import embeddings
+
+    class Sized(FakeModel):
+        model_bytes = 60 * 1024 * 1024
+
+    monkeypatch.setattr(embeddings, "_load_model", lambda name, kwargs: Sized())
+    monkeypatch.setattr(embeddings, "EMBED_BATCHING_ENABLED", True)
+    registry = embeddings.EmbeddingRegistry(memory_budget_mb=100)
+    held = registry.get("a")
+    registry.get("b")
+    # Evicted but held: still batched, adopted back by get()
+    assert held.embed_query("abc") == [3.0]
+    assert registry.get("a") is held
+    del held
+    registry.get("b")
+    gc.collect()
+    assert registry.stats()["evicted_referenced_bytes"] == 0
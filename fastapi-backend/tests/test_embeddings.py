@@ -0,0 +1,72 @@
+# fastapi-backend/tests/test_embeddings.py
+"""
+EmbeddingRegistry LRU/budget eviction with fake models, nothing is downloaded.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import gc
+
+import pytest
+
+from dependencies import embeddings
+
+MB = 1024 * 1024
+
+
+class FakeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model_bytes = 60 * MB
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    loads = []
+
+    def load(model_name, model_kwargs):
+        loads.append(model_name)
+        return FakeModel(model_name)
+
+    monkeypatch.setattr(embeddings, "_load_model", load)
+    monkeypatch.setattr(embeddings, "EMBED_BATCHING_ENABLED", False)
+    registry = embeddings.EmbeddingRegistry(memory_budget_mb=100)
+    registry.loads = loads
+    return registry
+
+
+def test_same_model_is_shared(registry):
+    assert registry.get("a") is registry.get("a")
+    assert registry.loads == ["a"]
+
+
+def test_lru_model_is_evicted_over_budget(registry):
+    registry.get("a")
+    registry.get("b")
+    assert [m["model_name"] for m in registry.stats()["models"]] == ["b"]
+    assert registry.resident_bytes() == 60 * MB
+
+
+def test_evicted_model_still_referenced_is_reused(registry):
+    held = registry.get("a")
+    registry.get("b")
+    assert registry.stats()["evicted_referenced_bytes"] == 60 * MB
+    # Still usable by whoever holds it, and adopted back instead of loaded twice
+    assert held.embed_query("abc") == [3.0]
+    assert registry.get("a") is held
+    assert registry.loads == ["a", "b"]
+
+
+def test_unreferenced_evicted_model_is_freed(registry):
+    registry.get("a")
+    registry.get("b")
+    gc.collect()
+    assert registry.stats()["evicted_referenced_bytes"] == 0
+    registry.get("a")
+    assert registry.loads == ["a", "b", "a"]
@@ -0,0 +1,92 @@
+# fastapi-backend/tests/test_ingest_jobs.py
+"""
+IngestJob resume, cancel and failure handling with stubbed stage runners,
+nothing is parsed, embedded or indexed.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from ingest import jobs
+
+
+@pytest.fixture
+def make_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "jobs_root", lambda session_id: str(tmp_path / session_id / "ingest_jobs"))
+    ran = []
+
+    def make(done_stages=(), fail_in=None, cancel_in=None):
+        job = jobs.IngestJob.create("s", "c", "C", "m", [{"name": "a.pdf"}])
+        with open(os.path.join(job.uploads_dir, "0.pdf"), "wb") as f:
+            f.write(b"%PDF")
+        for name in done_stages:
+            job.state["stages"][name]["status"] = "done"
+
+        def runner(name):
+            async def run():
+                ran.append(name)
+                if name == fail_in:
+                    raise ValueError("boom")
+                if name == cancel_in:
+                    job.cancel_requested = True
+            return run
+
+        for name in jobs.STAGES:
+            setattr(job, f"run_{name}", runner(name))
+        job.register_collection = lambda vectorstore: ran.append("register")
+        job.ran = ran
+        return job
+
+    return make
+
+
+def on_disk(job):
+    with open(job.path("job.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_resumed_job_skips_completed_stages(make_job):
+    job = make_job(done_stages=("parse", "split"))
+    asyncio.run(job.run())
+    assert job.ran == ["embed", "index", "images", "register"]
+    assert on_disk(job)["status"] == "done"
+    # Checkpoints and uploads are dropped, job.json stays for status queries
+    assert os.listdir(job.job_dir) == ["job.json"]
+
+
+def test_cancel_stops_before_next_stage(make_job):
+    job = make_job(cancel_in="split")
+    asyncio.run(job.run())
+    assert job.ran == ["parse", "split"]
+    assert on_disk(job)["status"] == "cancelled"
+    assert os.listdir(job.job_dir) == ["job.json"]
+
+
+def test_failed_job_drops_its_artifacts(make_job):
+    job = make_job(fail_in="embed")
+    asyncio.run(job.run())
+    state = on_disk(job)
+    assert (state["status"], state["stage"], state["error"]) == ("failed", "embed", "boom")
+    assert os.listdir(job.job_dir) == ["job.json"]
+
+
+def test_cancel_job_not_running_here(make_job):
+    job = make_job()
+    job.state["status"] = "running"
+    jobs.cancel_job(job)
+    assert on_disk(job)["status"] == "cancelled"
+    assert os.listdir(job.job_dir) == ["job.json"]
+
+
+def test_progress_writes_are_throttled(make_job, monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_SAVE_INTERVAL", 3600)
+    job = make_job()
+    for done in range(1, 4):
+        job.progress("embed", done, total=3)
+    assert job.status()["stages"]["embed"]["done"] == 3
+    assert on_disk(job)["stages"]["embed"]["done"] == 0
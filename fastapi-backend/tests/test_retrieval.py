@@ -0,0 +1,81 @@
+# fastapi-backend/tests/test_retrieval.py
+"""
+retrieve_per_file / retrieve_per_file_many against a real Chroma store with a
+deterministic fake embedding, compared with one filtered search per file.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import hashlib
+
+import chromadb
+import pytest
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from rag_calls.retrieval import retrieve_per_file, retrieve_per_file_many
+
+FILES = {"a.pdf": 40, "b.pdf": 40, "small.pdf": 2, "c.pdf": 20}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    @staticmethod
+    def vector(text):
+        digest = hashlib.sha256(text.encode()).digest()
+        return [byte / 255 for byte in digest[:16]]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return self.vector(text)
+
+
+@pytest.fixture
+def vectorstore(tmp_path):
+    embeddings = FakeEmbeddings()
+    store = Chroma(client=chromadb.PersistentClient(path=str(tmp_path)), embedding_function=embeddings)
+    docs = [Document(page_content=f"{name} chunk {i}", metadata={"source": name})
+            for name, count in FILES.items() for i in range(count)]
+    store.add_documents(docs, ids=[doc.page_content for doc in docs])
+    embeddings.calls.clear()
+    return store
+
+
+def expected(vectorstore, query, names, k):
+    vector = FakeEmbeddings.vector(query)
+    return {name: [doc.page_content for doc, _ in vectorstore.similarity_search_by_vector_with_relevance_scores(
+        vector, k=k, filter={"source": name})] for name in names}
+
+
+def contents(per_file):
+    return {name: [doc.page_content for doc, _ in pairs] for name, pairs in per_file.items()}
+
+
+@pytest.mark.parametrize("names", [list(FILES), ["a.pdf"], ["small.pdf", "c.pdf"], ["a.pdf", "missing.pdf"]])
+def test_one_query_matches_per_file_search(vectorstore, names):
+    got = retrieve_per_file(vectorstore, "a.pdf chunk 3", names, 3)
+    assert list(got) == names
+    assert contents(got) == expected(vectorstore, "a.pdf chunk 3", names, 3)
+    assert vectorstore.embeddings.calls == [["a.pdf chunk 3"]]
+
+
+def test_query_mapping_embeds_each_distinct_query_once(vectorstore):
+    queries = {"a.pdf": "methods", "b.pdf": "methods", "c.pdf": "results"}
+    got = retrieve_per_file(vectorstore, queries, list(queries), 2)
+    assert vectorstore.embeddings.calls == [["methods", "results"]]
+    assert contents(got) == {**expected(vectorstore, "methods", ["a.pdf", "b.pdf"], 2),
+                             **expected(vectorstore, "results", ["c.pdf"], 2)}
+
+
+def test_many_queries_share_one_embedding_batch(vectorstore):
+    queries = ["methods", "results", "methods"]
+    got = retrieve_per_file_many(vectorstore, queries, list(FILES), 2)
+    assert vectorstore.embeddings.calls == [["methods", "results"]]
+    assert [contents(per_file) for per_file in got] == [expected(vectorstore, query, list(FILES), 2)
+                                                        for query in queries]
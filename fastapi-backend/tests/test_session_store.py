@@ -0,0 +1,63 @@
+# fastapi-backend/tests/test_session_store.py
+"""
+SessionStore resident/cold tiering, and the per-directory Chroma client.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+from config.session_store import SessionStore, chroma_client, drop_chroma_store
+
+MB = 1024 * 1024
+
+
+def session(vectorstore=None, resident_bytes=0):
+    coll = {"vectorstore": vectorstore, "name": "c", "files": []}
+    if vectorstore is not None:
+        coll["resident_bytes"] = resident_bytes
+    return {"collections": {"c": coll}, "history": []}
+
+
+def test_lru_session_goes_cold_and_rehydrates():
+    evicted = []
+    store = SessionStore(max_resident=2, memory_budget_mb=0, on_evict=lambda sid, _: evicted.append(sid))
+    for sid in ("a", "b"):
+        store[sid] = session()
+    store["a"]  # a is now the most recently used
+    store["c"] = session()
+    assert evicted == ["b"]
+    assert store.stats()["cold_sessions"] == 1 and "b" in store
+    assert store["b"]["collections"]["c"]["name"] == "c"
+    assert store.stats()["rehydrations"] == 1
+    assert evicted == ["b", "a"]
+
+
+def test_memory_budget_drops_handles_but_keeps_metadata():
+    store = SessionStore(max_resident=10, memory_budget_mb=100)
+    store["a"] = session(vectorstore=object(), resident_bytes=60 * MB)
+    store["b"] = session(vectorstore=object(), resident_bytes=60 * MB)
+    cold = store._cold["a"]["collections"]["c"]
+    assert cold["vectorstore"] is None and cold["name"] == "c"
+    assert store.resident_bytes() == 60 * MB
+
+
+def test_session_that_triggered_eviction_is_kept():
+    store = SessionStore(max_resident=10, memory_budget_mb=100)
+    store["a"] = session()
+    store["b"] = session(vectorstore=object(), resident_bytes=200 * MB)
+    assert list(store._resident) == ["b"]
+
+
+def test_cold_sessions_are_capped():
+    store = SessionStore(max_resident=1, memory_budget_mb=0, max_cold=2)
+    for sid in "abcd":
+        store[sid] = session()
+    assert list(store._cold) == ["b", "c"] and "a" not in store
+
+
+def test_chroma_client_is_shared_per_directory(tmp_path):
+    client = chroma_client(str(tmp_path / "coll"))
+    assert chroma_client(str(tmp_path / "coll" / ".")) is client
+    client.get_or_create_collection("langchain").add(ids=["1"], embeddings=[[0.1, 0.2]], documents=["x"])
+    drop_chroma_store(str(tmp_path / "coll"))
+    # The same client keeps working for a re-created collection
+    assert chroma_client(str(tmp_path / "coll")).get_or_create_collection("langchain").count() == 0
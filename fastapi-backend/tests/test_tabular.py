@@ -0,0 +1,39 @@
+# fastapi-backend/tests/test_tabular.py
+"""
+Excel streaming with ragged rows, on a small workbook written by openpyxl.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import re
+import zipfile
+
+from openpyxl import Workbook
+
+from ingest.tabular import iter_excel_frames, tabular_documents
+
+
+def ragged_workbook(path, rows):
+    """Save rows as-is: without the <dimension> record read-only mode doesn't pad them"""
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+    with zipfile.ZipFile(path) as src:
+        parts = [(info, src.read(info.filename)) for info in src.infolist()]
+    with zipfile.ZipFile(path, "w") as out:
+        for info, data in parts:
+            if info.filename.startswith("xl/worksheets/"):
+                data = re.sub(rb"<dimension[^>]*/>", b"", data)
+            out.writestr(info, data)
+
+
+def test_ragged_rows_fit_the_header(tmp_path):
+    path = str(tmp_path / "ragged.xlsx")
+    ragged_workbook(path, [("a", "b", "c"), (1, 2), (4, 5, 6, 7), (8, 9, 10)])
+    frames = list(iter_excel_frames(path, chunk_rows=2))
+    assert [list(df.columns) for df in frames] == [["a", "b", "c"]] * 2
+    assert [df.shape for df in frames] == [(2, 3), (1, 3)]
+    assert frames[0].iloc[1].tolist() == [4, 5, 6]
+    docs = list(tabular_documents(iter(frames), {"source": "ragged.xlsx"}))
+    assert docs and all(doc.page_content.startswith("Columns: a | b | c") for doc in docs)
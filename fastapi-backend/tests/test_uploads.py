@@ -0,0 +1,67 @@
+# fastapi-backend/tests/test_uploads.py
+"""
+save_upload per-session quota with in-memory uploads.
+
+Run from fastapi-backend/:
+    python -m pytest tests
+"""
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from file_handlers import uploads
+
+MB = 1024 * 1024
+
+
+class FakeUpload:
+    def __init__(self, filename, size):
+        self.filename = filename
+        self.left = size
+
+    async def read(self, size):
+        await asyncio.sleep(0)  # let concurrent uploads interleave
+        size = min(size, self.left)
+        self.left -= size
+        return b"x" * size
+
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_SESSION_QUOTA_MB", 3)
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_BYTES", 64 * 1024)
+    return str(tmp_path / "s")
+
+
+def save(session_dir, name, size):
+    return uploads.save_upload(FakeUpload(name, size), os.path.join(session_dir, name), "s", session_dir)
+
+
+def test_concurrent_uploads_share_the_quota(session_dir):
+    async def run():
+        return await asyncio.gather(*(save(session_dir, f"f{i}", int(1.4 * MB)) for i in range(2)))
+
+    assert [saved.size for saved in asyncio.run(run())] == [int(1.4 * MB)] * 2
+    assert uploads._in_flight == {}
+
+
+def test_concurrent_uploads_over_quota_are_rejected(session_dir):
+    async def run():
+        return await asyncio.gather(*(save(session_dir, f"f{i}", 2 * MB) for i in range(2)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, HTTPException) and result.status_code == 413 for result in results) == 1
+    # The rejected upload's partial file is removed
+    assert len(os.listdir(session_dir)) == 1
+    assert uploads._in_flight == {}
+
+
+def test_replaced_file_does_not_count(session_dir):
+    asyncio.run(save(session_dir, "f0", 2 * MB))
+    assert asyncio.run(save(session_dir, "f0", int(2.5 * MB))).size == int(2.5 * MB)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(save(session_dir, "g", 1 * MB))
+    assert rejected.value.status_code == 413
+    assert os.listdir(session_dir) == ["f0"]
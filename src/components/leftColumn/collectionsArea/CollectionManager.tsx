@@ -1,7 +1,7 @@
 //import SaveButton from "@/components/base/SaveButton";
 import { apiBase } from "@/lib/api";
 import { Collection, useSessionFileStore } from "@/store/useSessionFileStore";
-import { IngestResponse, UploadedFile } from "@/types/files";
+import { IngestJobStatus, IngestResponse, UploadedFile } from "@/types/files";
 import {
   ArrowDownTrayIcon,
   ChevronDownIcon,
@@ -13,6 +13,26 @@ import axios from "axios";
 import { useEffect, useState } from "react";
 import SettingsButton from "@/components/base/SettingsButton";
 
+const INGEST_POLL_MS = 1000;
+
+// Poll a background ingest job until it finishes, reporting each update
+async function waitForIngestJob(
+  jobId: string,
+  onProgress: (job: IngestJobStatus) => void
+): Promise<IngestJobStatus> {
+  for (;;) {
+    const { data } = await axios.get<IngestJobStatus>(
+      `${apiBase}/api/ingest/jobs/${jobId}`,
+      { withCredentials: true }
+    );
+    onProgress(data);
+    if (!["queued", "running"].includes(data.status)) {
+      return data;
+    }
+    await new Promise((resolve) => setTimeout(resolve, INGEST_POLL_MS));
+  }
+}
+
 export default function CollectionManager() {
   const collections = useSessionFileStore((state) => state.collections);
   const activeCollectionId = useSessionFileStore(
@@ -95,6 +115,21 @@ export default function CollectionManager() {
       );
 
       const newSessionId = ingestResp.data.session_id;
+
+      if (ingestResp.data.job_id) {
+        const job = await waitForIngestJob(ingestResp.data.job_id, (job) => {
+          const stage = job.stage ? job.stages[job.stage] : null;
+          setStatusMessage(
+            stage
+              ? `Ingesting "${collection.name}": ${job.stage} ${stage.done}/${stage.total}`
+              : `Ingesting "${collection.name}": ${job.status}`
+          );
+        });
+        if (job.status !== "done") {
+          throw new Error(job.error ?? `ingest job ${job.status}`);
+        }
+      }
+
       console.log(
         `Ingestion successful for "${collection.name}". Session ID:`,
         newSessionId
@@ -1,11 +1,12 @@
 "use client";
 import CollapsibleSection from "@/components/base/CollapsibleSection";
-import { generateSingleRag } from "@/lib/ragClient";
+import { generateRagMetadata, RagMetadataField } from "@/lib/ragClient";
 import {
   SessionFileStoreState,
   useSessionFileStore,
 } from "@/store/useSessionFileStore";
 import useAssaysStore from "@/store/useAssaysStore";
+import AiGenerateButton from "@/components/base/AiGenerateButton";
 
 import { useState } from "react";
 // import { generateWithTemplate, generateSingleRag } from "@/lib/ragClient";
@@ -13,7 +14,9 @@ import { useState } from "react";
 import { UploadedFile } from "@/types/files";
 
 export default function StudyComponent() {
-  const [loadingSection, setLoadingSection] = useState<string | null>(null);
+  const [loadingSections, setLoadingSections] = useState<RagMetadataField[]>(
+    []
+  );
 
   const collections = useSessionFileStore(
     (state: SessionFileStoreState) => state.collections
@@ -36,7 +39,7 @@ export default function StudyComponent() {
 
   const setAssayTitles = useAssaysStore((state) => state.setAssayTitles);
 
-  const CollapsibleSectionTitles = [
+  const CollapsibleSectionTitles: RagMetadataField[] = [
     "description",
     "title",
     "keywords",
@@ -45,7 +48,46 @@ export default function StudyComponent() {
 
   const activeCollection = collections.find((c) => c.id === activeCollectionId);
 
-  const onGenerate = async (sectionToLoad: string) => {
+  // Text for the section's text area; assays also go to the AssaysStore
+  const applyResult = (
+    section: RagMetadataField,
+    result: string | string[]
+  ) => {
+    console.log(
+      "StudyComponent: Raw result for",
+      section,
+      ":",
+      result,
+      typeof result
+    );
+
+    let textResult: string;
+    if (section === "assays") {
+      // Backend returns List[str]; split a plain string just in case
+      const titlesArray = Array.isArray(result)
+        ? result
+        : result.split(",").map((title) => title.trim());
+      textResult = titlesArray.join(", ");
+      setAssayTitles(titlesArray);
+      console.log(
+        "StudyComponent: Stored assay titles in AssaysStore:",
+        titlesArray
+      );
+    } else if (Array.isArray(result)) {
+      // Keywords come back as an array
+      textResult = result.join(", ");
+    } else {
+      // Description, title
+      textResult = result;
+    }
+
+    // Update the main RAG data store for the text area
+    updateRagSection(section, textResult);
+  };
+
+  // One streamed /api/generate_rag_metadata call for all requested sections,
+  // each section is filled (and stops loading) as soon as its field arrives
+  const onGenerate = async (sectionsToLoad: RagMetadataField[]) => {
     if (!sessionId) {
       console.error(
         "StudyComponent: No active session ID. Cannot generate RAG data."
@@ -70,8 +112,8 @@ export default function StudyComponent() {
       (file: UploadedFile) => file.name
     );
     console.log(
-      "StudyComponent: Calling RAG generation for section:",
-      sectionToLoad,
+      "StudyComponent: Calling RAG generation for sections:",
+      sectionsToLoad,
       "with fileNames from active collection:",
       fileNamesForRAG
     );
@@ -80,55 +122,31 @@ export default function StudyComponent() {
       activeCollection.name
     );
 
-    setLoadingSection(sectionToLoad);
+    const doneLoading = (section: RagMetadataField) =>
+      setLoadingSections((current) => current.filter((s) => s !== section));
+    const errors: string[] = [];
+
+    setLoadingSections((current) => [
+      ...current.filter((s) => !sectionsToLoad.includes(s)),
+      ...sectionsToLoad,
+    ]);
     try {
-      // new per-section call
-      const result = await generateSingleRag(
-        sectionToLoad as "description" | "title" | "keywords" | "assays",
+      await generateRagMetadata(
+        sectionsToLoad,
         fileNamesForRAG,
-        sessionId
-      );
-
-      // Debug logging to see what we actually got
-      console.log(
-        "StudyComponent: Raw result from generateSingleRag:",
-        result,
-        typeof result
-      );
-
-      // Handle different result types
-      let textResult: string;
-      let titlesArray: string[];
-
-      if (sectionToLoad === "assays") {
-        if (Array.isArray(result)) {
-          // Backend returns List[str] - result is already an array
-          titlesArray = result as string[];
-          textResult = titlesArray.join(", ");
-        } else if (typeof result === "string") {
-          // Backend returns str - need to parse
-          textResult = result;
-          titlesArray = textResult.split(",").map((title) => title.trim());
-        } else {
-          throw new Error(`Unexpected assays result type: ${typeof result}`);
+        sessionId,
+        (section, value) => {
+          applyResult(section, value);
+          doneLoading(section);
+        },
+        (section, detail) => {
+          errors.push(`${section}: ${detail}`);
+          doneLoading(section);
         }
-
-        // Store in AssaysStore
-        setAssayTitles(titlesArray);
-        console.log(
-          "StudyComponent: Stored assay titles in AssaysStore:",
-          titlesArray
-        );
-      } else if (sectionToLoad === "keywords" && Array.isArray(result)) {
-        // Handle keywords array
-        textResult = result.join(", ");
-      } else {
-        // Handle other sections (description, title)
-        textResult = result as string;
+      );
+      if (errors.length) {
+        throw new Error(errors.join("\n"));
       }
-
-      // Update the main RAG data store for the text area
-      updateRagSection(sectionToLoad, textResult);
     } catch (error) {
       console.error("StudyComponent: Error generating RAG data:", error);
       alert(
@@ -137,7 +155,9 @@ export default function StudyComponent() {
         }`
       );
     } finally {
-      setLoadingSection(null);
+      setLoadingSections((current) =>
+        current.filter((s) => !sectionsToLoad.includes(s))
+      );
     }
   };
 
@@ -176,15 +196,24 @@ export default function StudyComponent() {
         </div>
       )}
 
+      {/* Fill every section from one streamed call */}
+      <div className="flex items-center gap-2 mb-2 px-2">
+        <AiGenerateButton
+          onClick={() => onGenerate(CollapsibleSectionTitles)}
+          disabled={!activeCollection || loadingSections.length > 0}
+        />
+        <span className="text-sm text-primaryWhite">Generate all sections</span>
+      </div>
+
       <div className="flex flex-col overflow-hidden">
         {CollapsibleSectionTitles.map((sectionTitle) => (
           <CollapsibleSection
             key={sectionTitle}
             title={sectionTitle}
-            onGenerate={() => onGenerate(sectionTitle)}
+            onGenerate={() => onGenerate([sectionTitle])}
             value={ragData[sectionTitle] || ""}
             onChange={(txt) => updateRagSection(sectionTitle, txt)}
-            isLoading={loadingSection === sectionTitle}
+            isLoading={loadingSections.includes(sectionTitle)}
             disabled={!activeCollection} // Disable if no active collection
           />
         ))}
@@ -67,6 +67,65 @@ export async function generateSingleRag(
   return value;
 }
 
+export type RagMetadataField = "title" | "description" | "keywords" | "assays";
+
+// One call for a whole study record: `/api/generate_rag_metadata` streams
+// server-sent events, onField fires for each field as soon as it is generated
+export async function generateRagMetadata(
+  fields: RagMetadataField[],
+  fileNames: string[],
+  sessionId: string,
+  onField: (field: RagMetadataField, value: string | string[]) => void,
+  onError?: (field: RagMetadataField, detail: string) => void
+): Promise<SingleRagResponse> {
+  const res = await fetch(`${apiBase}/api/generate_rag_metadata`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      session_id: sessionId,
+      file_names: fileNames,
+      model: "llama3.1",
+      top_k: 3,
+      fields,
+    }),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`RAG metadata call failed: ${res.statusText}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let values: SingleRagResponse = {};
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    // sse-starlette ends lines with \r\n, a chunk may end between the two
+    buffer = (buffer + decoder.decode(value, { stream: true })).replace(/\r\n/g, "\n");
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = message.match(/^event: (.*)$/m)?.[1];
+      const data = message
+        .split("\n")
+        .filter((line) => line.startsWith("data: "))
+        .map((line) => line.slice(6))
+        .join("\n");
+      if (!event || !data) continue;
+      const payload = JSON.parse(data);
+      if (event === "field") {
+        onField(payload.field, payload.value[payload.field]);
+      } else if (event === "error") {
+        onError?.(payload.field, payload.detail);
+      } else if (event === "done") {
+        values = payload.values;
+      }
+    }
+  }
+  return values;
+}
+
 // Old whole obj 1 shot api call
 export async function generateWithTemplate(
   fileNames: string[],
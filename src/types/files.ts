@@ -29,6 +29,28 @@ export interface IngestResponse {
   collection_id?: string;
   collection_name?: string;
   files_processed?: number;
+  job_id?: string;
+  status?: IngestJobState;
+}
+
+export type IngestJobState = "uploading" | "queued" | "running" | "done" | "failed" | "cancelled";
+
+export interface IngestStageProgress {
+  status: "pending" | "running" | "done";
+  done: number;
+  total: number;
+  seconds: number;
+  per_second: number | null;
+}
+
+export interface IngestJobStatus {
+  job_id: string;
+  collection_id: string;
+  collection_name: string;
+  status: IngestJobState;
+  stage: "parse" | "split" | "embed" | "index" | "images" | null;
+  error: string | null;
+  stages: Record<string, IngestStageProgress>;
 }
 
 export interface UploadFileButtonProps {
@@ -2,12 +2,15 @@ from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain.vectorstores import Chroma
+from transformers import AutoTokenizer
 
 
 class VectorGenerator:
-	def __init__(self, embedding_model):
+	def __init__(self, embedding_model, chunk_tokens=200, overlap_tokens=20):
 		self.embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
-		self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
+		# chunk size in tokens of the embedding model, like the backend's chunking policies
+		self.text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+			AutoTokenizer.from_pretrained(embedding_model), chunk_size=chunk_tokens, chunk_overlap=overlap_tokens)
 		self.save_directory="download_files/chroma_db"
 	#
 	def create_documents_from_images(self, image_jsons):